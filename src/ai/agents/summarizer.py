@@ -10,16 +10,17 @@ from dotenv import load_dotenv
 import time
 from src.ai.llm.config import SummarizerConfig
 from src.backend.utils.utils import get_unique_response_id
+from src.backend.utils.stream_utils import sse_event
 
 load_dotenv()
 smc = SummarizerConfig()
 
-async def stream_summary(user_id: str, session_id: str, message_id: str, prev_message_id: str, user_query: str, local_time: datetime, timezone: str, is_elaborate: bool = False, give_examples: bool = True) -> AsyncGenerator[str, None]:
+async def stream_summary(user_id: str, session_id: str, message_id: str, prev_message_id: str, user_query: str, local_time: datetime, timezone: str, is_elaborate: bool = False, give_examples: bool = True) -> AsyncGenerator[bytes, None]:
     start_time = time.monotonic()
     last_message = await mongodb.get_response_by_message_id(prev_message_id)
 
     if 'error' in last_message:
-        yield f"data: {json.dumps({'type': 'error', 'content': 'No message found for this session', 'message_id': message_id})}\n\n"
+        yield sse_event({'type': 'error', 'content': 'No message found for this session', 'message_id': message_id})
         return
 
     text_to_summarize = last_message.get('response')
@@ -54,7 +55,7 @@ Your task:
 - Format both the main content and examples in **Markdown**, but do **not** include triple backticks or code fences.
 """
     try:
-        yield f"data: {json.dumps({'type': 'research', 'agent_name': agent_name, 'title': operation_title, 'id': get_unique_response_id(), 'created_at': local_time.isoformat(), 'message_id': message_id})}\n\n"
+        yield sse_event({'type': 'research', 'agent_name': agent_name, 'title': operation_title, 'id': get_unique_response_id(), 'created_at': local_time.isoformat(), 'message_id': message_id})
         
         stream = await acompletion(
             model=smc.MODEL,
@@ -74,7 +75,7 @@ Your task:
                 if hasattr(delta, 'content') and delta.content:
                     content_piece = delta.content
                     summary_chunks.append(content_piece)
-                    yield f"data: {json.dumps({'type': 'response-chunk', 'agent_name': agent_name, 'message_id': message_id, 'id': response_id, 'content': content_piece})}\n\n"
+                    yield sse_event({'type': 'response-chunk', 'agent_name': agent_name, 'message_id': message_id, 'id': response_id, 'content': content_piece})
 
         full_summary = ''.join(summary_chunks)
         
@@ -87,7 +88,7 @@ Your task:
             remaining_seconds = int(duration_seconds % 60)
             time_event["content"] = f"{minutes} min {remaining_seconds} sec"
 
-        yield f"data: {json.dumps(time_event)}\n\n"
+        yield sse_event(time_event)
 
         complete_payload = {
             'type': 'complete',
@@ -97,7 +98,7 @@ Your task:
             'retry': False,
         }
 
-        yield f"data: {json.dumps(complete_payload)}\n\n"
+        yield sse_event(complete_payload)
         retry_flag = complete_payload['retry']
         # yield f"data: {json.dumps({'type': 'complete', 'message_id': message_id, 'notification': True, 'suggestions': False, 'retry': True})}\n\n"
 
@@ -139,7 +140,7 @@ Your task:
         await mongodb.update_session_history_in_db(session_id, user_id, message_id, user_query, full_summary, [], local_time, 'UTC')
 
     except Exception as e:
-        yield f"data: {json.dumps({'type': 'error', 'content': str(e), 'message_id': message_id})}\n\n"
+        yield sse_event({'type': 'error', 'content': str(e), 'message_id': message_id})
         try:
             error_msg = f"Error in Summarizing/Elaborating agent processing: {str(e)}"
             error_messages = [
@@ -0,0 +1,84 @@
+# chart_bot/bar_context.py
+"""
+Per-request daily bar context for the chart bot tools.
+
+`start_chat_session` activates a `BarContext` for the duration of one user
+query. The first tool that needs daily bars for a symbol loads that symbol's
+series from the daily bar store once; every later window (any tool, any
+period length) is a zero-copy slice of the same series. While a context is
+active, the SMA / RSI / volatility tools compute daily indicators from it
+instead of calling one FMP technical-indicator endpoint per period.
+
+Outside a context (tools invoked directly) `get_bars` reads the store per call.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from contextvars import ContextVar, Token
+from datetime import date, timedelta
+from typing import Dict, Optional
+
+from src.backend.db.bar_series import BarSeries
+from src.backend.db.daily_bars import daily_bar_store, period_start
+
+_current: ContextVar[Optional["BarContext"]] = ContextVar("chart_bot_bar_context", default=None)
+
+# Calendar days per trading bar, with slack for holidays, when widening a window for warm-up.
+_CALENDAR_PER_BAR = 1.5
+
+
+class BarContext:
+    def __init__(self):
+        self._series: Dict[str, BarSeries] = {}
+        self._covered_from: Dict[str, date] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.fetches = 0
+
+    async def series(self, symbol: str, start: Optional[date] = None) -> BarSeries:
+        """Stored series for `symbol` from at least `start`; loaded once per request unless an older start is asked for."""
+        symbol = symbol.upper()
+        want = min(start, period_start("MAX")) if start else period_start("MAX")
+        lock = self._locks.setdefault(symbol, asyncio.Lock())
+        async with lock:
+            covered = self._covered_from.get(symbol)
+            if covered is None or want < covered:
+                self._series[symbol] = await daily_bar_store.aget_bars(symbol, want.isoformat())
+                self._covered_from[symbol] = want
+                self.fetches += 1
+            return self._series[symbol]
+
+
+def activate() -> Token:
+    return _current.set(BarContext())
+
+
+def reset(token: Token):
+    _current.reset(token)
+
+
+def current() -> Optional[BarContext]:
+    return _current.get()
+
+
+def _warmup_start(_from: Optional[str], warmup_bars: int) -> Optional[date]:
+    if not _from:
+        return None
+    start = date.fromisoformat(_from[:10])
+    if warmup_bars <= 0:
+        return start
+    return start - timedelta(days=int(warmup_bars * _CALENDAR_PER_BAR) + 7)
+
+
+async def get_bars(symbol: str, _from: Optional[str], _to: Optional[str], warmup_bars: int = 0) -> BarSeries:
+    """
+    Ascending daily bars for [_from, _to] plus up to `warmup_bars` earlier bars,
+    so rolling indicators are already defined on the first requested day.
+    """
+    start = _warmup_start(_from, warmup_bars)
+    ctx = current()
+    if ctx is None:
+        return await daily_bar_store.aget_bars(symbol, start.isoformat() if start else None, _to)
+
+    series = await ctx.series(symbol, start)
+    return series.slice(start, _to[:10] if _to else None)
@@ -1,15 +1,23 @@
-import requests
+from typing import Literal
 from langchain_core.tools import tool
 from pydantic import BaseModel, Field
 import os
 import httpx
 from dotenv import load_dotenv
+from src.ai.chart_bot import bar_context
+from src.ai.chart_bot.history_summary import compact_history
 
 load_dotenv()
 # --- Placeholder Config (Replace with your actual project modules) ---
 # In a real project, you would likely load this from a config file or environment variable.
 fm_api_key = os.getenv("FM_API_KEY")
 
+ResponseMode = Literal["compact", "full"]
+RESPONSE_MODE_DESCRIPTION = (
+    "'compact' (default) returns summary statistics, key dates and a thinned close series "
+    "(daily rows when the window is short). Use 'full' only when every daily OHLCV row is needed."
+)
+
 
 # --- Pydantic Schemas for Tools ---
 
@@ -18,18 +26,32 @@ class HistoricalPriceInput(BaseModel):
     ticker: str = Field(..., description="The stock ticker symbol, e.g., 'AAPL'.")
     from_date: str = Field(None, description="The start date for historical data in YYYY-MM-DD format.")
     to_date: str = Field(None, description="The end date for historical data in YYYY-MM-DD format.")
+    response_mode: ResponseMode = Field("compact", description=RESPONSE_MODE_DESCRIPTION)
 
 class CryptoHistoricalPriceInput(BaseModel):
     """Input schema for the get_crypto_historical_price_full tool."""
     symbol: str = Field(..., description="The cryptocurrency symbol, e.g., 'BTCUSD'.")
     from_date: str = Field(None, description="The start date for historical data in YYYY-MM-DD format.")
     to_date: str = Field(None, description="The end date for historical data in YYYY-MM-DD format.")
+    response_mode: ResponseMode = Field("compact", description=RESPONSE_MODE_DESCRIPTION)
+
+
+async def _price_history(symbol: str, from_date: str, to_date: str, response_mode: ResponseMode) -> dict:
+    """EOD bars from the request's bar context (one store read per symbol), shaped for the LLM."""
+    try:
+        series = await bar_context.get_bars(symbol, from_date, to_date)
+    except httpx.HTTPError as e:
+        return {"error": f"FMP request failed: {e}"}
+    if response_mode == "full":
+        return {"symbol": series.symbol, "historical": series.to_records(newest_first=True)}
+    return compact_history(series)
 
 
 # --- Tool Definitions ---
 
 @tool(args_schema=HistoricalPriceInput)
-async def fetch_stock_price_history(ticker: str, from_date: str = None, to_date: str = None) -> dict:
+async def fetch_stock_price_history(ticker: str, from_date: str = None, to_date: str = None,
+                                    response_mode: ResponseMode = "compact") -> dict:
     """
     Fetches the end-of-day historical price data for a given stock ticker.
     Use this for specific date range queries for STOCKS.
@@ -39,26 +61,12 @@ async def fetch_stock_price_history(ticker: str, from_date: str = None, to_date:
     if not fm_api_key or fm_api_key == "your_fmp_api_key_here":
         return {"error": "FMP API key is not configured."}
 
-    url = "https://financialmodelingprep.com/stable/historical-price-eod/full"
-    print(f"url = {url}")
-    params = {
-        "symbol": ticker,
-        "apikey": fm_api_key,
-    }
-
-    if from_date:
-        params["from"] = from_date
-    if to_date:
-        params["to"] = to_date
-
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, params=params)
-        print(f"response.json() = {response.json()}")
-        return response.json()
+    return await _price_history(ticker, from_date, to_date, response_mode)
 
 
 @tool(args_schema=CryptoHistoricalPriceInput)
-async def fetch_crypto_price_history(symbol: str, from_date: str = None, to_date: str = None) -> dict:
+async def fetch_crypto_price_history(symbol: str, from_date: str = None, to_date: str = None,
+                                     response_mode: ResponseMode = "compact") -> dict:
     """
     Fetches the end-of-day historical price data for a given cryptocurrency symbol.
     """
@@ -67,21 +75,7 @@ async def fetch_crypto_price_history(symbol: str, from_date: str = None, to_date
     if not fm_api_key or fm_api_key == "your_fmp_api_key_here":
         return {"error": "FMP API key is not configured."}
 
-    url = "https://financialmodelingprep.com/stable/historical-price-eod/full"
-    params = {
-        "symbol": symbol,
-        "apikey": fm_api_key,
-    }
-
-    if from_date:
-        params["from"] = from_date
-    if to_date:
-        params["to"] = to_date
-
-    async with httpx.AsyncClient() as client:
-        print(url)
-        response = await client.get(url, params=params)
-        return response.json()
+    return await _price_history(symbol, from_date, to_date, response_mode)
 
 
 # get_historical = get_historical_price_full()
@@ -0,0 +1,136 @@
+# chart_bot/history_summary.py
+"""
+Compact price-history responses for the chart bot LLM.
+
+A raw EOD payload costs roughly 40 tokens per bar, so a one-year window is
+~10k tokens in the ReAct loop. `compact_history` instead returns summary
+statistics, the dates worth talking about, and a close series thinned to fit
+`HISTORY_TOKEN_BUDGET`. Windows short enough to fit the budget are returned
+as daily OHLCV rows unchanged. The full series stays in the request's bar
+context, so a follow-up call for a narrower window is a slice, not a fetch.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+from typing import Any, Dict, List
+
+import numpy as np
+
+from src.ai.chart_bot import indicators
+from src.backend.db.bar_series import BarSeries
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+# Rough token cost of one serialized point: ["2025-01-02",123.45] vs a full OHLCV row.
+TOKENS_PER_POINT = 12
+TOKENS_PER_ROW = 30
+TRADING_DAYS = 252
+
+
+def _num(value: float) -> float | None:
+    """Six significant digits: enough for equities and sub-cent crypto alike."""
+    return float(f"{value:.6g}") if np.isfinite(value) else None
+
+
+def _pct(value: float) -> float | None:
+    return round(float(value) * 100, 2) if np.isfinite(value) else None
+
+
+def _point(dates: np.ndarray, i: int, value: float) -> Dict[str, Any]:
+    return {"date": str(dates[i]), "value": _num(value)}
+
+
+def summary_stats(series: BarSeries) -> Dict[str, Any]:
+    """Start/end, high/low, return, annualized volatility and max drawdown of the closes."""
+    dates = series.iso_dates()
+    close = series.close
+    high = np.where(np.isfinite(series.high), series.high, close)
+    low = np.where(np.isfinite(series.low), series.low, close)
+    hi, lo = int(np.nanargmax(high)), int(np.nanargmin(low))
+
+    peak = np.fmax.accumulate(close)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        drawdown = close / peak - 1.0
+    trough = int(np.nanargmin(drawdown))
+    peak_at = int(np.nanargmax(close[:trough + 1]))
+
+    log_returns = indicators.returns(close, "log")[1:]
+    finite = log_returns[np.isfinite(log_returns)]
+    volatility = finite.std(ddof=1) * math.sqrt(TRADING_DAYS) if len(finite) > 1 else float("nan")
+
+    return {
+        "start": _point(dates, 0, close[0]),
+        "end": _point(dates, len(close) - 1, close[-1]),
+        "high": _point(dates, hi, high[hi]),
+        "low": _point(dates, lo, low[lo]),
+        "return_pct": _pct(close[-1] / close[0] - 1.0) if close[0] else None,
+        "annualized_volatility_pct": _pct(volatility),
+        "max_drawdown": {
+            "pct": _pct(drawdown[trough]),
+            "peak": _point(dates, peak_at, close[peak_at]),
+            "trough": _point(dates, trough, close[trough]),
+        },
+        "average_volume": _num(np.nanmean(series.volume)) if np.isfinite(series.volume).any() else None,
+    }
+
+
+def key_dates(series: BarSeries) -> Dict[str, Any]:
+    """Largest one-day moves of the window."""
+    pct = indicators.returns(series.close, "pct")
+    if len(pct) < 2 or not np.isfinite(pct[1:]).any():
+        return {}
+    dates = series.iso_dates()
+    up, down = int(np.nanargmax(pct)), int(np.nanargmin(pct))
+    return {
+        "largest_daily_gain": {"date": str(dates[up]), "change_pct": _pct(pct[up])},
+        "largest_daily_loss": {"date": str(dates[down]), "change_pct": _pct(pct[down])},
+    }
+
+
+def downsample_indices(series: BarSeries, points: int) -> np.ndarray:
+    """
+    About `points` evenly spaced bar positions, always keeping the first and last
+    bar and the bars with the highest and lowest close so the shape survives thinning.
+    """
+    n = len(series)
+    if n <= points:
+        return np.arange(n)
+    anchors = np.array([0, n - 1, int(np.nanargmax(series.close)), int(np.nanargmin(series.close))])
+    even = np.linspace(0, n - 1, max(points - len(anchors), 2)).round().astype(np.int64)
+    return np.union1d(even, anchors)
+
+
+def compact_history(series: BarSeries, token_budget: int = HISTORY_TOKEN_BUDGET) -> Dict[str, Any]:
+    """LLM-sized view of `series` (ascending daily bars)."""
+    if not len(series):
+        return {"symbol": series.symbol, "error": "No price data found for the requested range."}
+
+    dates = series.iso_dates()
+    out: Dict[str, Any] = {
+        "symbol": series.symbol,
+        "from": str(dates[0]),
+        "to": str(dates[-1]),
+        "trading_days": len(series),
+        "summary": summary_stats(series),
+        "key_dates": key_dates(series),
+    }
+
+    if len(series) * TOKENS_PER_ROW <= token_budget:
+        columns = ("open", "high", "low", "close", "volume")
+        out["daily"] = {
+            "columns": ["date", *columns],
+            "rows": [[str(dates[i]), *(_num(getattr(series, c)[i]) for c in columns)] for i in range(len(series))],
+        }
+        return out
+
+    idx = downsample_indices(series, max(token_budget // TOKENS_PER_POINT, 8))
+    rows: List[List[Any]] = [[str(dates[i]), _num(series.close[i])] for i in idx.tolist()]
+    out["closes"] = {
+        "columns": ["date", "close"],
+        "rows": rows,
+        "note": f"{len(rows)} of {len(series)} daily closes (about one every {max(len(series) // len(rows), 1)} "
+                "trading days, plus the highest and lowest close). Call again with a narrower "
+                "from_date/to_date for daily OHLCV rows.",
+    }
+    return out
@@ -14,6 +14,7 @@ from .price_change import calculate_price_change
 from .moving_average import fetch_sma_from_fmp
 from .relative_strength import fetch_rsi_from_fmp
 from .volatility import fetch_volatility_from_fmp
+from . import bar_context
 # Remove duplicate and unused imports
 
 fc = FastAgentConfig()
@@ -59,7 +60,7 @@ content=f"""You are an expert financial assistant. Your goal is to help users by
 **Your Workflow:**
 -   **Analyze the Query:** First, determine if the user has a general query or a specific date-range query.
 -   **Select the Correct Tool:** Choose the most appropriate tool based on your analysis. For specific history, use the historical tools.
--   **Fetch and Analyze the Data:** The tools return raw JSON data. You must analyze this data to answer the user's question.
+-   **Fetch and Analyze the Data:** The price history tools return a compact summary by default: start/end, high/low, return, volatility, max drawdown, key dates and a thinned close series (daily rows for short windows). Answer from it; call again with a narrower date range when you need daily detail, and use `response_mode="full"` only if every daily row is required.
     - Do NOT assume a date is invalid or in the future unless the tool returns **no data**.
     - If data is returned for a future-looking date, analyze it as normal.
     - For queries like "today's price", "yesterday's price", "latest price", etc., if no data is available for the requested date, attempt to retrieve the most recent available data (e.g., the last available date) and inform the user of the date used.
@@ -338,16 +339,21 @@ What you should respond: 'We fit a SARIMA model (`SARIMAX` with order `(1,1,1)`
     #     print(chunk)
 
     final_content = None
-    async for chunk in agent.astream(
-        {"messages": [{"role": "user", "content": full_prompt}]},
-        stream_mode="updates"
-    ):
-        print(f"chunk: {chunk}")
-        if "agent" in chunk and "messages" in chunk["agent"]:
-            for msg in chunk["agent"]["messages"]:
-                content = getattr(msg, "content", None) or (msg.get("content") if isinstance(msg, dict) else None)
-                if content and content.strip():
-                    final_content = content
+    # one EOD download per symbol for every indicator tool called while answering this query
+    bars_token = bar_context.activate()
+    try:
+        async for chunk in agent.astream(
+            {"messages": [{"role": "user", "content": full_prompt}]},
+            stream_mode="updates"
+        ):
+            print(f"chunk: {chunk}")
+            if "agent" in chunk and "messages" in chunk["agent"]:
+                for msg in chunk["agent"]["messages"]:
+                    content = getattr(msg, "content", None) or (msg.get("content") if isinstance(msg, dict) else None)
+                    if content and content.strip():
+                        final_content = content
+    finally:
+        bar_context.reset(bars_token)
 
     if final_content:
         print(final_content)
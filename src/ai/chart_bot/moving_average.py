@@ -36,38 +36,20 @@ import asyncio
 import calendar
 from typing import List, Dict, Optional, Literal, Any
 from datetime import datetime, date, timedelta
-from statistics import fmean
 from datetime import datetime, timezone
 import httpx
 from pydantic import BaseModel, Field, field_validator
 from langchain_core.tools import tool
 from dotenv import load_dotenv
+from src.backend.utils.fmp_client import fmp_client
+from src.ai.chart_bot import bar_context, indicators
+from src.backend.db.bar_series import TradingDateIndex
 load_dotenv()
 
 # ---------- Env & constants ----------
 FM_API_KEY = os.getenv("FM_API_KEY")
 
-FMP_SMA_URL = "https://financialmodelingprep.com/stable/technical-indicators/sma"
-FMP_EOD_URL = "https://financialmodelingprep.com/stable/historical-price-eod/full"
-
-DEFAULT_TIMEOUT = httpx.Timeout(connect=5.0, read=20.0, write=5.0, pool=5.0)
-RETRY_STATUS = {429, 500, 502, 503, 504}
-
-
-# ---------- Small HTTP helper ----------
-
-async def _get_with_retries(client: httpx.AsyncClient, url: str, params: Dict[str, Any], tries: int = 3, backoff: float = 0.75) -> httpx.Response:
-    for i in range(tries):
-        try:
-            resp = await client.get(url, params=params)
-            if resp.status_code in RETRY_STATUS:
-                raise httpx.HTTPStatusError("retryable", request=resp.request, response=resp)
-            resp.raise_for_status()
-            return resp
-        except (httpx.HTTPStatusError, httpx.HTTPError):
-            if i == tries - 1:
-                raise
-            await asyncio.sleep(backoff * (2 ** i))
+FMP_SMA_PATH = "/stable/technical-indicators/sma"
 
 
 # ---------- Helpers ----------
@@ -98,16 +80,11 @@ def _coerce_to_prior_valid_calendar_date(s: str) -> str:
     d = min(max(1, d), last_day)
     return f"{y:04d}-{m:02d}-{d:02d}"
 
-def _find_on_or_before(target: date, series_newest_first: List[Dict[str, Any]], key: str = "sma") -> Optional[Dict[str, Any]]:
-    """Series expected newest-first. Return the first row with row_date <= target and key present."""
-    for row in series_newest_first:
-        try:
-            row_date = _parse_iso(row.get("date"))
-        except Exception:
-            continue
-        if row_date <= target and row.get(key) is not None:
-            return row
-    return None
+def _find_on_or_before(target: date, series_newest_first: List[Dict[str, Any]], index: TradingDateIndex,
+                       key: str = "sma") -> Optional[Dict[str, Any]]:
+    """Return the latest row with row_date <= target and key present, via the series' date index."""
+    pos = index.on_or_before_with(target, series_newest_first, key)
+    return series_newest_first[pos] if pos is not None else None
 
 def _extract_historical(payload: Any) -> Optional[List[Dict[str, Any]]]:
     """
@@ -137,7 +114,6 @@ def _extract_historical(payload: Any) -> Optional[List[Dict[str, Any]]]:
     return out
 
 async def _fallback_sma_from_eod(
-    client: httpx.AsyncClient,
     symbol: str,
     period: int,
     _from: Optional[str],
@@ -147,39 +123,15 @@ async def _fallback_sma_from_eod(
     Fallback (daily only): compute SMA from FMP EOD closes.
     Returns newest-first SMA series.
     """
-    params = {"symbol": symbol, "apikey": FM_API_KEY}
-    if _from:
-        params["from"] = _from
-    if _to:
-        params["to"] = _to
-
-    r = await _get_with_retries(client, FMP_EOD_URL, params)
-    data = r.json() or {}
-    hist = data.get("historical")
-    if not hist or not isinstance(hist, list):
-        return None
-
-    asc = sorted(
-        (
-            {"date": h.get("date"), "close": h.get("close")}
-            for h in hist
-            if h.get("date") and h.get("close") is not None
-        ),
-        key=lambda x: x["date"],
-    )
-    if len(asc) < period:
+    hist = await bar_context.get_bars(symbol, _from, _to, warmup_bars=period)
+    first = max(period - 1, len(hist) - len(hist.slice(_from)))
+    if len(hist) <= first:
         return None
 
-    closes = [float(x["close"]) for x in asc]
-    dates = [x["date"] for x in asc]
-
-    points: List[Dict[str, Any]] = []
-    for i in range(period - 1, len(closes)):
-        wnd = closes[i - period + 1 : i + 1]
-        sma = fmean(wnd)
-        points.append({"date": dates[i], "sma": float(sma)})
-
-    return sorted(points, key=lambda x: x["date"], reverse=True)
+    values = indicators.sma(hist.close, period)[first:]
+    dates = hist.iso_dates()[first:]
+    # newest-first
+    return [{"date": d, "sma": v} for d, v in zip(dates[::-1].tolist(), values[::-1].tolist())]
 
 def _detect_crossovers(
     short_series: List[Dict[str, Any]],
@@ -194,18 +146,9 @@ def _detect_crossovers(
     l_map = {r["date"]: r.get("sma") for r in long_series if r.get("date") and r.get("sma") is not None}
     common = sorted(set(s_map.keys()) & set(l_map.keys()))  # ASC
 
-    events: List[Dict[str, Any]] = []
-    prev_diff: Optional[float] = None
-    for d in common:
-        s = s_map[d]; l = l_map[d]
-        diff = s - l
-        if prev_diff is not None:
-            if mode == "golden" and prev_diff <= 0 and diff > 0:
-                events.append({"date": d, "type": "golden"})
-            if mode == "death" and prev_diff >= 0 and diff < 0:
-                events.append({"date": d, "type": "death"})
-        prev_diff = diff
-    return events
+    up, down = indicators.crossovers([s_map[d] for d in common], [l_map[d] for d in common])
+    idx = up if mode == "golden" else down
+    return [{"date": common[i], "type": mode} for i in idx.tolist()]
 
 def _clip_events_to_window(events: List[Dict[str, Any]], _from: Optional[str], _to: Optional[str]) -> List[Dict[str, Any]]:
     if not events or (not _from and not _to):
@@ -307,7 +250,7 @@ async def fetch_sma_from_fmp(
         _from, _to = _to, _from
         swapped_range_note = f"Swapped from/to to maintain chronological order: from={_from}, to={_to}."
 
-    common_params = {"symbol": symbol, "timeframe": timeframe, "apikey": FM_API_KEY}
+    common_params = {"symbol": symbol, "timeframe": timeframe}
     if _from:
         common_params["from"] = _from
     if _to:
@@ -331,16 +274,22 @@ async def fetch_sma_from_fmp(
         out["notes"].append(swapped_range_note)
 
     try:
-        async with httpx.AsyncClient(timeout=DEFAULT_TIMEOUT) as client:
-            # For each period, call SMA endpoint; if empty and timeframe==1day, compute from EOD.
-            for p in period_lengths:
-                params = dict(common_params)
-                params["periodLength"] = p
-
-                historical: Optional[List[Dict[str, Any]]] = None
+        # For each period, call SMA endpoint; if empty and timeframe==1day, compute from EOD.
+        # Inside a chart-bot request, daily SMAs come straight from the shared bar context.
+        use_shared_bars = timeframe == "1day" and bar_context.current() is not None
+        date_indexes: Dict[str, TradingDateIndex] = {}  # one per series, built once
+        for p in period_lengths:
+            params = dict(common_params)
+            params["periodLength"] = p
+
+            historical: Optional[List[Dict[str, Any]]] = None
+            if use_shared_bars:
+                historical = await _fallback_sma_from_eod(symbol, p, _from, _to)
+                if historical:
+                    out["notes"].append(f"Computed {p}-day SMA from the request's shared FMP EOD closes.")
+            else:
                 try:
-                    resp = await _get_with_retries(client, FMP_SMA_URL, params)
-                    data = resp.json()
+                    data = await fmp_client.aget_json(FMP_SMA_PATH, params)
                     historical = _extract_historical(data)
                     if historical:
                         historical = sorted(historical, key=lambda x: x["date"], reverse=True)
@@ -348,67 +297,69 @@ async def fetch_sma_from_fmp(
                 except Exception:
                     historical = None
 
-                if (not historical or len(historical) == 0) and timeframe == "1day":
-                    fb = await _fallback_sma_from_eod(client, symbol, p, _from, _to)
-                    if fb:
-                        historical = fb
-                        out["notes"].append(f"Computed {p}-day SMA from FMP EOD closes due to sparse SMA endpoint data.")
-
-                if not historical:
-                    if timeframe != "1day":
-                        return {"error": f"No SMA data returned for the requested intraday timeframe from FMP (period {p}). Try widening the range or use 1day."}
-                    return {"error": f"No SMA data returned for period {p} in the requested window. Try widening the range."}
-
-                out["series"][str(p)] = historical  # newest-first
-
-            # on_date resolution
-            if coerced_on_date:
-                target_date = _parse_iso(coerced_on_date)
-                for p_str, ser in out["series"].items():
-                    if timeframe == "1day":
-                        row = _find_on_or_before(target_date, ser, key="sma")
-                        used = row["date"] if row else None
-                        out["on_date"][p_str] = {
-                            "date_requested": on_date,  # show original
-                            "date_used": used,
-                            "sma": row["sma"] if row else None,
-                            "sma_rounded": round(row["sma"], 2) if row and row.get("sma") is not None else None,
-                        }
-                        if used and used[:10] != coerced_on_date:
-                            out["notes"].append(f"Requested {coerced_on_date} was non-trading; used prior trading day {used[:10]}.")
-                    else:
-                        # pick the most recent bar on that calendar day
-                        day_prefix = coerced_on_date
-                        same_day_rows = [
-                            r for r in ser
-                            if isinstance(r.get("date"), str) and r["date"].startswith(day_prefix) and r.get("sma") is not None
-                        ]
-                        row = same_day_rows[0] if same_day_rows else None
-                        used = row["date"] if row else None
-                        if not row:
-                            prior = next(
-                                (r for r in ser if isinstance(r.get("date"), str) and r["date"][:10] < coerced_on_date and r.get("sma") is not None),
-                                None
-                            )
-                            if prior:
-                                row = prior
-                                used = row["date"]
-                                out["notes"].append(f"No intraday bars on {coerced_on_date}; used nearest prior bar {used}.")
-                        out["on_date"][p_str] = {
-                            "date_requested": on_date,  # original input
-                            "date_used": used,
-                            "sma": row["sma"] if row else None,
-                            "sma_rounded": round(row["sma"], 2) if row and row.get("sma") is not None else None,
-                        }
-
-            # crossovers
-            if crossover_mode and len(period_lengths) == 2:
-                short_p, long_p = sorted(period_lengths)
-                short_series = out["series"].get(str(short_p), [])
-                long_series  = out["series"].get(str(long_p), [])
-                events = _detect_crossovers(short_series, long_series, crossover_mode)
-                events = _clip_events_to_window(events, _from, _to)
-                out["crossovers"] = events
+            if (not historical or len(historical) == 0) and timeframe == "1day" and not use_shared_bars:
+                fb = await _fallback_sma_from_eod(symbol, p, _from, _to)
+                if fb:
+                    historical = fb
+                    out["notes"].append(f"Computed {p}-day SMA from FMP EOD closes due to sparse SMA endpoint data.")
+
+            if not historical:
+                if timeframe != "1day":
+                    return {"error": f"No SMA data returned for the requested intraday timeframe from FMP (period {p}). Try widening the range or use 1day."}
+                return {"error": f"No SMA data returned for period {p} in the requested window. Try widening the range."}
+
+            out["series"][str(p)] = historical  # newest-first
+            if coerced_on_date and timeframe == "1day":
+                date_indexes[str(p)] = TradingDateIndex.from_rows(historical)
+
+        # on_date resolution
+        if coerced_on_date:
+            target_date = _parse_iso(coerced_on_date)
+            for p_str, ser in out["series"].items():
+                if timeframe == "1day":
+                    row = _find_on_or_before(target_date, ser, date_indexes[p_str], key="sma")
+                    used = row["date"] if row else None
+                    out["on_date"][p_str] = {
+                        "date_requested": on_date,  # show original
+                        "date_used": used,
+                        "sma": row["sma"] if row else None,
+                        "sma_rounded": round(row["sma"], 2) if row and row.get("sma") is not None else None,
+                    }
+                    if used and used[:10] != coerced_on_date:
+                        out["notes"].append(f"Requested {coerced_on_date} was non-trading; used prior trading day {used[:10]}.")
+                else:
+                    # pick the most recent bar on that calendar day
+                    day_prefix = coerced_on_date
+                    same_day_rows = [
+                        r for r in ser
+                        if isinstance(r.get("date"), str) and r["date"].startswith(day_prefix) and r.get("sma") is not None
+                    ]
+                    row = same_day_rows[0] if same_day_rows else None
+                    used = row["date"] if row else None
+                    if not row:
+                        prior = next(
+                            (r for r in ser if isinstance(r.get("date"), str) and r["date"][:10] < coerced_on_date and r.get("sma") is not None),
+                            None
+                        )
+                        if prior:
+                            row = prior
+                            used = row["date"]
+                            out["notes"].append(f"No intraday bars on {coerced_on_date}; used nearest prior bar {used}.")
+                    out["on_date"][p_str] = {
+                        "date_requested": on_date,  # original input
+                        "date_used": used,
+                        "sma": row["sma"] if row else None,
+                        "sma_rounded": round(row["sma"], 2) if row and row.get("sma") is not None else None,
+                    }
+
+        # crossovers
+        if crossover_mode and len(period_lengths) == 2:
+            short_p, long_p = sorted(period_lengths)
+            short_series = out["series"].get(str(short_p), [])
+            long_series  = out["series"].get(str(long_p), [])
+            events = _detect_crossovers(short_series, long_series, crossover_mode)
+            events = _clip_events_to_window(events, _from, _to)
+            out["crossovers"] = events
 
         return out
 
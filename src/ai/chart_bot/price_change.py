@@ -4,10 +4,10 @@ import asyncio
 import datetime as dt
 from typing import Optional, Dict, Any, Tuple, List
 
-import httpx
 from pydantic import BaseModel, Field
 from langchain_core.tools import tool
 from dotenv import load_dotenv
+from src.ai.chart_bot import bar_context
 
 load_dotenv()
 fm_api_key = os.getenv("FM_API_KEY")
@@ -53,41 +53,24 @@ async def _fetch_fmp_range(
 
     # base = "https://financialmodelingprep.com/api/v3"
     # url = f"{base}/historical-price-full/{ticker}"
-    base = "https://financialmodelingprep.com/stable"
-    url = f"{base}/historical-price-eod/full?symbol={ticker}"
-    params = {"apikey": fm_api_key, "from": from_date, "to": to_date}
-
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        try:
-            r = await client.get(url, params=params)
-            r.raise_for_status()
-            data = r.json()
-        except Exception as e:
-            return None, f"FMP request failed: {e}"
-
-    hist = data.get("historical") or []
-    if not isinstance(hist, list) or not hist:
-        return None, "FMP returned no historical data for the range"
-
-    # FMP usually returns most-recent-first; sort ascending by date
     try:
-        hist.sort(key=lambda x: x.get("date"))
-    except Exception:
-        pass
+        hist = await bar_context.get_bars(ticker, from_date, to_date)  # ascending
+    except Exception as e:
+        return None, f"FMP request failed: {e}"
 
-    start_bar = hist[0]
-    end_bar = hist[-1]
+    if not len(hist):
+        return None, "FMP returned no historical data for the range"
 
-    sp = _pick_price_bar(start_bar)
-    ep = _pick_price_bar(end_bar)
-    if sp is None or ep is None:
+    sp = float(hist.close[0])
+    ep = float(hist.close[-1])
+    if sp != sp or ep != ep:
         return None, "FMP data missing close/adjusted fields"
 
     return {
         "source": "fmp",
         "symbol": ticker,
-        "from": start_bar.get("date"),
-        "to": end_bar.get("date"),
+        "from": hist.first_date.isoformat(),
+        "to": hist.last_date.isoformat(),
         **_compute_change(sp, ep),
     }, None
 
@@ -41,37 +41,19 @@ import asyncio
 import calendar
 from typing import List, Dict, Optional, Literal, Any, Tuple
 from datetime import datetime, date, timedelta
-from statistics import fmean
 from datetime import datetime, timezone
 import httpx
 from pydantic import BaseModel, Field, field_validator
 from langchain_core.tools import tool
 from dotenv import load_dotenv
+from src.backend.utils.fmp_client import fmp_client
+from src.ai.chart_bot import bar_context, indicators
+from src.backend.db.bar_series import TradingDateIndex
 load_dotenv()
 
 # ---------- Env & constants ----------
 FM_API_KEY = os.getenv("FM_API_KEY")
-FMP_RSI_URL = "https://financialmodelingprep.com/stable/technical-indicators/rsi"
-FMP_EOD_URL = "https://financialmodelingprep.com/stable/historical-price-eod/full"
-
-DEFAULT_TIMEOUT = httpx.Timeout(connect=5.0, read=20.0, write=5.0, pool=5.0)
-RETRY_STATUS = {429, 500, 502, 503, 504}
-
-
-# ---------- Small HTTP helper ----------
-
-async def _get_with_retries(client: httpx.AsyncClient, url: str, params: Dict[str, Any], tries: int = 3, backoff: float = 0.75) -> httpx.Response:
-    for i in range(tries):
-        try:
-            resp = await client.get(url, params=params)
-            if resp.status_code in RETRY_STATUS:
-                raise httpx.HTTPStatusError("retryable", request=resp.request, response=resp)
-            resp.raise_for_status()
-            return resp
-        except (httpx.HTTPStatusError, httpx.HTTPError):
-            if i == tries - 1:
-                raise
-            await asyncio.sleep(backoff * (2 ** i))
+FMP_RSI_PATH = "/stable/technical-indicators/rsi"
 
 
 # ---------- Helpers ----------
@@ -129,16 +111,11 @@ def _extract_rsi_series(payload: Any) -> Optional[List[Dict[str, Any]]]:
                 continue
     return out
 
-def _find_on_or_before(target: date, series_newest_first: List[Dict[str, Any]], key: str = "rsi") -> Optional[Dict[str, Any]]:
-    """Series expected newest-first. Return the first row with row_date <= target and key present."""
-    for row in series_newest_first:
-        try:
-            row_date = _parse_iso(row.get("date"))
-        except Exception:
-            continue
-        if row_date <= target and row.get(key) is not None:
-            return row
-    return None
+def _find_on_or_before(target: date, series_newest_first: List[Dict[str, Any]], index: TradingDateIndex,
+                       key: str = "rsi") -> Optional[Dict[str, Any]]:
+    """Return the latest row with row_date <= target and key present, via the series' date index."""
+    pos = index.on_or_before_with(target, series_newest_first, key)
+    return series_newest_first[pos] if pos is not None else None
 
 def _count_days(series: List[Dict[str, Any]], op: Literal["gt","lt","ge","le"], threshold: float) -> int:
     cnt = 0
@@ -179,22 +156,12 @@ def _threshold_crossings(series_asc: List[Dict[str, Any]], level: float) -> Dict
       - 'crossed_down': moved from >= level to < level
     Returns dict of date lists in ASC order.
     """
-    up, down = [], []
-    prev = None
-    for row in series_asc:
-        v = row.get("rsi")
-        if v is None:
-            continue
-        if prev is not None:
-            if prev <= level and v > level:
-                up.append(row["date"])
-            if prev >= level and v < level:
-                down.append(row["date"])
-        prev = v
-    return {"crossed_up": up, "crossed_down": down}
+    rows = [row for row in series_asc if row.get("rsi") is not None]
+    up, down = indicators.crossovers([row["rsi"] for row in rows], level)
+    return {"crossed_up": [rows[i]["date"] for i in up.tolist()],
+            "crossed_down": [rows[i]["date"] for i in down.tolist()]}
 
 async def _fallback_rsi_from_eod(
-    client: httpx.AsyncClient,
     symbol: str,
     period: int,
     _from: Optional[str],
@@ -204,59 +171,16 @@ async def _fallback_rsi_from_eod(
     Fallback (daily only): compute Wilder RSI from FMP EOD closes.
     Returns newest-first RSI series.
     """
-    params = {"symbol": symbol, "apikey": FM_API_KEY}
-    if _from:
-        params["from"] = _from
-    if _to:
-        params["to"] = _to
-
-    r = await _get_with_retries(client, FMP_EOD_URL, params)
-    data = r.json() or {}
-    hist = data.get("historical")
-    if not hist or not isinstance(hist, list):
-        return None
-
-    asc = sorted(
-        (
-            {"date": h.get("date"), "close": h.get("close")}
-            for h in hist
-            if h.get("date") and h.get("close") is not None
-        ),
-        key=lambda x: x["date"],
-    )
-    if len(asc) <= period:
+    # Wilder smoothing needs a longer run-in than the period itself to settle
+    hist = await bar_context.get_bars(symbol, _from, _to, warmup_bars=period * 10)
+    first = max(period, len(hist) - len(hist.slice(_from)))
+    if len(hist) <= first:
         return None
 
-    closes = [float(x["close"]) for x in asc]
-    dates  = [x["date"] for x in asc]
-
-    # Wilder's RSI
-    deltas = [closes[i] - closes[i-1] for i in range(1, len(closes))]
-    gains  = [max(d, 0.0) for d in deltas]
-    losses = [max(-d, 0.0) for d in deltas]
-
-    # initial averages
-    avg_gain = fmean(gains[:period])
-    avg_loss = fmean(losses[:period])
-
-    def _compute_rsi(ag: float, al: float) -> float:
-        if al == 0:
-            return 100.0
-        rs = ag / al
-        return 100.0 - (100.0 / (1.0 + rs))
-
-    rsi_points: List[Dict[str, Any]] = []
-    rsi_points.append({"date": dates[period], "rsi": float(_compute_rsi(avg_gain, avg_loss))})
-
-    # Wilder smoothing
-    for i in range(period + 1, len(closes)):
-        gain = gains[i - 1]
-        loss = losses[i - 1]
-        avg_gain = (avg_gain * (period - 1) + gain) / period
-        avg_loss = (avg_loss * (period - 1) + loss) / period
-        rsi_points.append({"date": dates[i], "rsi": float(_compute_rsi(avg_gain, avg_loss))})
-
-    return sorted(rsi_points, key=lambda x: x["date"], reverse=True)
+    values = indicators.wilder_rsi(hist.close, period)[first:]
+    dates = hist.iso_dates()[first:]
+    # newest-first
+    return [{"date": d, "rsi": v} for d, v in zip(dates[::-1].tolist(), values[::-1].tolist())]
 
 
 # ---------- Input schema ----------
@@ -329,7 +253,7 @@ async def fetch_rsi_from_fmp(
         _from, _to = _to, _from
         swapped_range_note = f"Swapped from/to to maintain chronological order: from={_from}, to={_to}."
 
-    params_base = {"symbol": symbol, "timeframe": timeframe, "periodLength": period_length, "apikey": FM_API_KEY}
+    params_base = {"symbol": symbol, "timeframe": timeframe, "periodLength": period_length}
     if _from:
         params_base["from"] = _from
     if _to:
@@ -354,12 +278,12 @@ async def fetch_rsi_from_fmp(
         out["notes"].append(swapped_range_note)
 
     try:
-        async with httpx.AsyncClient(timeout=DEFAULT_TIMEOUT) as client:
-            # 1) primary: RSI endpoint
-            series = None
+        # 1) primary: RSI endpoint (skipped for daily bars inside a chart-bot request,
+        #    where RSI is computed from the request's shared EOD series below)
+        series = None
+        if timeframe != "1day" or bar_context.current() is None:
             try:
-                resp = await _get_with_retries(client, FMP_RSI_URL, params_base)
-                data = resp.json()
+                data = await fmp_client.aget_json(FMP_RSI_PATH, params_base)
                 series = _extract_rsi_series(data)
                 if series:
                     series = sorted(series, key=lambda x: x["date"], reverse=True)
@@ -367,77 +291,77 @@ async def fetch_rsi_from_fmp(
             except Exception:
                 series = None
 
-            # 2) fallback: compute from EOD (daily only)
-            if (not series or len(series) == 0) and timeframe == "1day":
-                fb = await _fallback_rsi_from_eod(client, symbol, period_length, _from, _to)
-                if fb:
-                    series = fb
-                    out["notes"].append(
-                        f"Computed RSI from FMP EOD closes for {symbol} {_from}→{_to} (period={period_length})."
+        # 2) fallback: compute from EOD (daily only)
+        if (not series or len(series) == 0) and timeframe == "1day":
+            fb = await _fallback_rsi_from_eod(symbol, period_length, _from, _to)
+            if fb:
+                series = fb
+                out["notes"].append(
+                    f"Computed RSI from FMP EOD closes for {symbol} {_from}→{_to} (period={period_length})."
+                )
+
+        if not series:
+            if timeframe != "1day":
+                return {"error": "No RSI data returned for the requested intraday timeframe from FMP. Try widening the range or use 1day."}
+            return {"error": "No RSI data returned in the requested window. Try widening the range."}
+
+        out["series"] = series  # newest-first
+
+        # --- on_date resolution ---
+        if coerced_on_date:
+            used = None
+            row = None
+            if timeframe == "1day":
+                row = _find_on_or_before(_parse_iso(coerced_on_date), series, TradingDateIndex.from_rows(series), key="rsi")
+                used = row["date"] if row else None
+                if used and used[:10] != coerced_on_date:
+                    out["notes"].append(f"Requested {coerced_on_date} was non-trading; used prior trading day {used[:10]}.")
+            else:
+                # pick the most recent bar on that calendar day (i.e., the day's last bar)
+                day_prefix = coerced_on_date
+                same_day_rows = [
+                    r for r in series
+                    if isinstance(r.get("date"), str) and r["date"].startswith(day_prefix) and r.get("rsi") is not None
+                ]
+                row = same_day_rows[0] if same_day_rows else None
+                used = row["date"] if row else None
+                if not row:
+                    # nearest prior bar in the series
+                    prior = next(
+                        (r for r in series if isinstance(r.get("date"), str) and r["date"][:10] < coerced_on_date and r.get("rsi") is not None),
+                        None
                     )
-
-            if not series:
-                if timeframe != "1day":
-                    return {"error": "No RSI data returned for the requested intraday timeframe from FMP. Try widening the range or use 1day."}
-                return {"error": "No RSI data returned in the requested window. Try widening the range."}
-
-            out["series"] = series  # newest-first
-
-            # --- on_date resolution ---
-            if coerced_on_date:
-                used = None
-                row = None
-                if timeframe == "1day":
-                    row = _find_on_or_before(_parse_iso(coerced_on_date), series, key="rsi")
-                    used = row["date"] if row else None
-                    if used and used[:10] != coerced_on_date:
-                        out["notes"].append(f"Requested {coerced_on_date} was non-trading; used prior trading day {used[:10]}.")
-                else:
-                    # pick the most recent bar on that calendar day (i.e., the day's last bar)
-                    day_prefix = coerced_on_date
-                    same_day_rows = [
-                        r for r in series
-                        if isinstance(r.get("date"), str) and r["date"].startswith(day_prefix) and r.get("rsi") is not None
-                    ]
-                    row = same_day_rows[0] if same_day_rows else None
-                    used = row["date"] if row else None
-                    if not row:
-                        # nearest prior bar in the series
-                        prior = next(
-                            (r for r in series if isinstance(r.get("date"), str) and r["date"][:10] < coerced_on_date and r.get("rsi") is not None),
-                            None
-                        )
-                        if prior:
-                            row = prior
-                            used = row["date"]
-                            out["notes"].append(f"No intraday bars on {coerced_on_date}; used nearest prior bar {used}.")
-
-                out["on_date"] = {
-                    "date_requested": on_date,   # original input
-                    "date_used": used,
-                    "rsi": row["rsi"] if row else None,
-                }
-
-            # --- analytics over the window ---
-            desc = series
-            asc = sorted(series, key=lambda x: x["date"])
-
-            for t in thresholds:
-                out["signals"]["counts"][f"> {t}"] = _count_days(desc, "gt", t)
-                out["signals"]["counts"][f"< {t}"] = _count_days(desc, "lt", t)
-                out["signals"]["crossings"][f"{t}"] = _threshold_crossings(asc, t)
-                L, s, e = _streak(asc, "gt", t)
-                out["signals"]["streaks"][f"gt_{t}"] = {"length": L, "start": s, "end": e}
-                L, s, e = _streak(asc, "lt", t)
-                out["signals"]["streaks"][f"lt_{t}"] = {"length": L, "start": s, "end": e}
-
-            # extremes (guard for numeric)
-            numeric = [r for r in desc if isinstance(r.get("rsi"), (int, float))]
-            if not numeric:
-                return {"error": "RSI series contained no numeric values."}
-            max_row = max(numeric, key=lambda x: x["rsi"])
-            min_row = min(numeric, key=lambda x: x["rsi"])
-            out["extremes"] = {"max": max_row, "min": min_row}
+                    if prior:
+                        row = prior
+                        used = row["date"]
+                        out["notes"].append(f"No intraday bars on {coerced_on_date}; used nearest prior bar {used}.")
+
+            out["on_date"] = {
+                "date_requested": on_date,   # original input
+                "date_used": used,
+                "rsi": row["rsi"] if row else None,
+            }
+
+        # --- analytics over the window ---
+        desc = series
+        asc = sorted(series, key=lambda x: x["date"])
+
+        for t in thresholds:
+            out["signals"]["counts"][f"> {t}"] = _count_days(desc, "gt", t)
+            out["signals"]["counts"][f"< {t}"] = _count_days(desc, "lt", t)
+            out["signals"]["crossings"][f"{t}"] = _threshold_crossings(asc, t)
+            L, s, e = _streak(asc, "gt", t)
+            out["signals"]["streaks"][f"gt_{t}"] = {"length": L, "start": s, "end": e}
+            L, s, e = _streak(asc, "lt", t)
+            out["signals"]["streaks"][f"lt_{t}"] = {"length": L, "start": s, "end": e}
+
+        # extremes (guard for numeric)
+        numeric = [r for r in desc if isinstance(r.get("rsi"), (int, float))]
+        if not numeric:
+            return {"error": "RSI series contained no numeric values."}
+        max_row = max(numeric, key=lambda x: x["rsi"])
+        min_row = min(numeric, key=lambda x: x["rsi"])
+        out["extremes"] = {"max": max_row, "min": min_row}
 
         return out
 
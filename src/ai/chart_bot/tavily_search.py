@@ -2,6 +2,7 @@ from tavily import TavilyClient
 import os
 from pydantic import BaseModel, Field
 from langchain_core.tools import tool
+from src.backend.utils.upstream_scheduler import upstream_scheduler
 
 class SearchInput(BaseModel):
     """Input schema for the tavily_web_search tool."""
@@ -20,6 +21,7 @@ async def search_financial_web_content(query: str) -> dict:
         return {"error": "TAVILY_API_KEY environment variable is not set."}
 
     try:
+        await upstream_scheduler.aacquire("tavily")
         tavily_client = TavilyClient(api_key=TAVILY_API_KEY)
         response = tavily_client.search(
             query=query,
@@ -17,21 +17,21 @@ import os
 import math
 from typing import List, Dict, Optional, Literal, Any, Tuple
 from datetime import datetime, date, timedelta
-from statistics import stdev
 from datetime import datetime, timezone
 import httpx
 from pydantic import BaseModel, Field, field_validator
 from dotenv import load_dotenv
 from langchain_core.tools import tool
+from src.backend.utils.fmp_client import fmp_client
+from src.ai.chart_bot import bar_context, indicators
+from src.backend.db.bar_series import BarSeries, TradingDateIndex
 
 # -------- Env --------
 load_dotenv()
 FM_API_KEY = os.getenv("FM_API_KEY")
 
 # -------- Constants --------
-FMP_STD_URL = "https://financialmodelingprep.com/stable/technical-indicators/standarddeviation"
-FMP_EOD_URL = "https://financialmodelingprep.com/stable/historical-price-eod/full"
-DEFAULT_TIMEOUT = 30.0
+FMP_STD_PATH = "/stable/technical-indicators/standarddeviation"
 
 
 # ================= Helpers ================= #
@@ -79,53 +79,27 @@ def _extract_std_series(payload: Any) -> Optional[List[Dict[str, Any]]]:
     return out
 
 
-async def _fetch_close_map(
-    client: httpx.AsyncClient,
+async def _fetch_closes(
     symbol: str,
     _from: Optional[str],
     _to: Optional[str],
-) -> Dict[str, float]:
-    """Build {YYYY-MM-DD -> close} from FMP EOD endpoint."""
-    params = {"symbol": symbol, "apikey": FM_API_KEY}
-    if _from:
-        params["from"] = _from
-    if _to:
-        params["to"] = _to
-
+) -> Optional[BarSeries]:
+    """EOD bars for the window from the shared bar context / canonical FMP EOD bar store."""
     try:
-        r = await client.get(FMP_EOD_URL, params=params)
-        r.raise_for_status()
-        data = r.json() or {}
-        hist = data.get("historical") or []
-        out: Dict[str, float] = {}
-        for row in hist:
-            d = row.get("date")
-            c = row.get("close")
-            if d and c is not None:
-                try:
-                    out[d[:10]] = float(c)
-                except Exception:
-                    continue
-        return out
+        return await bar_context.get_bars(symbol, _from, _to)
     except Exception:
-        return {}
+        return None
 
 
-def _nearest_prior_close(date_str: str, close_map: Dict[str, float]) -> Optional[float]:
-    """Pick the nearest prior trading day's close."""
-    d = _parse_iso(date_str)
-    for k in sorted(close_map.keys(), reverse=True):
-        try:
-            dk = _parse_iso(k)
-        except Exception:
-            continue
-        if dk <= d:
-            return close_map[k]
-    return None
+def _close_on_or_before(date_str: str, bars: Optional[BarSeries], index: Optional[TradingDateIndex]) -> Optional[float]:
+    """Close on the given day, else the nearest prior trading day's close."""
+    if bars is None or index is None:
+        return None
+    pos = index.on_or_before(date_str)
+    return float(bars.close[pos]) if pos is not None else None
 
 
 async def _fallback_std_from_eod(
-    client: httpx.AsyncClient,
     symbol: str,
     period: int,
     _from: Optional[str],
@@ -136,62 +110,27 @@ async def _fallback_std_from_eod(
     Daily-only fallback: compute rolling σ of returns from FMP EOD closes.
     Returns newest-first list of {date, close, vol (daily %), vol_raw ($ approx)}.
     """
-    params = {"symbol": symbol, "apikey": FM_API_KEY}
-    if _from:
-        params["from"] = _from
-    if _to:
-        params["to"] = _to
-
-    r = await client.get(FMP_EOD_URL, params=params)
-    r.raise_for_status()
-    data = r.json() or {}
-    hist = data.get("historical")
-    if not hist:
-        return None
-
-    asc = sorted(
-        (
-            {"date": h.get("date"), "close": h.get("close")}
-            for h in hist
-            if h.get("date") and h.get("close") is not None
-        ),
-        key=lambda x: x["date"],
-    )
-    if len(asc) <= period:
+    hist = await bar_context.get_bars(symbol, _from, _to, warmup_bars=period + 1)
+    first = max(period, len(hist) - len(hist.slice(_from)))
+    if len(hist) <= first:
         return None
 
-    closes = [float(x["close"]) for x in asc]
-    dates = [x["date"] for x in asc]
-
-    rets: List[float] = []
-    for i in range(1, len(closes)):
-        if returns_type == "log":
-            rets.append(0.0 if closes[i - 1] <= 0 else math.log(closes[i] / closes[i - 1]))
-        else:
-            rets.append((closes[i] - closes[i - 1]) / closes[i - 1] if closes[i - 1] != 0 else 0.0)
-
-    if len(rets) < period:
-        return None
+    # sigma[i] covers the `period` returns ending at bar i (fraction, e.g. 0.023)
+    sigma = indicators.rolling_std(indicators.returns(hist.close, returns_type), period)[first:]
+    closes = hist.close[first:]
+    dates = hist.iso_dates()[first:]
 
     out: List[Dict[str, Any]] = []
-    for i in range(period - 1, len(rets)):
-        wnd = rets[i - period + 1 : i + 1]
-        try:
-            sigma = stdev(wnd)  # fraction (e.g., 0.023)
-        except Exception:
-            continue
-        d_i = dates[i + 1]
-        c_i = closes[i + 1]
+    for d_i, c_i, s_i in zip(dates[::-1].tolist(), closes[::-1].tolist(), sigma[::-1].tolist()):
         out.append(
             {
                 "date": d_i,
                 "close": c_i,
-                "vol": float(sigma * 100.0),  # daily %
-                "vol_raw": float(sigma * c_i),  # $ approx
+                "vol": s_i * 100.0,  # daily %
+                "vol_raw": s_i * c_i,  # $ approx
             }
         )
-
-    return sorted(out, key=lambda x: x["date"], reverse=True)
+    return out
 
 
 def _count_days(series: List[Dict[str, Any]], cmp: str, thr: float) -> int:
@@ -332,7 +271,7 @@ async def fetch_volatility_from_fmp(
         _from = _fmt_iso(today - timedelta(days=365))
         _to = _fmt_iso(today)
 
-    common = {"symbol": symbol, "timeframe": timeframe, "apikey": FM_API_KEY}
+    common = {"symbol": symbol, "timeframe": timeframe}
     if _from:
         common["from"] = _from
     if _to:
@@ -351,154 +290,157 @@ async def fetch_volatility_from_fmp(
     }
 
     try:
-        async with httpx.AsyncClient(timeout=DEFAULT_TIMEOUT) as client:
-            for p in period_lengths:
-                params = dict(common)
-                params["periodLength"] = p
-
-                # ---- Primary: FMP stddev endpoint ----
-                resp = await client.get(FMP_STD_URL, params=params)
-                raw_series: Optional[List[Dict[str, Any]]] = None
+        use_shared_bars = timeframe == "1day" and bar_context.current() is not None
+        date_indexes: Dict[str, TradingDateIndex] = {}  # one per series, built once
+        for p in period_lengths:
+            params = dict(common)
+            params["periodLength"] = p
+
+            # ---- Primary: FMP stddev endpoint (skipped for daily bars inside a
+            #      chart-bot request; the shared EOD series is used below) ----
+            raw_series: Optional[List[Dict[str, Any]]] = None
+            if not use_shared_bars:
                 try:
-                    resp.raise_for_status()
-                    raw_series = _extract_std_series(resp.json())
-                except Exception:
+                    raw_series = _extract_std_series(await fmp_client.aget_json(FMP_STD_PATH, params))
+                except (httpx.HTTPStatusError, ValueError):
                     raw_series = None
 
-                ser: List[Dict[str, Any]] = []
-
-                if raw_series:
-                    need_close = any(r.get("close") in (None, 0) for r in raw_series)
-                    close_map: Dict[str, float] = {}
-                    if need_close and timeframe == "1day":
-                        # widen by ±3 days to fill gaps
-                        map_from = _fmt_iso(_parse_iso(_from) - timedelta(days=3)) if _from else None
-                        map_to = _fmt_iso(_parse_iso(_to) + timedelta(days=3)) if _to else None
-                        close_map = await _fetch_close_map(client, symbol, map_from, map_to)
-
-                    for r in raw_series:
-                        dt = r["date"]
-                        close = r.get("close")
-                        if (close is None or close == 0) and timeframe == "1day":
-                            close = close_map.get(dt[:10]) or _nearest_prior_close(dt, close_map)
-
-                        vol_raw = r.get("vol_raw")  # $ σ from endpoint
-                        vol_pct: Optional[float] = None
-                        if close and close != 0 and vol_raw is not None:
-                            vol_pct = float(vol_raw / close * 100.0)
-
-                        row = {"date": dt, "close": close, "vol_raw": vol_raw, "vol": vol_pct}
-                        if annualize and timeframe == "1day" and vol_pct is not None:
-                            row["vol_annualized"] = _annualize_pct(vol_pct, timeframe, trading_days)
-                        ser.append(row)
-
-                    if ser:
-                        out["notes"].append(f"Used FMP standardDeviation endpoint for {p}-period volatility.")
-
-                # ---- Fallback: returns-based (daily only) ----
-                if not ser and timeframe == "1day":
-                    fb = await _fallback_std_from_eod(client, symbol, p, _from, _to, returns_type=returns_type)
-                    if fb:
-                        if annualize:
-                            for r in fb:
-                                r["vol_annualized"] = _annualize_pct(r.get("vol"), timeframe, trading_days)
-                        ser = fb
-                        out["notes"].append(
-                            f"No usable stddev rows from endpoint; computed {p}-period volatility from FMP EOD closes (returns-based)."
-                        )
-
-                if not ser:
-                    return {
-                        "error": f"No volatility data returned for period {p}. Try daily timeframe or widen the date range."
-                    }
-
-                ser = sorted(ser, key=lambda x: x["date"], reverse=True)
-                out["series"][str(p)] = ser
-
-            # ---- on_date selection ----
-            if on_date:
-                for p_str, ser in out["series"].items():
-                    used: Optional[str] = None
-                    sel: Optional[Dict[str, Any]] = None
-                    if timeframe == "1day":
-                        # Prefer rows that have % σ; if absent, allow rows with only $ σ.
-                        target = _parse_iso(on_date)
-                        sel = next(
-                            (row for row in ser if _parse_iso(row["date"]) <= target and row.get("vol") is not None),
-                            None,
-                        ) or next(
-                            (row for row in ser if _parse_iso(row["date"]) <= target and row.get("vol_raw") is not None),
+            ser: List[Dict[str, Any]] = []
+
+            if raw_series:
+                need_close = any(r.get("close") in (None, 0) for r in raw_series)
+                close_bars: Optional[BarSeries] = None
+                close_index: Optional[TradingDateIndex] = None
+                if need_close and timeframe == "1day":
+                    # widen by ±3 days to fill gaps
+                    map_from = _fmt_iso(_parse_iso(_from) - timedelta(days=3)) if _from else None
+                    map_to = _fmt_iso(_parse_iso(_to) + timedelta(days=3)) if _to else None
+                    close_bars = await _fetch_closes(symbol, map_from, map_to)
+                    close_index = close_bars.date_index() if close_bars is not None else None
+
+                for r in raw_series:
+                    dt = r["date"]
+                    close = r.get("close")
+                    if (close is None or close == 0) and timeframe == "1day":
+                        close = _close_on_or_before(dt, close_bars, close_index)
+
+                    vol_raw = r.get("vol_raw")  # $ σ from endpoint
+                    vol_pct: Optional[float] = None
+                    if close and close != 0 and vol_raw is not None:
+                        vol_pct = float(vol_raw / close * 100.0)
+
+                    row = {"date": dt, "close": close, "vol_raw": vol_raw, "vol": vol_pct}
+                    if annualize and timeframe == "1day" and vol_pct is not None:
+                        row["vol_annualized"] = _annualize_pct(vol_pct, timeframe, trading_days)
+                    ser.append(row)
+
+                if ser:
+                    out["notes"].append(f"Used FMP standardDeviation endpoint for {p}-period volatility.")
+
+            # ---- Fallback: returns-based (daily only) ----
+            if not ser and timeframe == "1day":
+                fb = await _fallback_std_from_eod(symbol, p, _from, _to, returns_type=returns_type)
+                if fb:
+                    if annualize:
+                        for r in fb:
+                            r["vol_annualized"] = _annualize_pct(r.get("vol"), timeframe, trading_days)
+                    ser = fb
+                    out["notes"].append(
+                        f"No usable stddev rows from endpoint; computed {p}-period volatility from FMP EOD closes (returns-based)."
+                    )
+
+            if not ser:
+                return {
+                    "error": f"No volatility data returned for period {p}. Try daily timeframe or widen the date range."
+                }
+
+            ser = sorted(ser, key=lambda x: x["date"], reverse=True)
+            out["series"][str(p)] = ser
+            if on_date and timeframe == "1day":
+                date_indexes[str(p)] = TradingDateIndex.from_rows(ser)
+
+        # ---- on_date selection ----
+        if on_date:
+            for p_str, ser in out["series"].items():
+                used: Optional[str] = None
+                sel: Optional[Dict[str, Any]] = None
+                if timeframe == "1day":
+                    # Prefer rows that have % σ; if absent, allow rows with only $ σ.
+                    target = _parse_iso(on_date)
+                    for value_key in ("vol", "vol_raw"):
+                        pos = date_indexes[p_str].on_or_before_with(target, ser, value_key)
+                        if pos is not None:
+                            sel = ser[pos]
+                            break
+                    if sel:
+                        used = sel["date"]
+                        if used[:10] != on_date:
+                            out["notes"].append(
+                                f"Requested {on_date} was non-trading or missing; used prior trading day {used[:10]}."
+                            )
+                        if sel.get("close") is None:
+                            out["notes"].append("Backfilled close from FMP EOD to compute percent volatility.")
+                else:
+                    # Intraday: newest bar on that calendar day; else nearest prior bar
+                    same_day = [
+                        r for r in ser if isinstance(r.get("date"), str) and r["date"].startswith(on_date) and
+                        (r.get("vol") is not None or r.get("vol_raw") is not None)
+                    ]
+                    sel = same_day[0] if same_day else None
+                    used = sel["date"] if sel else None
+                    if not sel:
+                        prior = next(
+                            (
+                                r
+                                for r in ser
+                                if r.get("date") and r["date"][:10] < on_date and
+                                (r.get("vol") is not None or r.get("vol_raw") is not None)
+                            ),
                             None,
                         )
-                        if sel:
+                        if prior:
+                            sel = prior
                             used = sel["date"]
-                            if used[:10] != on_date:
-                                out["notes"].append(
-                                    f"Requested {on_date} was non-trading or missing; used prior trading day {used[:10]}."
-                                )
-                            if sel.get("close") is None:
-                                out["notes"].append("Backfilled close from FMP EOD to compute percent volatility.")
-                    else:
-                        # Intraday: newest bar on that calendar day; else nearest prior bar
-                        same_day = [
-                            r for r in ser if isinstance(r.get("date"), str) and r["date"].startswith(on_date) and
-                            (r.get("vol") is not None or r.get("vol_raw") is not None)
-                        ]
-                        sel = same_day[0] if same_day else None
-                        used = sel["date"] if sel else None
-                        if not sel:
-                            prior = next(
-                                (
-                                    r
-                                    for r in ser
-                                    if r.get("date") and r["date"][:10] < on_date and
-                                    (r.get("vol") is not None or r.get("vol_raw") is not None)
-                                ),
-                                None,
-                            )
-                            if prior:
-                                sel = prior
-                                used = sel["date"]
-                                out["notes"].append(f"No intraday bars on {on_date}; used nearest prior bar {used}.")
-
-                    on_obj = {
-                        "date_requested": on_date,
-                        "date_used": used,
-                        "close": sel.get("close") if sel else None,
-                        "vol_raw": sel.get("vol_raw") if sel else None,  # $ σ
-                        "vol": sel.get("vol") if sel else None,          # daily %
-                    }
-                    if on_obj["vol"] is None and on_obj["vol_raw"] is not None and on_obj["close"]:
-                        on_obj["vol"] = float(on_obj["vol_raw"] / on_obj["close"] * 100.0)
-                    if annualize and timeframe == "1day" and on_obj.get("vol") is not None:
-                        on_obj["vol_annualized"] = _annualize_pct(on_obj["vol"], timeframe, trading_days)
+                            out["notes"].append(f"No intraday bars on {on_date}; used nearest prior bar {used}.")
+
+                on_obj = {
+                    "date_requested": on_date,
+                    "date_used": used,
+                    "close": sel.get("close") if sel else None,
+                    "vol_raw": sel.get("vol_raw") if sel else None,  # $ σ
+                    "vol": sel.get("vol") if sel else None,          # daily %
+                }
+                if on_obj["vol"] is None and on_obj["vol_raw"] is not None and on_obj["close"]:
+                    on_obj["vol"] = float(on_obj["vol_raw"] / on_obj["close"] * 100.0)
+                if annualize and timeframe == "1day" and on_obj.get("vol") is not None:
+                    on_obj["vol_annualized"] = _annualize_pct(on_obj["vol"], timeframe, trading_days)
+
+                out["on_date"][p_str] = on_obj
+
+        # ---- analytics: thresholds & extremes (percent scale) ----
+        for p_str, ser in out["series"].items():
+            ser_pct = [r for r in ser if r.get("vol") is not None]
+            if not ser_pct:
+                continue
 
-                    out["on_date"][p_str] = on_obj
+            asc = sorted(ser_pct, key=lambda x: x["date"])
+            desc = ser_pct  # newest-first as stored
 
-            # ---- analytics: thresholds & extremes (percent scale) ----
-            for p_str, ser in out["series"].items():
-                ser_pct = [r for r in ser if r.get("vol") is not None]
-                if not ser_pct:
-                    continue
-
-                asc = sorted(ser_pct, key=lambda x: x["date"])
-                desc = ser_pct  # newest-first as stored
-
-                signals = {"counts": {}, "crossings": {}, "streaks": {}}
-                for t in thresholds:
-                    signals["counts"][f"> {t}%"] = _count_days(desc, "gt", t)
-                    signals["counts"][f"< {t}%"] = _count_days(desc, "lt", t)
-                    signals["crossings"][f"{t}%"] = _threshold_crossings(asc, t)
-                    L_hi, s_hi, e_hi = _streak(asc, "gt", t)
-                    L_lo, s_lo, e_lo = _streak(asc, "lt", t)
-                    signals["streaks"][f"> {t}%"] = {"length": L_hi, "start": s_hi, "end": e_hi}
-                    signals["streaks"][f"< {t}%"] = {"length": L_lo, "start": s_lo, "end": e_lo}
-
-                out["signals"][p_str] = signals
-
-                max_row = max(ser_pct, key=lambda x: x["vol"])
-                min_row = min(ser_pct, key=lambda x: x["vol"])
-                out["extremes"][p_str] = {"max": max_row, "min": min_row}
+            signals = {"counts": {}, "crossings": {}, "streaks": {}}
+            for t in thresholds:
+                signals["counts"][f"> {t}%"] = _count_days(desc, "gt", t)
+                signals["counts"][f"< {t}%"] = _count_days(desc, "lt", t)
+                signals["crossings"][f"{t}%"] = _threshold_crossings(asc, t)
+                L_hi, s_hi, e_hi = _streak(asc, "gt", t)
+                L_lo, s_lo, e_lo = _streak(asc, "lt", t)
+                signals["streaks"][f"> {t}%"] = {"length": L_hi, "start": s_hi, "end": e_hi}
+                signals["streaks"][f"< {t}%"] = {"length": L_lo, "start": s_lo, "end": e_lo}
+
+            out["signals"][p_str] = signals
+
+            max_row = max(ser_pct, key=lambda x: x["vol"])
+            min_row = min(ser_pct, key=lambda x: x["vol"])
+            out["extremes"][p_str] = {"max": max_row, "min": min_row}
 
         return out
 
@@ -1,4 +1,6 @@
 from langchain_community.chat_models import ChatLiteLLM
+from langchain_core.rate_limiters import BaseRateLimiter
+from src.backend.utils.upstream_scheduler import upstream_scheduler
 # from langchain_litellm import ChatLiteLLM
 from dotenv import dotenv_values
 from typing import List, Optional, Any
@@ -26,17 +28,35 @@ if groq_api_key and not os.getenv("GROQ_API_KEY"):
     os.environ["GROQ_API_KEY"] = groq_api_key
 
 
+class UpstreamRateLimiter(BaseRateLimiter):
+    """Routes every LLM call through the upstream scheduler's "llm" bucket (lane and user from the caller)."""
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        upstream_scheduler.acquire_sync("llm")
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        await upstream_scheduler.aacquire("llm")
+        return True
+
+
+llm_rate_limiter = UpstreamRateLimiter()
+
+
 def get_llm(model_name: str, temperature: float = None, max_tokens: int = None):
-    model = ChatLiteLLM(model_name=model_name, temperature=temperature, max_tokens=max_tokens, max_retries=2)
+    model = ChatLiteLLM(model_name=model_name, temperature=temperature, max_tokens=max_tokens, max_retries=2,
+                        rate_limiter=llm_rate_limiter)
     # model = ChatLiteLLM(model=model_name, temperature=temperature, max_tokens=max_tokens, max_retries=2)
     return model
 
 
 def get_llm_groq(model_name: str , temperature: float = None, top_p: float = None, top_k: int = None) -> ChatLiteLLM:
-    return ChatLiteLLM(model=model_name, temperature=temperature, top_p=top_p, top_k=top_k)
+    return ChatLiteLLM(model=model_name, temperature=temperature, top_p=top_p, top_k=top_k,
+                       rate_limiter=llm_rate_limiter)
 
 
 def get_llm_alt(model_name: str, temperature: float = None, max_tokens: int = None):
-    model = ChatLiteLLM(model= model_name, temperature=temperature, max_tokens=max_tokens)
+    model = ChatLiteLLM(model= model_name, temperature=temperature, max_tokens=max_tokens,
+                        rate_limiter=llm_rate_limiter)
     return model
 
@@ -14,6 +14,8 @@ from langchain.agents.react.agent import ReActSingleInputOutputParser
 from langchain_core.prompts import PromptTemplate
 from yahooquery import search
 from src.backend.db.mongodb import FMP_API_KEY
+from src.backend.utils.fmp_client import fmp_client
+from src.backend.utils.symbol_index import symbol_index
 from src.ai.stock_prediction.stock_prediction_functions import get_rating_stock_price
 from src.ai.stock_prediction.stock_prediction_functions import sarimax_predict
 from src.ai.llm.model import get_llm
@@ -63,9 +65,8 @@ def search_company_ticker(company_name: str) -> Dict[str, Any]:
    try:
        
        print(f"\n===Company name: {company_name}===\n")
-       url = f"https://financialmodelingprep.com/stable/search-symbol?query={company_name}&apikey={FMP_API_KEY}"
-       response = requests.get(url)
-       data = response.json()
+       match = symbol_index.resolve(company_name)
+       data = [match] if match else fmp_client.get_json("/stable/search-symbol", {"query": company_name})
       
        if not data:
            return {
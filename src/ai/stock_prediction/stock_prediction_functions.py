@@ -16,6 +16,7 @@ from langchain_tavily import TavilySearch
 from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
 from langgraph.prebuilt import create_react_agent
 import src.backend.db.mongodb as mongodb
+from src.backend.db.daily_bars import daily_bar_store
 
 load_dotenv()
 
@@ -127,39 +128,28 @@ def load_ticker_data(file_path):
         data = json.load(file)
     return data
 
-def convert_raw_data_to_hist_format(raw_data):
+def convert_bar_series_to_hist_format(series):
     """
-    Convert raw_data list of dictionaries to pandas DataFrame matching hist format
+    Convert a columnar BarSeries to a pandas DataFrame matching the yfinance hist format
 
     Args:
-        raw_data: List of dictionaries with stock data
+        series: BarSeries from the daily bar store
 
     Returns:
         pandas.DataFrame: DataFrame with same structure as hist
     """
-    converted_data = []
-
-    for item in raw_data:
-        date = pd.to_datetime(item['date'])
-
-        row = {
-            'Date': date,
-            'Open': item['open'],
-            'High': item['high'],
-            'Low': item['low'],
-            'Close': item['close'],
-            'Volume': item['volume'],
+    return pd.DataFrame(
+        {
+            'Open': series.open,
+            'High': series.high,
+            'Low': series.low,
+            'Close': series.close,
+            'Volume': series.volume,
             'Dividends': 0.0,
-            'Stock Splits': 0.0
-        }
-
-        converted_data.append(row)
-
-    df = pd.DataFrame(converted_data)
-    df.set_index('Date', inplace=True)
-    df.sort_index(inplace=True)
-
-    return df
+            'Stock Splits': 0.0,
+        },
+        index=pd.DatetimeIndex(series.datetimes(), name='Date'),
+    )
 
 # Get Stock Price
 # def get_stock_history(ticker, rating, reason):
@@ -210,11 +200,10 @@ def get_stock_history(ticker, rating, reason):
 
         # --- Try MongoDB/FMP first ---
         try:
-            historical_data = mongodb.get_or_update_historical(ticker, "max")
+            series = daily_bar_store.get_period_sync(ticker, "max")
 
-            if 'historical' in historical_data and historical_data['historical']:
-                raw_data = historical_data['historical']
-                hist = convert_raw_data_to_hist_format(raw_data)
+            if len(series):
+                hist = convert_bar_series_to_hist_format(series)
                 print(f"✅ Got historical data for {ticker} from MongoDB/FMP")
         except Exception as fmp_err:
             print(f"[WARN] MongoDB/FMP fetch failed for {ticker}: {fmp_err}")
@@ -15,13 +15,22 @@ from typing import List, Literal, Optional, Type, Dict, Union, Any
 # from src.backend.db.qdrant import search_similar_company_name
 from src.backend.utils.utils import pretty_format
 import concurrent.futures
-from .finance_scraper_utils import convert_fmp_to_json
+from .finance_scraper_utils import available_periods, period_rows
+from src.backend.utils.fmp_client import FMPNotEntitledError, fmp_client
+from src.backend.utils.async_runner import get_tool_executor
+from src.backend.utils.symbol_index import symbol_index
+from src.backend.utils.yf_variants import yf_variants
+from src.backend.utils.upstream_scheduler import upstream_scheduler
+from src.backend.db.bar_series import TradingDateIndex, day_number
+from src.backend.db.daily_bars import daily_bar_store
+from src.backend.db.country_macro import MACRO_METRICS, country_macro_store
 from src.ai.ai_schemas.tool_structured_input import QueryRequest, SearchCompanyInfoSchema, CompanySymbolSchema, StockDataSchema, CombinedFinancialStatementSchema, CurrencyExchangeRateSchema, TickerSchema
 import src.backend.db.mongodb as mongodb
 from src.ai.tools.web_search_tools import AdvancedInternetSearchTool
 # from crypto_data import get_crypto_data  
 from tavily import TavilyClient
 import yfinance as yf
+import httpx
 import pandas as pd
 import numpy as np
 
@@ -161,9 +170,7 @@ class SearchCompanyInfoTool(BaseTool):
     args_schema: Type[BaseModel] = SearchCompanyInfoSchema  
     def _fetch_fmp_data(self, query: str) -> Union[List[Dict[str, Any]], str]:
         try:
-            url = f"https://financialmodelingprep.com/stable/search-name?query={query}&apikey={fm_api_key}"
-            fmp_response = requests.get(url)
-            return fmp_response.json()
+            return fmp_client.get_json("/stable/search-name", {"query": query})
         except Exception as e:
             return f"Error in getting company information from FMP for {query}: {str(e)}"
         
@@ -199,7 +206,9 @@ class SearchCompanyInfoTool(BaseTool):
 
     def _fetch_data_for_single_ticker(self, query_request: QueryRequest) -> Dict[str, Any]:
        
-       fmp_data = self._fetch_fmp_data(query_request.query)       
+       fmp_data = symbol_index.search(query_request.query, exchange=query_request.exchange_short_name)
+       if not fmp_data:
+           fmp_data = self._fetch_fmp_data(query_request.query)
        return {
            "query": query_request.query,
            "type": query_request.type,
@@ -213,28 +222,28 @@ class SearchCompanyInfoTool(BaseTool):
 
     def _run(self, query_list: List[QueryRequest], explanation: str) -> Dict[str, Any]:
         results = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=len(query_list)) as executor:
-            future_to_query = {
-                executor.submit(self._fetch_data_for_single_ticker, query_obj): query_obj
-                for query_obj in query_list
-            }
+        executor = get_tool_executor()
+        future_to_query = {
+            executor.submit(self._fetch_data_for_single_ticker, query_obj): query_obj
+            for query_obj in query_list
+        }
 
 
-            for future in concurrent.futures.as_completed(future_to_query):
-                query_obj = future_to_query[future]
-                try:
-                    result = future.result()
-                    results.append(result)
-                except Exception as e:
-                    results.append({
-                        "query": query_obj.query,
-                        "type": query_obj.type,
-                        "exchange_short_name": query_obj.exchange_short_name,
-                        "error": f"Error processing {query_obj.query}: {str(e)}",
-                        "fmp_data": None,
-                        "yf_data": None,
-                        "source": []
-                    })
+        for future in concurrent.futures.as_completed(future_to_query):
+            query_obj = future_to_query[future]
+            try:
+                result = future.result()
+                results.append(result)
+            except Exception as e:
+                results.append({
+                    "query": query_obj.query,
+                    "type": query_obj.type,
+                    "exchange_short_name": query_obj.exchange_short_name,
+                    "error": f"Error processing {query_obj.query}: {str(e)}",
+                    "fmp_data": None,
+                    "yf_data": None,
+                    "source": []
+                })
 
 
         return {"results": results}
@@ -853,6 +862,93 @@ class GetStockData(BaseTool):
         except Exception:
             return lst
 
+    def historical_from_store(self, ticker: str, period: Optional[str] = None):
+        """
+        Historical section cut from a single read of the stored daily series.
+
+        With `period` only that period is returned. Without it, "data" holds the
+        shortest period that has bars and "period" lists every period the series
+        covers, so chart period switches (the /stock_data endpoint) are sliced
+        from the same stored series instead of probing one period at a time.
+        Returns None when the store has no bars for the ticker.
+        """
+        series = daily_bar_store.get_period_sync(ticker, "MAX")
+        if period:
+            data = period_rows(series, period)
+            return {"period": period, "data": data} if data else None
+        periods = available_periods(series)
+        if not periods:
+            return None
+        return {"period": periods, "data": period_rows(series, periods[0])}
+
+    @staticmethod
+    def _clean_realtime(realtime_response, ticker: str) -> dict:
+        """Ensure symbol/timestamp/companyName exist and drop empty fields."""
+        if isinstance(realtime_response, dict) and "symbol" not in realtime_response:
+            realtime_response["symbol"] = ticker
+        if isinstance(realtime_response, dict):
+            if "timestamp" not in realtime_response or not realtime_response.get("timestamp"):
+                realtime_response["timestamp"] = datetime.now(timezone.utc).isoformat()
+            if "companyName" not in realtime_response and "name" in realtime_response:
+                realtime_response["companyName"] = realtime_response.get("name")
+        return {k: v for k, v in (realtime_response or {}).items() if v is not None}
+
+    @staticmethod
+    def _mark_active(result: dict):
+        """Set historical.is_active: the last bar is at most 5 days old."""
+        try:
+            data_list = []
+            if isinstance(result.get("historical"), dict):
+                data_list = result["historical"].get("data", []) or []
+            elif isinstance(result.get("historical"), list):
+                data_list = result["historical"]
+            if data_list:
+                last_day = TradingDateIndex.from_rows(data_list).last_day
+                if last_day is not None:
+                    days_diff = day_number(datetime.now().date()) - last_day
+                    result["historical"]["is_active"] = False if days_diff > 5 else True
+                else:
+                    result["historical"]["is_active"] = False
+            else:
+                if isinstance(result.get("historical"), dict):
+                    result["historical"]["is_active"] = False
+        except Exception:
+            if isinstance(result.get("historical"), dict):
+                result["historical"]["is_active"] = False
+            else:
+                result["historical"] = {"error": "is_active check failed", "data": result.get("historical", {})}
+
+    @staticmethod
+    def _set_message(result: dict):
+        try:
+            if (not isinstance(result.get('historical', {}), dict) or 'error' not in result['historical']) and (not isinstance(result.get('realtime', {}), dict) or 'error' not in result['realtime']):
+                result['message'] = "A graph has been generated and shown to the user so do not include this data in the response."
+            else:
+                result['message'] = "Generate a graph based on this data which is visible to the user."
+        except Exception:
+            result['message'] = "Generate a graph based on this data which is visible to the user."
+
+    def chart_from_store(self, ticker: str, exchange_symbol: str, period: str):
+        """
+        Chart payload for a period switch without running the full tool: the
+        historical slice from the stored daily series and the realtime block from
+        the cached quote, shaped like `_run`'s result. Returns None when either is
+        unavailable so the caller can fall back to `_run`.
+        """
+        historical = self.historical_from_store(ticker, period)
+        if not historical:
+            return None
+        quote = mongodb.fetch_quotes([(ticker, exchange_symbol)]).get(ticker.upper())
+        if not quote:
+            return None
+        result = {
+            "realtime": self._clean_realtime(dict(quote), ticker),
+            "historical": {"source": "https://financialmodelingprep.com/", **historical},
+        }
+        self._mark_active(result)
+        self._set_message(result)
+        return result
+
     # main runner 
     def _run(self, ticker_data: List[TickerSchema], explanation: str = None, period: str = "1M", strictly: bool = False):
         def process_ticker(ticker_info):
@@ -865,35 +961,22 @@ class GetStockData(BaseTool):
             try:
                 if exchange_symbol and ticker:
                     try:
-                        url = f"https://financialmodelingprep.com/stable/quote/?symbol={ticker}&apikey={fm_api_key}"
-                        currency_url = f'https://financialmodelingprep.com/stable/search-symbol?query={ticker}&apikey={fm_api_key}'
-                        data_resp = requests.get(url, timeout=10)
-                        search_resp = requests.get(currency_url, timeout=8)
-                        if data_resp.ok:
-                            fmp_json = data_resp.json()
-                        else:
-                            print(f"[DEBUG] FMP realtime status {data_resp.status_code} for {ticker}")
-                            fmp_json = None
-                        if isinstance(fmp_json, list) and len(fmp_json) > 0 and isinstance(fmp_json[0], dict):
-                            realtime_response = dict(fmp_json[0])
-                            if search_resp.ok:
-                                currency_json = search_resp.json()
-                                if isinstance(currency_json, list) and len(currency_json) > 0 and isinstance(currency_json[0], dict):
-                                    realtime_response["currency"] = currency_json[0].get("currency", realtime_response.get("currency", "USD"))
-                                else:
-                                    realtime_response.setdefault("currency", realtime_response.get("currency", "USD"))
+                        try:
+                            if prefetched_quotes is not None:
+                                fmp_quote = prefetched_quotes.get(ticker.upper())
                             else:
-                                realtime_response.setdefault("currency", realtime_response.get("currency", "USD"))
+                                fmp_quote = mongodb.fetch_quote(ticker, exchange_symbol)
+                        except httpx.HTTPStatusError as e_status:
+                            print(f"[DEBUG] FMP realtime status {e_status.response.status_code} for {ticker}")
+                            fmp_quote = None
+                        if fmp_quote:
+                            realtime_response = fmp_quote
                         else:
                             cand = self._candidate_yf_tickers(ticker, exchange_symbol)
-                            for c in cand:
-                                try:
-                                    rt = self._yf_realtime(c)
-                                    if rt and rt.get("price") is not None:
-                                        realtime_response = rt
-                                        break
-                                except Exception:
-                                    continue
+                            _, realtime_response = yf_variants.probe(
+                                ticker, exchange_symbol, cand, self._yf_realtime,
+                                lambda rt: bool(rt) and rt.get("price") is not None,
+                            )
                             if realtime_response is None:
                                 realtime_response = {"error": "Failed to fetch realtime from FMP and yfinance."}
                     except Exception as e_fmp_rt:
@@ -904,97 +987,51 @@ class GetStockData(BaseTool):
             except Exception as e:
                 realtime_response = {"error": f"Failed to get realtime data: {str(e)}"}
 
-            # ensure symbol/timestamp/companyName exist
-            if isinstance(realtime_response, dict) and "symbol" not in realtime_response:
-                realtime_response["symbol"] = ticker
-            if isinstance(realtime_response, dict):
-                if "timestamp" not in realtime_response or not realtime_response.get("timestamp"):
-                    realtime_response["timestamp"] = datetime.now(timezone.utc).isoformat()
-                if "companyName" not in realtime_response and "name" in realtime_response:
-                    realtime_response["companyName"] = realtime_response.get("name")
-            result["realtime"] = {k: v for k, v in (realtime_response or {}).items() if v is not None}
-
-            # Historical: try DB/FMP -> if 402 fallback to yfinance (and upsert optionally)
+            result["realtime"] = self._clean_realtime(realtime_response, ticker)
+
+            # Historical: one read of the stored daily series -> if 402 fallback to yfinance (and upsert optionally)
             try:
-                periods = ["1M", "3M", "6M", "YTD", "1Y", "5Y", "MAX"]
-                historical_data = None
-                successful_period_index = None
+                historical_section = None
                 fmp_payment_required = False
 
                 if exchange_symbol and ticker:
                     try:
-                        if not strictly:
-                            for i, p in enumerate(periods):
-                                try:
-                                    hist = mongodb.get_or_update_historical(ticker, p)
-                                    print(f"[DEBUG] mongodb.get_or_update_historical({ticker}, {p}) returned type={type(hist)}")
-                                    normalized = self._normalize_historical_payload(hist)
-                                    if normalized:
-                                        historical_data = normalized
-                                        successful_period_index = i
-                                        break
-                                except Exception as e_db:
-                                    txt = str(e_db).lower()
-                                    print(f"[ERROR] mongodb fetch failed for {ticker}: {e_db}")
-                                    if "402" in txt or "payment required" in txt or ("payment" in txt and "required" in txt):
-                                        print(f"[WARN] Detected FMP payment required for {ticker}; falling back to yfinance.")
-                                        fmp_payment_required = True
-                                        historical_data = None
-                                        break
-                                    else:
-                                        continue
-                        else:
-                            try:
-                                hist = mongodb.get_or_update_historical(ticker, period)
-                                historical_data = self._normalize_historical_payload(hist)
-                            except Exception as e_db:
-                                txt = str(e_db).lower()
-                                print(f"[ERROR] strict mongodb fetch failed: {e_db}")
-                                if "402" in txt or "payment required" in txt:
-                                    fmp_payment_required = True
-                                    historical_data = None
-                                else:
-                                    historical_data = None
-                    except Exception as e_db_outer:
-                        print(f"[ERROR] mongodb outer exception for {ticker}: {e_db_outer}")
-                        historical_data = None
-                else:
-                    historical_data = None
-
-                if historical_data:
-                    try:
-                        formatted_data = convert_fmp_to_json(historical_data, ticker)
-                    except Exception as e_conv:
-                        print(f"[WARN] convert_fmp_to_json failed for {ticker}: {e_conv}; using passthrough normalized data")
-                        formatted_data = self._ensure_newest_first(historical_data)
-                    formatted_data = self._ensure_newest_first(formatted_data)
-                    result["historical"] = {"source": "https://financialmodelingprep.com/"}
-                    result["historical"]["period"] = period if strictly else periods[successful_period_index:]
-                    result["historical"]["data"] = formatted_data
+                        historical_section = self.historical_from_store(ticker, period if strictly else None)
+                    except FMPNotEntitledError as e_plan:
+                        print(f"[WARN] FMP history not in plan for {ticker} ({'cached' if e_plan.cached else 'new'}); falling back to yfinance.")
+                        fmp_payment_required = True
+                    except Exception as e_db:
+                        print(f"[ERROR] daily bar store fetch failed for {ticker}: {e_db}")
+
+                if historical_section:
+                    result["historical"] = {"source": "https://financialmodelingprep.com/", **historical_section}
                 else:
                     yf_success = False
                     candidates = self._candidate_yf_tickers(ticker, exchange_symbol)
-                    for cand in candidates:
-                        chosen_period, yf_list = self._try_yf_multi_periods(cand, desired_period=period if strictly else "1M")
-                        if yf_list:
-                            # normalise records for frontend expectations
-                            for rec in yf_list:
-                                rec.setdefault("ticker", ticker)
-                                try:
-                                    dt = pd.to_datetime(rec.get("date"), errors="coerce")
-                                    if not pd.isna(dt):
-                                        rec["date"] = dt.strftime("%b %d, %Y")
-                                except Exception:
-                                    pass
-                                if ("open" not in rec or rec.get("open") is None) and rec.get("open_num") is not None:
-                                    rec["open"] = ("{:.8f}".format(rec["open_num"])).rstrip("0").rstrip(".")
-                                if ("high" not in rec or rec.get("high") is None) and rec.get("high_num") is not None:
-                                    rec["high"] = ("{:.8f}".format(rec["high_num"])).rstrip("0").rstrip(".")
-                                if ("close" not in rec or rec.get("close") is None) and rec.get("close_num") is not None:
-                                    rec["close"] = ("{:.8f}".format(rec["close_num"])).rstrip("0").rstrip(".")
-                            result["historical"] = {"source": "yfinance", "period": chosen_period or (period if strictly else "1M"), "data": yf_list}
-                            yf_success = True
-                            break
+                    _, probed = yf_variants.probe(
+                        ticker, exchange_symbol, candidates,
+                        lambda cand: self._try_yf_multi_periods(cand, desired_period=period if strictly else "1M"),
+                        lambda found: bool(found and found[1]),
+                    )
+                    if probed:
+                        chosen_period, yf_list = probed
+                        # normalise records for frontend expectations
+                        for rec in yf_list:
+                            rec.setdefault("ticker", ticker)
+                            try:
+                                dt = pd.to_datetime(rec.get("date"), errors="coerce")
+                                if not pd.isna(dt):
+                                    rec["date"] = dt.strftime("%b %d, %Y")
+                            except Exception:
+                                pass
+                            if ("open" not in rec or rec.get("open") is None) and rec.get("open_num") is not None:
+                                rec["open"] = ("{:.8f}".format(rec["open_num"])).rstrip("0").rstrip(".")
+                            if ("high" not in rec or rec.get("high") is None) and rec.get("high_num") is not None:
+                                rec["high"] = ("{:.8f}".format(rec["high_num"])).rstrip("0").rstrip(".")
+                            if ("close" not in rec or rec.get("close") is None) and rec.get("close_num") is not None:
+                                rec["close"] = ("{:.8f}".format(rec["close_num"])).rstrip("0").rstrip(".")
+                        result["historical"] = {"source": "yfinance", "period": chosen_period or (period if strictly else "1M"), "data": yf_list}
+                        yf_success = True
 
                     # final fallback explicit fetch & format
                     if not yf_success:
@@ -1017,64 +1054,42 @@ class GetStockData(BaseTool):
                 print(f"[ERROR] historical section failed for {ticker}: {e}")
                 result["historical"] = {"error": f"Stock history scrapping error: {e}", "data": [], "source": None}
 
-            # is_active
-            try:
-                data_list = []
-                if isinstance(result.get("historical"), dict):
-                    data_list = result["historical"].get("data", []) or []
-                elif isinstance(result.get("historical"), list):
-                    data_list = result["historical"]
-                last_entry = data_list[0] if data_list else None
-                if last_entry:
-                    date_str = last_entry.get("date", "")
-                    try:
-                        if "-" in date_str:
-                            last_date = datetime.strptime(date_str, "%Y-%m-%d").date()
-                        else:
-                            last_date = datetime.strptime(date_str, "%b %d, %Y").date()
-                        days_diff = (datetime.now().date() - last_date).days
-                        result["historical"]["is_active"] = False if days_diff > 5 else True
-                    except Exception:
-                        result["historical"]["is_active"] = False
-                else:
-                    if isinstance(result.get("historical"), dict):
-                        result["historical"]["is_active"] = False
-            except Exception:
-                if isinstance(result.get("historical"), dict):
-                    result["historical"]["is_active"] = False
-                else:
-                    result["historical"] = {"error": "is_active check failed", "data": result.get("historical", {})}
-
-            try:
-                if (not isinstance(result.get('historical', {}), dict) or 'error' not in result['historical']) and (not isinstance(result.get('realtime', {}), dict) or 'error' not in result['realtime']):
-                    result['message'] = "A graph has been generated and shown to the user so do not include this data in the response."
-                else:
-                    result['message'] = "Generate a graph based on this data which is visible to the user."
-            except Exception:
-                result['message'] = "Generate a graph based on this data which is visible to the user."
-
+            self._mark_active(result)
+            self._set_message(result)
             return result
 
         all_results = []
         if not ticker_data:
             return all_results
-        with concurrent.futures.ThreadPoolExecutor(max_workers=len(ticker_data)) as executor:
-            future_to_ticker = {executor.submit(process_ticker, ticker_info): ticker_info for ticker_info in ticker_data}
-            for future in concurrent.futures.as_completed(future_to_ticker):
-                ticker_info = future_to_ticker[future]
-                try:
-                    res = future.result()
-                    if not isinstance(res, dict):
-                        res = {"realtime": {"symbol": getattr(ticker_info, "ticker", "unknown"), "timestamp": datetime.now(timezone.utc).isoformat()}, "historical": {"data": []}, "message": "Generate a graph based on this data which is visible to the user."}
-                    if "historical" not in res or not isinstance(res["historical"], dict):
-                        res.setdefault("historical", {"data": []})
-                    if "data" not in res["historical"]:
-                        res["historical"].setdefault("data", [])
-                    all_results.append(res)
-                except Exception as e:
-                    print(f"[ERROR] processing worker failed: {e}")
-                    fallback = {"realtime": {"symbol": getattr(ticker_info, "ticker", "unknown"), "timestamp": datetime.now(timezone.utc).isoformat()}, "historical": {"data": [], "error": str(e)}, "message": "Generate a graph based on this data which is visible to the user."}
-                    all_results.append(fallback)
+
+        # One batched upstream quote request for every ticker FMP can serve;
+        # on failure each worker falls back to its own quote lookup.
+        quote_symbols = [(t.ticker, t.exchange_symbol) for t in ticker_data
+                         if getattr(t, "ticker", None) and getattr(t, "exchange_symbol", None)]
+        prefetched_quotes = None
+        if quote_symbols:
+            try:
+                prefetched_quotes = mongodb.fetch_quotes(quote_symbols)
+            except Exception as e_batch:
+                print(f"[DEBUG] FMP batch quote failed, using per-ticker quotes: {e_batch}")
+
+        executor = get_tool_executor()
+        future_to_ticker = {executor.submit(process_ticker, ticker_info): ticker_info for ticker_info in ticker_data}
+        for future in concurrent.futures.as_completed(future_to_ticker):
+            ticker_info = future_to_ticker[future]
+            try:
+                res = future.result()
+                if not isinstance(res, dict):
+                    res = {"realtime": {"symbol": getattr(ticker_info, "ticker", "unknown"), "timestamp": datetime.now(timezone.utc).isoformat()}, "historical": {"data": []}, "message": "Generate a graph based on this data which is visible to the user."}
+                if "historical" not in res or not isinstance(res["historical"], dict):
+                    res.setdefault("historical", {"data": []})
+                if "data" not in res["historical"]:
+                    res["historical"].setdefault("data", [])
+                all_results.append(res)
+            except Exception as e:
+                print(f"[ERROR] processing worker failed: {e}")
+                fallback = {"realtime": {"symbol": getattr(ticker_info, "ticker", "unknown"), "timestamp": datetime.now(timezone.utc).isoformat()}, "historical": {"data": [], "error": str(e)}, "message": "Generate a graph based on this data which is visible to the user."}
+                all_results.append(fallback)
         return all_results
 
 class CombinedFinancialStatementTool(BaseTool):
@@ -1254,44 +1269,40 @@ class CompanyEssentialFinancialsTool(BaseTool):
     """
     args_schema: Type[BaseModel] = FinancialsDataSchema
 
+    # statement types the consolidation needs; ratios are optional (not in every FMP plan)
+    REQUIRED_STATEMENTS = ("income_statement", "balance_sheet", "key_metrics")
+    OPTIONAL_STATEMENTS = ("ratios",)
+
     def _run(self, symbols: List[str], limit: int = 5):
         print("===company agent===")
+        # One bulk lookup for every symbol: cached statements are served locally and
+        # only the misses go to FMP, concurrently on the shared runner loop.
+        statement_types = list(self.REQUIRED_STATEMENTS + self.OPTIONAL_STATEMENTS)
+        try:
+            fundamentals = mongodb.fetch_fundamentals(symbols, statement_types, limit=limit)
+        except Exception as e:
+            return [{"symbol": s, "error": f"An unexpected error occurred: {str(e)}"} for s in symbols]
+
         all_results = []
-        with concurrent.futures.ThreadPoolExecutor(max_workers=len(symbols)) as executor:
-            future_to_symbol = {executor.submit(self._process_symbol, s, limit): s for s in symbols}
-            for future in concurrent.futures.as_completed(future_to_symbol):
-                symbol = future_to_symbol[future]
-                try:
-                    all_results.append(future.result())
-                except Exception as e:
-                    all_results.append({"symbol": symbol, "error": f"An unexpected error occurred: {str(e)}"})
+        for symbol in dict.fromkeys(s.upper() for s in symbols):
+            try:
+                all_results.append(self._process_symbol(symbol, fundamentals.get(symbol, {}), limit))
+            except Exception as e:
+                all_results.append({"symbol": symbol, "error": f"An unexpected error occurred: {str(e)}"})
         return all_results
 
-    def _fetch_data(self, url: str):
-        try:
-            response = requests.get(url)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as err:
-            print(f"An error occurred: {err} for URL: {url}")
-        return None
-
-    def _process_symbol(self, symbol: str, limit: int):
-        print(f"--Tool Call: Fetching financial data for {symbol}--")       
+    def _process_symbol(self, symbol: str, data_map: Dict[str, Any], limit: int):
+        print(f"--Tool Call: Consolidating financial data for {symbol}--")
 
-        base_url = "https://financialmodelingprep.com/stable"
-        urls = {
-            "income": f"{base_url}/income-statement?symbol={symbol}&period=annual&limit={limit}&apikey={fm_api_key}",
-            "balance": f"{base_url}/balance-sheet-statement?symbol={symbol}&period=annual&limit={limit}&apikey={fm_api_key}",
-            "metrics": f"{base_url}/key-metrics?symbol={symbol}&period=annual&limit={limit}&apikey={fm_api_key}",
-            "ratios": f"{base_url}/ratios?symbol={symbol}&period=annual&limit={limit}&apikey={fm_api_key}"
-        }
-        
-        with concurrent.futures.ThreadPoolExecutor(max_workers=3) as executor:
-            future_to_url = {executor.submit(self._fetch_data, url): key for key, url in urls.items()}
-            data_map = {future_to_url[future]: future.result() for future in concurrent.futures.as_completed(future_to_url)}
+        def rows(statement_type: str) -> Optional[List[dict]]:
+            data = data_map.get(statement_type)
+            if isinstance(data, BaseException):
+                print(f"An error occurred: {data} for {statement_type} of {symbol}")
+                return None
+            return data[:limit] if isinstance(data, list) else None
 
-        income_data, balance_data, metrics_data, ratios_data = data_map.get("income"), data_map.get("balance"), data_map.get("metrics"), data_map.get("ratios")
+        income_data, balance_data, metrics_data = (rows(st) for st in self.REQUIRED_STATEMENTS)
+        ratios_data = rows("ratios") or []
 
         if not all((income_data, balance_data, metrics_data)):
             return {"symbol": symbol, "error": "Failed to fetch complete financial data."}
@@ -1355,6 +1366,7 @@ class CountryFinancialInput(BaseModel):
 
 # Tavily web search function (as provided)
 def tavily_web_search(query: str, num_results: int = 2):
+    upstream_scheduler.acquire_sync("tavily")
     response = tavily_client.search(
         query=query,
         max_results=5,
@@ -1392,62 +1404,59 @@ class CountryFinancialTool(BaseTool):
         print(" ====== Country Agent =======")
         current_year = datetime.now().year
         years = list(range(current_year -3 , current_year + 1))  # Last 4 years: 2021–2024
-        metrics = [
-            ("GDP growth rate", "gdp_growth_rate"),
-            ("inflation rate", "inflation_rate"),
-            ("debt-to-GDP ratio", "debt_to_gdp_ratio"),
-            ("trade balance as a percentage of GDP", "trade_balance"),
-            ("FDI inflows as a percentage of GDP", "fdi_inflows")
-        ]
-        
-        # Generate questions
-        questions = [
-            f"what is the {metric[0]} for {country} for the year {year}?"
-            for year in years
-            for metric in metrics
-        ]
-        
-        # Initialize the list of metrics for the country
-        metric_list = []
+        metric_keys = list(MACRO_METRICS)
+
+        # Served from the country macro store; only (metric, year) pairs it has no
+        # fresh value for are looked up on the web, then stored for the next caller.
+        try:
+            values = country_macro_store.get_many_sync(country, metric_keys, years)
+        except Exception as e:
+            print(f"Country macro store unavailable: {e}")
+            values = {}
+
+        looked_up = {}
         for year in years:
-            metric_data = {
-                "year": year,
-                "gdp_growth_rate": None,
-                "inflation_rate": None,
-                "debt_to_gdp_ratio": None,
-                "trade_balance": None,
-                "fdi_inflows": None
-            }
-            
-            # Query Tavily for each metric
-            for metric_name, metric_key in metrics:
-                query = f"what is the {metric_name} for {country} for the year {year}?"
+            for metric_key in metric_keys:
+                if (metric_key, year) in values:
+                    continue
                 try:
-                    result = tavily_web_search(query, num_results=2)
-                    concise_answer = result.get("concise answer")
-                    
-                    # Extract numerical value from the answer
-                    if concise_answer:
-                        # Look for percentage values (e.g., "5.0%", "-1.2%")
-                        numbers = re.findall(r"[-]?\d+\.?\d*%", concise_answer)
-                        if numbers:
-                            try:
-                                value = float(numbers[0].strip("%"))
-                                metric_data[metric_key] = value
-                            except ValueError:
-                                print(f"Failed to parse number for {metric_name}, {year}: {concise_answer}")
-                        else:
-                            print(f"No percentage value found for {metric_name}, {year}: {concise_answer}")
-                    else:
-                        print(f"No concise answer for {metric_name}, {year}")
-                    time.sleep(1.2)  # Avoid rate limiting
+                    looked_up[(metric_key, year)] = self._search_metric(country, MACRO_METRICS[metric_key], year)
                 except Exception as e:
-                    print(f"Error querying {metric_name} for {year}: {e}")
-            
-            metric_list.append(Metric(**metric_data))
-        
+                    # not stored, so the next call retries it
+                    print(f"Error querying {MACRO_METRICS[metric_key]} for {year}: {e}")
+        if looked_up:
+            values.update(looked_up)
+            try:
+                country_macro_store.put_many_sync(country, looked_up, "tavily")
+            except Exception as e:
+                print(f"Could not store country macro values for {country}: {e}")
+
+        metric_list = [
+            Metric(year=year, **{metric_key: values.get((metric_key, year)) for metric_key in metric_keys})
+            for year in years
+        ]
         return CountryFinancial(country=country, list_of_metrics=metric_list)
 
+    @staticmethod
+    def _search_metric(country: str, metric_name: str, year: int) -> Optional[float]:
+        """Percentage value from a web search answer, None if it has none. Paced by the upstream scheduler."""
+        query = f"what is the {metric_name} for {country} for the year {year}?"
+        result = tavily_web_search(query, num_results=2)
+        concise_answer = result.get("concise answer")
+        if not concise_answer:
+            print(f"No concise answer for {metric_name}, {year}")
+            return None
+        # Look for percentage values (e.g., "5.0%", "-1.2%")
+        numbers = re.findall(r"[-]?\d+\.?\d*%", concise_answer)
+        if not numbers:
+            print(f"No percentage value found for {metric_name}, {year}: {concise_answer}")
+            return None
+        try:
+            return float(numbers[0].strip("%"))
+        except ValueError:
+            print(f"Failed to parse number for {metric_name}, {year}: {concise_answer}")
+            return None
+
 
 # get_country_financial = CountryFinancialTool()
 get_company_essential_financials = CompanyEssentialFinancialsTool()
@@ -1,8 +1,10 @@
 import os
 import re
-import requests
+import httpx
 from datetime import datetime, timedelta, timezone
-from collections import defaultdict
+import numpy as np
+from src.backend.db.bar_series import FREQUENCIES, BarSeries, TradingDateIndex, group_bounds
+from src.backend.db.daily_bars import daily_bar_store
 
 fmp_api_key = os.environ.get("FM_API_KEY")
 
@@ -31,114 +33,120 @@ def convert_yf_to_json(df, ticker):
     return result
 
 
+_MONTH_ABBR = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+
+def _display_dates(days):
+    """Day numbers -> "MMM DD, YYYY" labels, with the calendar fields split out in NumPy."""
+    dt = np.asarray(days, dtype=np.int64).astype("datetime64[D]")
+    months = dt.astype("datetime64[M]")
+    years = dt.astype("datetime64[Y]").astype(np.int64) + 1970
+    month_idx = months.astype(np.int64) % 12
+    day_of_month = (dt - months.astype("datetime64[D]")).astype(np.int64) + 1
+    return [f"{_MONTH_ABBR[m]} {d:02d}, {y}"
+            for m, d, y in zip(month_idx.tolist(), day_of_month.tolist(), years.tolist())]
+
+
+def bar_series_to_json(series: BarSeries, newest_first: bool = False):
+    """Display rows for a BarSeries: "MMM DD, YYYY" dates, 2-dp prices, comma-grouped volume."""
+    labels = _display_dates(series.dates)
+    rows = []
+    for label, o, h, l, c, v in zip(labels, series.open.tolist(), series.high.tolist(), series.low.tolist(),
+                                     series.close.tolist(), series.volume.tolist()):
+        rows.append({
+            "date": label,
+            "open": f"{o:.2f}" if o == o else None,
+            "high": f"{h:.2f}" if h == h else None,
+            "low": f"{l:.2f}" if l == l else None,
+            "close": f"{c:.2f}" if c == c else None,
+            "volume": f"{int(v):,}" if v == v else None,
+        })
+    if newest_first:
+        rows.reverse()
+    return rows
+
+
 def convert_fmp_to_json(fmp_data, ticker):
     """
     Convert FMP API response to the same JSON format as the original code.
     Returns data in chronological order (oldest to newest).
     
     Args:
-        fmp_data: List of historical data from FMP API
+        fmp_data: List of historical data from FMP API, or a BarSeries
         ticker: Stock symbol
     """
-    result = []
-    for item in fmp_data:
-        # Parse the date from FMP format (YYYY-MM-DD)
-        date_obj = datetime.strptime(item['date'], "%Y-%m-%d")
-        formatted_date = date_obj.strftime("%b %d, %Y")
-        
-        row_dict = {
-            "date": formatted_date,
-            "open": f"{float(item['open']):.2f}",
-            "high": f"{float(item['high']):.2f}",
-            "low": f"{float(item['low']):.2f}",
-            "close": f"{float(item['close']):.2f}",
-            "volume": f"{int(float(item['volume'])):,}"
-        }
-        result.append(row_dict)
-    
-    # Sort by date (oldest to newest) to match original behavior
-    result = sorted(result, key=lambda x: datetime.strptime(x["date"], "%b %d, %Y"))
-    return result
+    series = fmp_data if isinstance(fmp_data, BarSeries) else BarSeries.from_records(ticker, fmp_data)
+    return bar_series_to_json(series)
+
+
+CHART_PERIODS = ["1M", "3M", "6M", "YTD", "1Y", "5Y", "MAX"]
+_PERIOD_ALIASES = {"1m": "1mo", "3m": "3mo", "6m": "6mo"}
+
+
+def chart_window(period: str, today=None):
+    """
+    (start_date, frequency) for a chart period. Accepts the tool/UI names
+    ("1M", "YTD", ...) as well as the yfinance-style ones ("1mo", "ytd", ...).
+    """
+    today = today or datetime.now(timezone.utc).date()
+    period = (period or "").lower()
+    period = _PERIOD_ALIASES.get(period, period)
+
+    # Date calculations - matching exact logic from original
+    if period == "1mo":
+        return today - timedelta(days=31), "1d"
+    elif period == "3mo":
+        return today - timedelta(days=93), "1d"
+    elif period == "6mo":
+        return today - timedelta(days=186), "1wk"
+    elif period == "ytd":
+        start_date = today.replace(month=1, day=1)
+        return start_date, "1wk" if today - start_date > timedelta(days=92) else "1d"
+    elif period == "1y":
+        return today - timedelta(days=365), "1wk"
+    elif period == "5y":
+        return today - timedelta(days=1825), "1mo"
+    elif period == "max":
+        return today - timedelta(days=7300), "1mo"
+    # Default case
+    return today - timedelta(days=30), "1d"
+
+
+def period_rows(series: BarSeries, period: str, newest_first: bool = True, today=None):
+    """Display rows for one chart period, cut from an already loaded series and downsampled."""
+    start_date, frequency = chart_window(period, today)
+    return bar_series_to_json(series.slice(start_date).resample(frequency), newest_first=newest_first)
+
+
+def available_periods(series: BarSeries, today=None):
+    """Chart periods (in CHART_PERIODS order) for which `series` has at least one bar."""
+    return [p for p in CHART_PERIODS if len(series.slice(chart_window(p, today)[0]))]
 
 
 def get_historical_data_fmp(ticker: str, period: str):
     """
-    Retrieve historical data for a given ticker from Financial Modeling Prep API.
-    Uses simple datetime grouping since FMP data already excludes non-trading days.
+    Retrieve historical data for a given ticker from the daily bar store (FMP EOD),
+    downsampled to the period's chart frequency.
     
     Args:
         ticker: Stock symbol (e.g., "AAPL")
         period: Time period ("1mo", "3mo", "6mo", "ytd", "1y", "5y", "max")
-        api_key: Your FMP API key
     """
     try:
-        frequency = "1d"
-        today = datetime.now(timezone.utc)
-
-        # Date calculations - matching exact logic from original
-        if period == "1mo":
-            start_date = today - timedelta(days=31)
-            frequency = "1d"
-        elif period == "3mo":
-            start_date = today - timedelta(days=93)
-            frequency = "1d"
-        elif period == "6mo":
-            start_date = today - timedelta(days=186)
-            frequency = "1wk"
-        elif period == "ytd":
-            start_date = datetime(today.year, 1, 1, tzinfo=timezone.utc)
-            if today - datetime(today.year, 1, 1, tzinfo=timezone.utc) > timedelta(days=92):
-                frequency = "1wk"
-            else:
-                frequency = "1d"
-        elif period == "1y":
-            start_date = today - timedelta(days=365)
-            frequency = "1wk"
-        elif period == "5y":
-            start_date = today - timedelta(days=1825)
-            frequency = "1mo"
-        elif period == "max":
-            start_date = today - timedelta(days=7300)
-            frequency = "1mo"
-        else:
-            # Default case
-            start_date = today - timedelta(days=30)
-            frequency = "1d"
-
-        # Format dates for FMP API
-        from_date = start_date.strftime("%Y-%m-%d")
-        to_date = today.strftime("%Y-%m-%d")
-        
-        # FMP API endpoint
-        # base_url = "https://financialmodelingprep.com/api/v3/historical-price-full"
-        # url = f"{base_url}/{ticker}?from={from_date}&to={to_date}&apikey={fmp_api_key}"
-        base_url = "https://financialmodelingprep.com/stable/historical-price-eod/full"
-        url = f"{base_url}?symbol={ticker}&from={from_date}&to={to_date}&apikey={fmp_api_key}"
-
-        print(f"Fetching data from FMP API: {url}")
+        start_date, frequency = chart_window(period)
+        print(f"Fetching data from daily bar store: {ticker} {start_date} -> today")
         print(f"Period: {period}, Frequency: {frequency}")
-        
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-        
-        if 'historical' in data and data['historical']:
-            raw_data = data['historical']
-            
-            # Convert to our JSON format first
-            formatted_data = convert_fmp_to_json(raw_data, ticker)
-            
-            # Apply frequency filtering using simple datetime grouping
-            filtered_data = apply_frequency_filter_simple(formatted_data, frequency)
-            
-            if filtered_data:
-                return filtered_data
-            else:
-                raise RuntimeError("No data available after filtering")
-        else:
+
+        series = daily_bar_store.get_bars_sync(ticker, start_date)
+        if not len(series):
             raise RuntimeError("No historical data found from FMP API")
-            
-    except requests.exceptions.RequestException as e:
+
+        filtered_data = period_rows(series, period, newest_first=False)
+        if not filtered_data:
+            raise RuntimeError("No data available after filtering")
+        return filtered_data
+
+    except httpx.HTTPError as e:
         print(f"Error fetching data from FMP API: {e}")
         raise e
     except Exception as e:
@@ -147,22 +155,27 @@ def get_historical_data_fmp(ticker: str, period: str):
 
 def apply_frequency_filter_simple(data, frequency):
     """
-    Apply frequency filtering using simple datetime grouping.
-    Since FMP data already excludes weekends/holidays, we just group and take last of each period.
-    
+    Keep the last trading day of each week ("1wk", ISO Monday-Sunday weeks) or
+    month ("1mo"); "1d" and unknown frequencies return the data unchanged.
+
+    Dates are parsed once into day numbers and the period boundaries are found in
+    one vectorized pass (see `BarSeries.resample`).
+
     Args:
-        data: List of formatted data with 'date' in "MMM DD, YYYY" format
+        data: BarSeries, or list of formatted data with 'date' in "MMM DD, YYYY" format
         frequency: "1d", "1wk", or "1mo"
     """
-    if frequency == "1d":
-        return data
-    elif frequency == "1wk":
-        return get_last_trading_day_of_week(data)
-    elif frequency == "1mo":
-        return get_last_trading_day_of_month(data)
-    else:
+    if isinstance(data, BarSeries):
+        if frequency not in FREQUENCIES:
+            frequency = "1d"
+        return bar_series_to_json(data.resample(frequency))
+    if frequency not in ("1wk", "1mo") or not data:
         return data
 
+    index = TradingDateIndex.from_rows(data)
+    _, ends = group_bounds(index.days, frequency)
+    return [data[pos] for pos in index.positions[ends].tolist()]
+
 def get_last_trading_day_of_week(data):
     """
     Group data by week and return the last trading day of each week.
@@ -171,28 +184,7 @@ def get_last_trading_day_of_week(data):
     Args:
         data: List of data with 'date' in "MMM DD, YYYY" format
     """
-    if not data:
-        return []
-    
-    # Group by week
-    weekly_groups = defaultdict(list)
-    for item in data:
-        date_obj = datetime.strptime(item['date'], "%b %d, %Y")
-        # Get ISO week (year, week_number)
-        iso_year, iso_week, _ = date_obj.isocalendar()
-        week_key = f"{iso_year}-W{iso_week:02d}"
-        weekly_groups[week_key].append((date_obj, item))
-    
-    # Get the last trading day from each week
-    result = []
-    for week_key in sorted(weekly_groups.keys()):
-        week_data = weekly_groups[week_key]
-        # Sort by date and take the last one (most recent in the week)
-        week_data.sort(key=lambda x: x[0])
-        last_trading_day = week_data[-1][1]  # Get the data item
-        result.append(last_trading_day)
-    
-    return result
+    return apply_frequency_filter_simple(data or [], "1wk")
 
 def get_last_trading_day_of_month(data):
     """
@@ -201,24 +193,4 @@ def get_last_trading_day_of_month(data):
     Args:
         data: List of data with 'date' in "MMM DD, YYYY" format
     """
-    if not data:
-        return []
-    
-    # Group by month
-    monthly_groups = defaultdict(list)
-    for item in data:
-        date_obj = datetime.strptime(item['date'], "%b %d, %Y")
-        # Get year-month key
-        month_key = f"{date_obj.year}-{date_obj.month:02d}"
-        monthly_groups[month_key].append((date_obj, item))
-    
-    # Get the last trading day from each month
-    result = []
-    for month_key in sorted(monthly_groups.keys()):
-        month_data = monthly_groups[month_key]
-        # Sort by date and take the last one (most recent in the month)
-        month_data.sort(key=lambda x: x[0])
-        last_trading_day = month_data[-1][1]  # Get the data item
-        result.append(last_trading_day)
-    
-    return result
\ No newline at end of file
+    return apply_frequency_filter_simple(data or [], "1mo")
@@ -5,6 +5,7 @@ import time
 import os 
 from pydantic import BaseModel, Field
 from src.ai.ai_schemas.tool_structured_input import GeocodeInput
+from src.backend.utils.upstream_scheduler import upstream_scheduler
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -41,6 +42,7 @@ class GoogleGeocodingTool(BaseTool):
             
             try:
                 print(f"---Geocoding: {place}---")
+                upstream_scheduler.acquire_sync("geocoding")
                 response = requests.get(url, params=params, timeout=GOOGLE_MAPS_TIMEOUT)
                 response.raise_for_status()
                 
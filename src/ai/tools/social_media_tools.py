@@ -8,6 +8,7 @@ from src.backend.utils.utils import pretty_format
 import os
 from src.ai.ai_schemas.tool_structured_input import RedditPostTextSchema, RedditSearchSchema, TwitterSearchSchema
 from langchain_tavily import TavilySearch
+from src.backend.utils.upstream_scheduler import upstream_scheduler
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 
@@ -67,6 +68,7 @@ Returns text extracted from twitter posts.
 
     def _search_with_tavily(self, tavily_tool, q):
         search_query = q
+        upstream_scheduler.acquire_sync("tavily")
         op = tavily_tool.invoke({"query": search_query})
         print(f"Tavily search completed for: {search_query}")
         return op['results']
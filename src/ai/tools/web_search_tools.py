@@ -17,6 +17,7 @@ from datetime import timezone
 import json
 import concurrent.futures
 from langchain_tavily import TavilySearch
+from src.backend.utils.upstream_scheduler import upstream_scheduler
 from src.backend.utils.utils import get_second_level_domain, get_favicon_link
 import src.backend.db.mongodb as mongodb
 from langgraph.config import get_stream_writer
@@ -350,6 +351,7 @@ When searching a query which is specific to a country or region, provide the cou
             # Try Tavily first
             try:
                 start = time.time()
+                upstream_scheduler.acquire_sync("tavily")
                 first_search = search_tavily.invoke(input={'query': q})
                 tavily_raw_results = first_search.get('results', [])
                 tavily_time = time.time() - start
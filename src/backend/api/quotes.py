@@ -0,0 +1,99 @@
+from collections import Counter
+from datetime import timedelta
+
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from src.backend.core.api_limit import apiSecurityFree
+from src.backend.db import mongodb
+from src.backend.utils.quote_hub import QuoteHubFull, quote_hub
+from src.backend.utils.stream_utils import sse_event
+
+router = APIRouter(prefix="/quotes", tags=["quotes"])
+
+MAX_SYMBOLS = 25
+# Concurrent streams one user may hold open on a worker.
+MAX_STREAMS_PER_USER = 4
+# A comment frame keeps proxies from closing an idle stream.
+KEEPALIVE_SECONDS = 15.0
+# EventSource cannot send an Authorization header, so /stream takes a signed
+# token in the query string. It is only checked when the stream opens.
+STREAM_TOKEN_TTL = timedelta(seconds=60)
+STREAM_TOKEN_CLAIM = "quote_stream_user"
+
+_open_streams: Counter = Counter()  # user id -> open streams on this worker
+
+
+def _stream_user(token: str) -> str:
+    # The token carries its own claim instead of `user_id`, so one leaked from a
+    # URL cannot be used as a bearer token on the other routes.
+    try:
+        payload = mongodb.jwt_handler.decode_jwt(token)
+    except Exception:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    user_id = payload.get(STREAM_TOKEN_CLAIM)
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return str(user_id)
+
+
+@router.post("/stream-token")
+async def stream_token(user: apiSecurityFree):
+    """Short-lived token for opening /quotes/stream."""
+    token = mongodb.jwt_handler.create_access_token({STREAM_TOKEN_CLAIM: str(user.id)}, STREAM_TOKEN_TTL)
+    return {"token": token, "expires_in": int(STREAM_TOKEN_TTL.total_seconds())}
+
+
+@router.get("/stream")
+async def stream_quotes(
+    request: Request,
+    symbols: str = Query(..., description="Comma-separated tickers e.g. AAPL,MSFT"),
+    token: str = Query(..., description="Token from POST /quotes/stream-token"),
+):
+    """
+    Server-sent events with realtime quotes for `symbols`: one `quote` event per
+    update, starting with the last known quote. Slow readers only ever receive
+    the newest quote per symbol.
+    """
+    user_id = _stream_user(token)
+    wanted = list(dict.fromkeys(s.strip().upper() for s in symbols.split(",") if s.strip()))
+    if not wanted:
+        raise HTTPException(status_code=400, detail="No symbols given.")
+    if len(wanted) > MAX_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_SYMBOLS} symbols per stream.")
+    if _open_streams[user_id] >= MAX_STREAMS_PER_USER:
+        raise HTTPException(status_code=429, detail=f"At most {MAX_STREAMS_PER_USER} open quote streams.")
+    if not await quote_hub.has_room(wanted):
+        raise HTTPException(status_code=503, detail="Quote stream is at its symbol limit.")
+
+    async def event_generator():
+        try:
+            sub = await quote_hub.subscribe(wanted)
+        except QuoteHubFull as e:
+            yield sse_event({"detail": str(e)}, "error")
+            return
+        _open_streams[user_id] += 1
+        try:
+            while not await request.is_disconnected():
+                frames = await sub.get(timeout=KEEPALIVE_SECONDS)
+                if not frames:
+                    yield b": keep-alive\n\n"
+                    continue
+                for frame in frames:
+                    yield sse_event(frame, "quote")
+        finally:
+            await quote_hub.unsubscribe(sub)
+            _open_streams[user_id] -= 1
+            if _open_streams[user_id] <= 0:
+                del _open_streams[user_id]
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/__stats")
+async def quote_hub_stats(user: apiSecurityFree):
+    return quote_hub.stats()
@@ -29,7 +29,12 @@ import src.backend.db.filestorage as filestorage
 from src.backend.db.mongodb import RelatedQueriesResponse,UploadResponse, MessageLog,StockDataRequest, QueryRequestModel
 from src.backend.core.api_limit import apiSecurityFree
 from src.ai.stock_prediction.stock_prediction import StockAnalysisAgent
-from src.backend.utils.api_utils import redis_manager
+from src.backend.utils.cancellation import cancellation_hub
+from src.backend.utils.stream_utils import PROGRESS_DONE, PROGRESS_STARTED, EventPump, TokenCoalescer, keep_alive_frame, sse_event
+from src.backend.utils.market_cache import market_cache
+from src.backend.utils.market_warmer import market_warmer
+from src.backend.utils.upstream_scheduler import Lane, bind as bind_upstream, upstream_scheduler
+from src.backend.db.daily_bars import daily_bar_store
 from src.backend.db.mongodb import handle_partial_data_storage
 from src.backend.utils.utils import render_charts_as_images
 
@@ -40,6 +45,18 @@ router = APIRouter()
 async def ping():
     return {"ok": True}
 
+@router.get("/__cache_stats")
+async def cache_stats(user: apiSecurityFree):
+    return market_cache.stats()
+
+@router.get("/__upstream_stats")
+async def upstream_stats(user: apiSecurityFree):
+    return upstream_scheduler.stats()
+
+@router.get("/__warmer_stats")
+async def warmer_stats(user: apiSecurityFree):
+    return market_warmer.stats()
+
 @router.get("/sessions")
 async def list_sessions2(user : apiSecurityFree, page: int = 1, limit: int = 25) -> Dict[str, Any]:
     """
@@ -149,7 +166,7 @@ async def query_and_stream(user: apiSecurityFree, query: QueryRequestModel, requ
     if not user_id:
         async def error_gen_missing_field():
             error_event = {"type": "error", "content": "user_id is required."}
-            yield f"event: error\ndata: {json.dumps(error_event)}\n\n"
+            yield sse_event(error_event, "error")
         return StreamingResponse(error_gen_missing_field(), media_type="text/event-stream", status_code=422)
 
     
@@ -159,15 +176,16 @@ async def query_and_stream(user: apiSecurityFree, query: QueryRequestModel, requ
 
     async def event_generator() -> AsyncGenerator[str, None]:
         nonlocal session_id, message_id
+        bind_upstream(user_id, Lane.INTERACTIVE)
 
         session_info_event_data = {
             "session_id": session_id,
             "message_id": message_id,
             "status": "starting query processing"
         }
-        yield f"event: session_info\ndata: {json.dumps(session_info_event_data)}\n\n"
+        yield sse_event(session_info_event_data, "session_info")
 
-        token_buffer = []
+        coalescer = TokenCoalescer(message_id)
         stock_graph = set()
         user_data = await mongodb.fetch_user_by_id(user_id)
         user_name = user_data.full_name if user_data and user_data.full_name else "user"
@@ -175,6 +193,9 @@ async def query_and_stream(user: apiSecurityFree, query: QueryRequestModel, requ
         message_log = ""
         current_messages_log = []
         processor_iterator = None
+        cancel_token = None
+        stop_waiter = None
+        pump = None
         time_taken = 0
 
 
@@ -187,7 +208,7 @@ async def query_and_stream(user: apiSecurityFree, query: QueryRequestModel, requ
         try:
             if search_mode == 'summarizer':
                 async for event in stream_summary(user_id, session_id, message_id, prev_message_id, user_query, local_time, timezone, is_elaborate, is_example):
-                    yield event.encode('utf-8')
+                    yield event
                 return
                 
             else:
@@ -224,79 +245,57 @@ async def query_and_stream(user: apiSecurityFree, query: QueryRequestModel, requ
             KEEP_ALIVE_INTERVAL = 5
             KEEP_ALIVE_COUNT = 0
             MAX_KEEP_ALIVE_COUNT = 60
-            batched_event_count = 0
+            # Answers longer than this many streamed chunks are not offered "elaborate".
+            ELABORATE_CHUNK_LIMIT = 300 * 15
             await mongodb.append_data(user_id, session_id, message_id, current_messages_log, local_time, timezone)
+            # /stop-generation reaches this worker over pub/sub and sets the token,
+            # which cancels the agent task directly; nothing polls Redis.
+            cancel_token = await cancellation_hub.register(session_id, message_id, stopTime)
+            stop_waiter = asyncio.create_task(cancel_token.wait())
+            # The agent runs on its own task into a bounded queue and pauses
+            # when the client falls that far behind.
+            pump = EventPump(processor_iterator)
+            stop_waiter.add_done_callback(lambda _t: pump.cancel())
             while True:
-                stop_key = f"stop:{session_id}"
-                stop_signal = await redis_manager.safe_execute("get", stop_key)
-                if stop_signal:
-                    # Handle both string and bytes responses from Redis
-                    stop_signal_str = stop_signal.decode('utf-8') if isinstance(stop_signal, bytes) else str(stop_signal)
-                    if stop_signal_str == message_id:
-                        # Clear the stop signal
-                        await redis_manager.safe_execute("delete", stop_key)
-                        raise asyncio.CancelledError("User requested stop")
+                if cancel_token.cancelled:
+                    raise asyncio.CancelledError("User requested stop")
                 try:
-                    processor_task = asyncio.create_task(anext(processor_iterator))
+                    flush_in = coalescer.time_left()
                     try:
-                        while True:
-                            done, _ = await asyncio.wait({processor_task}, timeout=KEEP_ALIVE_INTERVAL)
-                            if processor_task in done:
-                                try:
-                                    data_from_processor = processor_task.result()
-                                    KEEP_ALIVE_COUNT = 0  # Reset keep-alive count
-                                except asyncio.CancelledError:
-                                    print("Processor task was cancelled.")
-                                    stream_completed = True
-                                    break
-                                except StopAsyncIteration:
-                                    stream_completed = True
-                                    break
-                                except Exception as e:
-                                    print("Exception in processor task:", e)
-                                    continue
-
-                                if not data_from_processor:
-                                    continue    
-                                break
-
-                            else:
-                                KEEP_ALIVE_COUNT += 1
-                                if KEEP_ALIVE_COUNT >= MAX_KEEP_ALIVE_COUNT:
-                                    processor_task.cancel()
-                                    try:
-                                        await processor_task
-                                    except Exception:
-                                        pass
-                                    raise RuntimeError(f"No update from processor for {TIMEOUT_PERIOD} seconds. Stream aborted.")
-                                yield f"data: {json.dumps({'type': 'Keep-alive', 'alive-counter': KEEP_ALIVE_COUNT})}\n\n".encode('utf-8')
-                                
-                                # Check for stop signal during keep-alive
-                                stop_signal = await redis_manager.safe_execute("get", stop_key)
-                                if stop_signal:
-                                    # Handle both string and bytes responses from Redis
-                                    stop_signal_str = stop_signal.decode('utf-8') if isinstance(stop_signal, bytes) else str(stop_signal)
-                                    if stop_signal_str == message_id:
-                                        processor_task.cancel()
-                                        await redis_manager.safe_execute("delete", stop_key)
-                                        raise asyncio.CancelledError("User requested stop")
-
-                    # except StopAsyncIteration:
-                    #     stream_completed = True
-                    #     break
+                        data_from_processor = await pump.get(KEEP_ALIVE_INTERVAL if flush_in is None else flush_in)
+                    except StopAsyncIteration:
+                        if cancel_token.cancelled:
+                            continue
+                        batched_event = coalescer.flush()
+                        if batched_event:
+                            yield sse_event(batched_event)
+                        break
                     except Exception as e:
                         traceback.print_exc()
                         raise RuntimeError(f"Error in waiting for data: {str(e)}")
 
+                    if data_from_processor is None:
+                        if coalescer.pending:
+                            batched_event = coalescer.poll()
+                            if batched_event:
+                                yield sse_event(batched_event)
+                            continue
+                        KEEP_ALIVE_COUNT += 1
+                        if KEEP_ALIVE_COUNT >= MAX_KEEP_ALIVE_COUNT:
+                            pump.cancel()
+                            raise RuntimeError(f"No update from processor for {TIMEOUT_PERIOD} seconds. Stream aborted.")
+                        yield keep_alive_frame(KEEP_ALIVE_COUNT)
+                        continue
+                    KEEP_ALIVE_COUNT = 0  # Reset keep-alive count
+
                     data_to_send = data_from_processor.copy()
 
                     if 'start_stream' in data_to_send:
                         payload = {"type": "connected", "message_id": message_id}
-                        yield f"data: {json.dumps(payload)}\n\n".encode('utf-8')
+                        yield sse_event(payload)
 
                         if search_mode == "agentic-planner" or "agentic-reasoning":
-                            progress_payload = {"type": "progress", "progress_bar": 0.0}
-                            yield f"data: {json.dumps(progress_payload)}\n\n".encode('utf-8')
+                            yield PROGRESS_STARTED
                             
 
                     elif 'type' in data_to_send and data_to_send['type'].endswith('chunk'):
@@ -308,49 +307,13 @@ async def query_and_stream(user: apiSecurityFree, query: QueryRequestModel, requ
                                 'type': data_to_send['type'],
                                 'timestamp': time.time()
                             })
-                        # agent_changed = (token_buffer and (data_to_send.get('agent_name', '') != token_buffer[0].get('agent_name', '') or data_to_send.get('id', '') != token_buffer[0].get('id', '')))
-
-                        if token_buffer and (len(token_buffer) >= 15 or data_to_send.get('agent_name') != token_buffer[0].get('agent_name')):
-                            batched_event_type = token_buffer[0].get('type', 'unknown_chunk_type')
-                            
-                            batched_event = {
-                                "type": batched_event_type, 
-                                "agent_name": token_buffer[0].get('agent_name', ''), 
-                                "message_id": message_id, 
-                                "id": token_buffer[0].get('id','')
-                            }
-
-                            if any('content' in t for t in token_buffer):
-                                batched_event["content"] = "".join([t.get('content','') for t in token_buffer if 'content' in t])
-
-                            if any('title' in t for t in token_buffer):
-                                batched_event["title"] = "".join([t.get('title','') for t in token_buffer if 'title' in t])
-
-                            yield f"data: {json.dumps(batched_event)}\n\n".encode('utf-8')
-                            batched_event_count += 1
-                            token_buffer = []
-
-                        token_buffer.append(data_to_send)
+                        for batched_event in coalescer.add(data_to_send):
+                            yield sse_event(batched_event)
 
                     else:
-                        if token_buffer:
-                            batched_event_type = token_buffer[0].get('type', 'unknown_chunk_type')
-                            
-                            batched_event = {
-                                "type": batched_event_type, 
-                                "agent_name": token_buffer[0].get('agent_name', ''), 
-                                "message_id": message_id, 
-                                "id": token_buffer[0].get('id','')
-                            }
-
-                            if any('content' in t for t in token_buffer):
-                                batched_event["content"] = "".join([t.get('content','') for t in token_buffer if 'content' in t])
-
-                            if any('title' in t for t in token_buffer):
-                                batched_event["title"] = "".join([t.get('title','') for t in token_buffer if 'title' in t])
-
-                            yield f"data: {json.dumps(batched_event)}\n\n".encode('utf-8')
-                            token_buffer = []
+                        batched_event = coalescer.flush()
+                        if batched_event:
+                            yield sse_event(batched_event)
 
                         if 'type' in data_to_send:
                             if data_to_send['type'] == 'stock_data':
@@ -358,16 +321,16 @@ async def query_and_stream(user: apiSecurityFree, query: QueryRequestModel, requ
                                 if symbol not in stock_graph:
                                     stock_graph.add(symbol)
                                     stock_payload = {"stock_data": data_to_send.get('data'), "message_id": message_id, "id": data_to_send.get('chat_session_id', '')}
-                                    yield f"event: stock_chart\ndata: {json.dumps(stock_payload)}\n\n".encode('utf-8')
+                                    yield sse_event(stock_payload, "stock_chart")
 
                            
                             elif data_to_send['type'] == 'map_layers':
                                 data_to_send['message_id'] = message_id
-                                yield f"event: map_data\ndata: {json.dumps(data_to_send)}\n\n".encode('utf-8')
+                                yield sse_event(data_to_send, "map_data")
                             
                             else:
                                 data_to_send['message_id'] = message_id
-                                yield f"data: {json.dumps(data_to_send)}\n\n".encode('utf-8')
+                                yield sse_event(data_to_send)
                         elif 'message_logs' in data_to_send:
                             message_log += data_to_send['message_logs']
                         elif 'enriched_content' in data_to_send:
@@ -380,18 +343,18 @@ async def query_and_stream(user: apiSecurityFree, query: QueryRequestModel, requ
                                 "content": data_to_send['time'],
                                 "message_id": message_id
                             }
-                            yield f"data: {json.dumps(time_payload)}\n\n".encode('utf-8')
+                            yield sse_event(time_payload)
                         
                         elif 'state' in data_to_send:
                             if 'sources' in data_to_send and data_to_send.get('sources'):
                                 sources_payload = {"type": "sources", "content": data_to_send['sources'], "message_id": message_id}
                                 partial_sources.extend(data_to_send['sources'])
-                                yield f"data: {json.dumps(sources_payload)}\n\n".encode('utf-8')
+                                yield sse_event(sources_payload)
 
                             if 'related_queries' in data_to_send and data_to_send.get('related_queries'):
                                 related_payload = {"type": "related_queries", "content": data_to_send['related_queries'], "message_id": message_id}
                                 partial_related_queries.extend(data_to_send['related_queries'])
-                                yield f"data: {json.dumps(related_payload)}\n\n".encode('utf-8')
+                                yield sse_event(related_payload)
 
                         elif 'error' in data_to_send:
                             error_flag = True
@@ -400,7 +363,7 @@ async def query_and_stream(user: apiSecurityFree, query: QueryRequestModel, requ
                             # if not ("localhost" in website or "127.0.0.1" in website):
                             #     await notify_slack_error(user_name or user_id, str(error_payload))
 
-                            yield f"data: {json.dumps(error_payload)}\n\n".encode('utf-8')
+                            yield sse_event(error_payload)
                         
                         elif 'store_data' in data_to_send:
                             store_data = data_to_send['store_data']
@@ -408,7 +371,7 @@ async def query_and_stream(user: apiSecurityFree, query: QueryRequestModel, requ
                             partial_metadata = store_data.get('metadata', None)
                             bgt.add_task(mongodb.append_data, user_id, session_id, message_id, current_messages_log, local_time, timezone, store_data['retry'], store_data.get('metadata', None), time_taken)
 
-                            yield f"data: {json.dumps({'type': 'metadata', 'data': store_data.get('metadata',None)})}\n\n".encode('utf-8')
+                            yield sse_event({'type': 'metadata', 'data': store_data.get('metadata',None)})
 
                             # if not error_flag:
                             #     yield f"data: {json.dumps({'type': 'complete', 'message_id': message_id, 'notification': data_to_send.get('notification', True), 'suggestions': data_to_send.get('suggestions', True)})}\n\n".encode('utf-8')
@@ -424,15 +387,14 @@ async def query_and_stream(user: apiSecurityFree, query: QueryRequestModel, requ
                                 }
 
                                 if search_mode == "agentic-planner" or "agentic-reasoning":
-                                    progress_payload = {"type": "progress", "progress_bar": 100.0}
-                                    yield f"data: {json.dumps(progress_payload)}\n\n".encode('utf-8')
+                                    yield PROGRESS_DONE
                                 
-                                if batched_event_count > 300:
+                                if coalescer.chunks > ELABORATE_CHUNK_LIMIT:
                                     complete_payload['is_elaborate'] = False
                                 else:
                                     complete_payload['is_elaborate'] = True                             
                                     
-                                yield f"data: {json.dumps(complete_payload)}\n\n".encode('utf-8')
+                                yield sse_event(complete_payload)
 
                             if message_log:
                                 bgt.add_task(mongodb.append_graph_log_to_mongo, session_id, message_id, message_log)
@@ -441,7 +403,7 @@ async def query_and_stream(user: apiSecurityFree, query: QueryRequestModel, requ
 
                         elif 'logs' in data_to_send:
                             if 'metadata' in data_to_send:
-                                yield f"data: {json.dumps({'type': 'metadata', 'data': data_to_send.get('metadata',None)})}\n\n".encode('utf-8')
+                                yield sse_event({'type': 'metadata', 'data': data_to_send.get('metadata',None)})
 
                             if not error_flag:
                                 complete_payload = {
@@ -453,16 +415,15 @@ async def query_and_stream(user: apiSecurityFree, query: QueryRequestModel, requ
                                 }
 
                                 if search_mode == "agentic-planner" or "agentic-reasoning":
-                                    progress_payload = {"type": "progress", "progress_bar": 100.0}
-                                    yield f"data: {json.dumps(progress_payload)}\n\n".encode('utf-8')
+                                    yield PROGRESS_DONE
 
-                                if batched_event_count > 300:
+                                if coalescer.chunks > ELABORATE_CHUNK_LIMIT:
                                     complete_payload['is_elaborate'] = False
                                 else:
                                     complete_payload['is_elaborate'] = True        
 
                                 # yield f"data: {json.dumps({'type': 'complete', 'message_id': message_id, 'notification': False, 'suggestions': False})}\n\n".encode('utf-8')
-                                yield f"data: {json.dumps(complete_payload)}\n\n".encode('utf-8')
+                                yield sse_event(complete_payload)
 
                             bgt.add_task(mongodb.append_graph_log_to_mongo, session_id, message_id, message_log)
                             break
@@ -498,7 +459,14 @@ async def query_and_stream(user: apiSecurityFree, query: QueryRequestModel, requ
             # if not ("localhost" in website or "127.0.0.1" in website):
             #     await notify_slack_error(user_name or user_id, str(error_payload))
 
-            yield f"data: {json.dumps(error_payload)}\n\n".encode('utf-8')
+            yield sse_event(error_payload)
+        finally:
+            if pump is not None:
+                pump.cancel()
+            if stop_waiter is not None:
+                stop_waiter.cancel()
+            if cancel_token is not None:
+                await cancellation_hub.release(cancel_token)
 
     return StreamingResponse(
         event_generator(),
@@ -516,8 +484,7 @@ async def stop_response_generation(user: apiSecurityFree, session_id: str = Quer
     session_log = await mongodb.get_session_log_by_user_and_session_id(user.id.__str__(), session_id)
     if not session_log:
         raise HTTPException(status_code=404, detail="Session not found or access denied.")
-    key = f"stop:{session_id}"
-    await redis_manager.safe_execute("set", key, message_id, 3)
+    await cancellation_hub.request_stop(session_id, message_id)
 
 @router.post("/stock_data")
 async def stock_data_endpoint(user: apiSecurityFree, payload: StockDataRequest):
@@ -525,6 +492,7 @@ async def stock_data_endpoint(user: apiSecurityFree, payload: StockDataRequest):
     Get real-time stock quote data and historical stock prices based on the period.
     Allowed periods: '1mo', '3mo', '6mo', 'ytd', '1y', '5y', 'max'.
     """
+    bind_upstream(user.id.__str__(), Lane.INTERACTIVE)
     try:
         # request = await request.json()
         # print("Received stock data request:", request)
@@ -532,15 +500,27 @@ async def stock_data_endpoint(user: apiSecurityFree, payload: StockDataRequest):
         # period = request.period
         # if period.endswith('m'):
         #     period = period+"o"
-        ticker_data = TickerSchema(ticker=payload.ticker, exchange_symbol=payload.exchange_symbol)
-        result_json = await asyncio.to_thread(
-            get_stock_data._run,
-            ticker_data=[ticker_data],
-            period=payload.period,
-            strictly = True
-        )
-        
-        response_data = result_json[0]
+        # Period switches on an existing chart are served from the stored series
+        # (saved when the chart was generated) and the cached quote.
+        response_data = None
+        if payload.exchange_symbol:
+            try:
+                response_data = await asyncio.to_thread(
+                    get_stock_data.chart_from_store, payload.ticker, payload.exchange_symbol, payload.period
+                )
+            except Exception as e:
+                print(f"Stored series unavailable for {payload.ticker}, running full stock data tool: {e}")
+
+        if response_data is None:
+            ticker_data = TickerSchema(ticker=payload.ticker, exchange_symbol=payload.exchange_symbol)
+            result_json = await asyncio.to_thread(
+                get_stock_data._run,
+                ticker_data=[ticker_data],
+                period=payload.period,
+                strictly = True
+            )
+            response_data = result_json[0]
+
         chat_session_id = await mongodb.get_chat_session_id_from_message(message_id=payload.message_id, ticker=payload.ticker)
 
         if 'error' in response_data['realtime'] or 'error' in response_data['historical']:
@@ -566,7 +546,7 @@ async def response_feedback(user: apiSecurityFree, payload: ResponseFeedback):
 
 @router.post("/export-response")
 async def export_response_endpoint(user: apiSecurityFree, payload: ExportResponse):
-    
+    bind_upstream(user.id.__str__(), Lane.EXPORT)
     # request = await request.json()
     # request = ExportResponse(**request)
     
@@ -783,33 +763,54 @@ async def predict_stock(user: apiSecurityFree, request: StockPredictionRequest):
         historical_data = []
         current_date = datetime.now()
         fourteen_days_ago = current_date - timedelta(days=14)
-        ticker_data = TickerSchema(ticker=ticker, exchange_symbol=request.exchange_symbol)
-        period = request.period.lower()
-        if period.endswith('m'):
-            period = period+"o"
-        result_json = await asyncio.to_thread(
-            get_stock_data._run,
-            ticker_data=[ticker_data],
-            period=period
-        )
-        response_data = result_json[0]
-        for data_point in response_data['historical']['data']:
-            date_str = data_point.get("date")
-            if date_str:
-                try:
-                    data_date = datetime.strptime(date_str, "%b %d, %Y")
-                    if data_date >= fourteen_days_ago:
-                        historical_data.append({
-                            "date": data_point.get("date"),
-                            "high": float(data_point.get("high", 0).replace(",", "")),
-                            "low": float(data_point.get("low", 0).replace(",", "")),
-                            "open": float(data_point.get("open", 0).replace(",", "")),
-                            "close": float(data_point.get("close", 0).replace(",", "")),
-                            "type": "historical",
-                            "ticker": company_name
-                        })
-                except ValueError:
-                    continue
+        try:
+            bars = await daily_bar_store.aget_bars(ticker, fourteen_days_ago.strftime("%Y-%m-%d"))
+        except Exception as e:
+            print(f"[WARN] daily bar store failed for {ticker}: {e}")
+            bars = None
+        if bars is not None and len(bars):
+            columns = zip(bars.datetimes().tolist(), bars.open.tolist(), bars.high.tolist(),
+                          bars.low.tolist(), bars.close.tolist())
+            # newest first, like the tool's historical payload
+            for day, open_, high, low, close in reversed(list(columns)):
+                historical_data.append({
+                    "date": day.strftime("%b %d, %Y"),
+                    "high": round(high, 2),
+                    "low": round(low, 2),
+                    "open": round(open_, 2),
+                    "close": round(close, 2),
+                    "type": "historical",
+                    "ticker": company_name
+                })
+        else:
+            # Tickers FMP does not serve: reuse the tool's yfinance fallback, whose values are formatted strings
+            ticker_data = TickerSchema(ticker=ticker, exchange_symbol=request.exchange_symbol)
+            period = request.period.lower()
+            if period.endswith('m'):
+                period = period+"o"
+            result_json = await asyncio.to_thread(
+                get_stock_data._run,
+                ticker_data=[ticker_data],
+                period=period
+            )
+            response_data = result_json[0]
+            for data_point in (response_data.get('historical') or {}).get('data', []):
+                date_str = data_point.get("date")
+                if date_str:
+                    try:
+                        data_date = datetime.strptime(date_str, "%b %d, %Y")
+                        if data_date >= fourteen_days_ago:
+                            historical_data.append({
+                                "date": data_point.get("date"),
+                                "high": float(str(data_point.get("high", 0)).replace(",", "")),
+                                "low": float(str(data_point.get("low", 0)).replace(",", "")),
+                                "open": float(str(data_point.get("open", 0)).replace(",", "")),
+                                "close": float(str(data_point.get("close", 0)).replace(",", "")),
+                                "type": "historical",
+                                "ticker": company_name
+                            })
+                    except ValueError:
+                        continue
 
         predicted_data = []
         for date, predicted_price in adjusted_mean_series.items():
@@ -1,48 +1,114 @@
-from fastapi import APIRouter, Query
-from typing import List, Literal, Optional
+import asyncio
+import hashlib
+import json
+import math
+import os
+import time
+from fastapi import APIRouter, Query, Request, Response
+from typing import Any, Dict, List, Literal, Optional, Tuple
+import numpy as np
 import yfinance as yf
 
+from src.backend.utils.market_cache import LRUTTLCache
+
 router = APIRouter(prefix="/yf", tags=["yfinance"])
 
 Interval = Literal["1d", "1wk", "1mo"]
 # Common periods supported by yfinance: 1d,5d,1mo,3mo,6mo,1y,2y,5y,10y,ytd,max
 
+# Seconds a (symbol, interval, period) response is reused, and advertised to the browser.
+MARKET_TTL = int(os.getenv("YF_MARKET_TTL", "60"))
+
+_PRICE_COLUMNS = (("open", "Open"), ("high", "High"), ("low", "Low"), ("close", "Close"))
+
+# cache key -> (body, etag); expiry is kept by the LRU itself
+_responses = LRUTTLCache(maxsize=1024)
+_inflight: Dict[str, asyncio.Task] = {}
+
+
+def _column(hist, name: str) -> List[Optional[float]]:
+    """One price column as floats with NaN/missing as None."""
+    if name not in hist:
+        return [None] * len(hist)
+    values = hist[name].to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.where(np.isnan(values), None, values).tolist()
+
+
+def _points(hist) -> List[dict]:
+    if hist.empty:
+        return []
+    dates = [ts.isoformat() for ts in hist.index]
+    columns = [_column(hist, source) for _, source in _PRICE_COLUMNS]
+    if "Volume" in hist:
+        volume = np.nan_to_num(hist["Volume"].to_numpy(dtype=np.float64, na_value=0.0)).astype(np.int64).tolist()
+    else:
+        volume = [0] * len(hist)
+    keys = ("date",) + tuple(key for key, _ in _PRICE_COLUMNS) + ("volume",)
+    return [{**dict(zip(keys, row)), "type": "historical"} for row in zip(dates, *columns, volume)]
+
+
+def _fetch_market(symbol: str, interval: str, period: str) -> Dict[str, Any]:
+    """Blocking yfinance calls; runs in a worker thread."""
+    t = yf.Ticker(symbol)
+    # Fetch historical dataframe
+    hist = t.history(period=period, interval=interval, auto_adjust=False)
+    points = _points(hist)
+    # Real-time-ish last price
+    last_price: Optional[float] = None
+    try:
+        fi = getattr(t, "fast_info", None)
+        if fi is not None:
+            last_price = float(fi.get("last_price", None)) if isinstance(fi, dict) else float(getattr(fi, "last_price", None))
+    except Exception:
+        last_price = None
+    if last_price is not None and not math.isfinite(last_price):
+        last_price = None
+    return {
+        "symbol": symbol.upper(),
+        "interval": interval,
+        "period": period,
+        "points": points,
+        "last": last_price,
+    }
+
+
+async def _load_market(key: str, symbol: str, interval: str, period: str) -> Tuple[bytes, str]:
+    payload = await asyncio.to_thread(_fetch_market, symbol, interval, period)
+    # NaN would be cached as invalid JSON for MARKET_TTL; fail the request instead.
+    body = json.dumps(payload, separators=(",", ":"), allow_nan=False).encode("utf-8")
+    etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+    _responses.set(key, (body, etag), time.time() + MARKET_TTL)
+    return body, etag
+
+
+async def _cached_market(symbol: str, interval: str, period: str) -> Tuple[bytes, str, int]:
+    """(body, etag, seconds left); concurrent misses for the same key share one fetch."""
+    key = f"{symbol.upper()}|{interval}|{period.lower()}"
+    cached = _responses.get(key)
+    if cached is None:
+        task = _inflight.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(_load_market(key, symbol, interval, period))
+            _inflight[key] = task
+            task.add_done_callback(lambda _t, _k=key: _inflight.pop(_k, None))
+        cached = await asyncio.shield(task)
+    max_age = max(int(_responses.expiry(key) - time.time()), 0)
+    return cached[0], cached[1], max_age
+
+
 @router.get("/market")
 async def get_market(
+    request: Request,
     symbol: str = Query(..., description="Ticker symbol e.g. AAPL"),
     interval: Interval = Query("1d", description="1d, 1wk, 1mo"),
     period: str = Query("6mo", description="Range e.g. 1mo,3mo,6mo,1y,5y,max"),
 ):
     try:
-        t = yf.Ticker(symbol)
-        # Fetch historical dataframe
-        hist = t.history(period=period, interval=interval, auto_adjust=False)
-        points: List[dict] = []
-        if not hist.empty:
-            for ts, row in hist.iterrows():
-                points.append({
-                    "date": ts.isoformat(),
-                    "open": float(row.get("Open", None)) if not (row.get("Open") is None) else None,
-                    "high": float(row.get("High", None)) if not (row.get("High") is None) else None,
-                    "low": float(row.get("Low", None)) if not (row.get("Low") is None) else None,
-                    "close": float(row.get("Close", None)) if not (row.get("Close") is None) else None,
-                    "volume": int(row.get("Volume", 0)) if not (row.get("Volume") is None) else 0,
-                    "type": "historical",
-                })
-        # Real-time-ish last price
-        last_price: Optional[float] = None
-        try:
-            fi = getattr(t, "fast_info", None)
-            if fi is not None:
-                last_price = float(fi.get("last_price", None)) if isinstance(fi, dict) else float(getattr(fi, "last_price", None))
-        except Exception:
-            last_price = None
-        return {
-            "symbol": symbol.upper(),
-            "interval": interval,
-            "period": period,
-            "points": points,
-            "last": last_price,
-        }
+        body, etag, max_age = await _cached_market(symbol, interval, period)
     except Exception as e:
-        return {"error": str(e)}
+        return Response(content=json.dumps({"error": str(e)}), media_type="application/json",
+                        headers={"Cache-Control": "no-store"})
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={max_age}"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
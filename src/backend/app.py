@@ -3,6 +3,10 @@ from fastapi import FastAPI, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, HTMLResponse
 from src.backend.utils.api_utils import redis_manager
+from src.backend.utils.cancellation import cancellation_hub
+from src.backend.utils.fmp_client import fmp_client
+from src.backend.utils.market_warmer import market_warmer
+from src.backend.utils.quote_hub import quote_hub
 from contextlib import asynccontextmanager
 from src.backend.db import mongodb
 from src.backend.api.auth import router as auth_router
@@ -10,6 +14,7 @@ from src.backend.api.session import router as session_router
 from src.backend.api.user import router as user_router
 from src.backend.api.chat import router as chat_router
 from src.backend.api.stock import router as stock_router
+from src.backend.api.quotes import router as quotes_router
 from src.ai.stock_prediction.stock_prediction import StockAnalysisAgent
 
 stock_agent = StockAnalysisAgent()
@@ -19,7 +24,14 @@ stock_agent = StockAnalysisAgent()
 async def on_startup(app: FastAPI):
     await mongodb.init_db()
     await redis_manager.connect()
+    cancellation_hub.start()
+    market_warmer.start()
+    quote_hub.start()
     yield
+    await quote_hub.stop()
+    await market_warmer.stop()
+    await cancellation_hub.stop()
+    await fmp_client.runner.run_async(fmp_client.aclose())
 
 app = FastAPI(title="Finance Insight Agent API", lifespan=on_startup)
 
@@ -35,6 +47,7 @@ app.include_router(session_router)
 app.include_router(user_router)
 app.include_router(chat_router)
 app.include_router(stock_router)
+app.include_router(quotes_router)
 
 @app.get("/", response_class=HTMLResponse)
 async def get():
@@ -0,0 +1,174 @@
+import asyncio
+import csv
+import json
+import logging
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src.backend.db.fmp_repository import fmp_repository
+from src.backend.utils.market_cache import LRUTTLCache
+
+logger = logging.getLogger("uvicorn")
+
+MACRO_COLLECTION = "country_macro"
+
+# metric key -> phrase used when the value has to be looked up on the web
+MACRO_METRICS: Dict[str, str] = {
+    "gdp_growth_rate": "GDP growth rate",
+    "inflation_rate": "inflation rate",
+    "debt_to_gdp_ratio": "debt-to-GDP ratio",
+    "trade_balance": "trade balance as a percentage of GDP",
+    "fdi_inflows": "FDI inflows as a percentage of GDP",
+}
+
+# Figures for closed years are only revised occasionally; the current and previous
+# year still move with quarterly releases. Lookups that found nothing are retried sooner.
+FINAL_TTL = timedelta(days=365)
+PROVISIONAL_TTL = timedelta(days=90)
+EMPTY_TTL = timedelta(days=30)
+
+MacroKey = Tuple[str, int]  # (metric, year)
+
+
+def normalize_country(country: str) -> str:
+    return " ".join(country.split()).lower()
+
+
+def macro_ttl(year: int, value: Optional[float], today: Optional[datetime] = None) -> timedelta:
+    if value is None:
+        return EMPTY_TTL
+    current_year = (today or datetime.now(timezone.utc)).year
+    return PROVISIONAL_TTL if year >= current_year - 1 else FINAL_TTL
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+class CountryMacroStore:
+    """
+    Annual macro indicators per (country, metric, year) in `insight_agent_fmp.country_macro`.
+
+    Each value carries its own expiry (`macro_ttl`): closed years are kept for a
+    year, the current and previous year for a quarter. Callers fill misses lazily
+    (the country tool resolves them with a web search once) or in bulk from a
+    CSV/JSON snapshot with `load_snapshot`. Reads go through a small in-process
+    cache. Runs on the shared runner loop like `fmp_repository`.
+    """
+
+    def __init__(self, memory_size: int = 4096):
+        self.memory = LRUTTLCache(memory_size)
+
+    @staticmethod
+    def _memory_key(country: str, metric: str, year: int) -> str:
+        return f"{country}|{metric}|{year}"
+
+    async def get_many(self, country: str, metrics: Iterable[str], years: Iterable[int]) -> Dict[MacroKey, Optional[float]]:
+        """
+        Fresh stored values for every (metric, year) asked for. Pairs without a fresh
+        entry are left out; a stored None means "looked up, nothing found". Must run
+        on the runner loop.
+        """
+        country = normalize_country(country)
+        wanted = [(m, int(y)) for m in metrics for y in years]
+        found: Dict[MacroKey, Optional[float]] = {}
+        missing: List[MacroKey] = []
+        for metric, year in wanted:
+            entry = self.memory.get(self._memory_key(country, metric, year))
+            if entry is not None:
+                found[(metric, year)] = entry["value"]
+            else:
+                missing.append((metric, year))
+        if not missing:
+            return found
+
+        docs = await fmp_repository.find(
+            MACRO_COLLECTION,
+            {"country": country, "metric": {"$in": sorted({m for m, _ in missing})},
+             "year": {"$in": sorted({y for _, y in missing})}},
+            {"_id": 0, "metric": 1, "year": 1, "value": 1, "expires_at": 1},
+        )
+        now = datetime.now(timezone.utc)
+        wanted_missing = set(missing)
+        for doc in docs:
+            key = (doc["metric"], int(doc["year"]))
+            expires = doc.get("expires_at")
+            if key not in wanted_missing or expires is None or _as_utc(expires) <= now:
+                continue
+            found[key] = doc.get("value")
+            self.memory.set(self._memory_key(country, *key), {"value": doc.get("value")}, _as_utc(expires).timestamp())
+        return found
+
+    async def put_many(self, country: str, values: Dict[MacroKey, Optional[float]], source: str) -> int:
+        """Store {(metric, year): value} for one country. Must run on the runner loop."""
+        display = " ".join(country.split())
+        country = normalize_country(country)
+        now = datetime.now(timezone.utc)
+        writes = []
+        for (metric, year), value in values.items():
+            expires = now + macro_ttl(int(year), value, now)
+            writes.append(fmp_repository.upsert(
+                MACRO_COLLECTION,
+                {"country": country, "metric": metric, "year": int(year)},
+                {"value": value, "country_name": display, "source": source,
+                 "updated_at": now, "expires_at": expires},
+            ))
+            self.memory.set(self._memory_key(country, metric, int(year)), {"value": value}, expires.timestamp())
+        await asyncio.gather(*writes)
+        return len(values)
+
+    async def load_snapshot(self, path: str, source: Optional[str] = None) -> int:
+        """
+        Bulk-load a snapshot: CSV with `country,metric,year,value` columns, or JSON
+        holding a list of such records. Unknown metrics and unparsable rows are
+        skipped. Returns the number of values stored.
+        """
+        by_country: Dict[str, Dict[MacroKey, Optional[float]]] = {}
+        skipped = 0
+        for row in _read_snapshot(Path(path)):
+            try:
+                metric = str(row["metric"]).strip()
+                year = int(row["year"])
+                raw = row.get("value")
+                value = None if raw in (None, "") else float(str(raw).strip().rstrip("%"))
+            except (KeyError, TypeError, ValueError):
+                skipped += 1
+                continue
+            if metric not in MACRO_METRICS or not str(row.get("country") or "").strip():
+                skipped += 1
+                continue
+            by_country.setdefault(str(row["country"]), {})[(metric, year)] = value
+
+        stored = 0
+        for country, values in by_country.items():
+            stored += await self.put_many(country, values, source or f"snapshot:{Path(path).name}")
+        if skipped:
+            logger.warning(f"Country macro snapshot {path}: skipped {skipped} rows")
+        return stored
+
+    def get_many_sync(self, country: str, metrics: Iterable[str], years: Iterable[int]) -> Dict[MacroKey, Optional[float]]:
+        return fmp_repository.run(self.get_many(country, list(metrics), list(years)))
+
+    def put_many_sync(self, country: str, values: Dict[MacroKey, Optional[float]], source: str) -> int:
+        return fmp_repository.run(self.put_many(country, values, source))
+
+
+def _read_snapshot(path: Path) -> List[Dict[str, Any]]:
+    if path.suffix.lower() == ".json":
+        data = json.loads(path.read_text())
+        return data if isinstance(data, list) else data.get("records", [])
+    with path.open(newline="") as f:
+        return list(csv.DictReader(f))
+
+
+country_macro_store = CountryMacroStore()
+
+
+if __name__ == "__main__":
+    # python -m src.backend.db.country_macro snapshot.csv [more.json ...]
+    started = time.perf_counter()
+    total = sum(fmp_repository.run(country_macro_store.load_snapshot(p)) for p in sys.argv[1:])
+    print(f"stored {total} values in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,230 @@
+import asyncio
+import logging
+from collections import OrderedDict, defaultdict
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from src.backend.db.bar_series import BarSeries
+from src.backend.db.fmp_repository import fmp_repository
+from src.backend.utils.fmp_client import fmp_client
+from src.backend.utils.market_cache import warm_ledger
+from src.backend.utils.market_calendar import is_always_open, is_market_open, last_close, next_open, resolve_exchange
+
+logger = logging.getLogger("uvicorn")
+
+FMP_EOD_PATH = "/stable/historical-price-eod/full"
+BARS_COLLECTION = "daily_bars"
+
+# Depth of the first download for a ticker; matches the old "MAX" period.
+INITIAL_HISTORY_DAYS = 7300
+# FMP publishes the final daily bar a little after the close.
+SETTLE_DELAY = timedelta(minutes=30)
+# While the market is open the last bar is partial; re-check it at most this often.
+INTRADAY_REFRESH = timedelta(minutes=15)
+
+PERIOD_DAYS = {"1M": 30, "3M": 90, "6M": 180, "1Y": 365, "5Y": 1825, "MAX": INITIAL_HISTORY_DAYS}
+
+
+def period_start(period: str, today: Optional[date] = None) -> date:
+    """First calendar date covered by a chart period (1M, 3M, 6M, YTD, 1Y, 5Y, MAX)."""
+    today = today or datetime.now().date()
+    period = (period or "1M").upper()
+    if period == "YTD":
+        return date(today.year, 1, 1)
+    return today - timedelta(days=PERIOD_DAYS.get(period, 30))
+
+
+def normalize_eod_payload(ticker: str, payload: Any) -> BarSeries:
+    """FMP EOD payload (stable list or legacy {"historical": [...]}) -> ascending columnar bars."""
+    rows = payload.get("historical") if isinstance(payload, dict) else payload
+    return BarSeries.from_records(ticker, rows)
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None:
+        return None
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+class DailyBarStore:
+    """
+    One canonical daily OHLCV series per ticker, persisted in `insight_agent_fmp.daily_bars`.
+
+    The first request downloads the full history once; afterwards only the tail
+    since the last stored bar is fetched and merged in (the last bar is re-fetched
+    so a partial intraday bar gets replaced). Requests for dates before the stored
+    range backfill the missing head once. Every chart period is a zero-copy slice
+    of the series.
+
+    Bars are kept columnar (`BarSeries`): Mongo stores the raw column bytes and
+    each host keeps a memory-mapped copy under `BAR_CACHE_DIR`, which is used
+    instead of transferring the columns whenever it matches the Mongo metadata.
+    Runs on the shared runner loop like `fmp_repository`.
+    """
+
+    def __init__(self, memory_size: int = 256):
+        self.memory_size = memory_size
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    def _remember(self, ticker: str, doc: Dict[str, Any]):
+        self._memory[ticker] = doc
+        self._memory.move_to_end(ticker)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    @staticmethod
+    def _is_current(doc: Optional[Dict[str, Any]], exchange: str, now: datetime) -> bool:
+        if not doc or not len(doc["series"]):
+            return False
+        checked = _as_utc(doc.get("last_checked"))
+        if checked is None:
+            return False
+        # Always-open sessions have no settled close (last_close() is `now`);
+        # only the intraday refresh interval applies to them.
+        if not is_always_open(exchange):
+            settled_close = last_close(exchange, now - SETTLE_DELAY) + SETTLE_DELAY
+            if checked < settled_close:
+                return False
+        if is_market_open(exchange, now) and now - checked > INTRADAY_REFRESH:
+            return False
+        return True
+
+    @staticmethod
+    def _covers(doc: Optional[Dict[str, Any]], start: date) -> bool:
+        return bool(doc and len(doc["series"]) and doc.get("covered_from") and doc["covered_from"] <= start.isoformat())
+
+    @staticmethod
+    async def _download(ticker: str, start: date, end: date) -> BarSeries:
+        payload = await fmp_client.fetch_json(
+            FMP_EOD_PATH, {"symbol": ticker, "from": start.isoformat(), "to": end.isoformat()}
+        )
+        return normalize_eod_payload(ticker, payload)
+
+    @staticmethod
+    async def _save_local(series: BarSeries):
+        try:
+            await asyncio.to_thread(series.save)
+        except OSError as e:
+            logger.warning(f"Could not write local bar file for {series.symbol}: {e}")
+
+    async def _load_stored(self, ticker: str) -> Optional[Dict[str, Any]]:
+        meta = await fmp_repository.find_one(BARS_COLLECTION, {"ticker": ticker}, {"columns": 0})
+        if not meta or not meta.get("count"):
+            return None
+        series = BarSeries.load(ticker)
+        if (series is None or len(series) != meta["count"]
+                or series.last_date.isoformat() != meta.get("last_date")
+                or series.first_date.isoformat() != meta.get("first_date")):
+            doc = await fmp_repository.find_one(BARS_COLLECTION, {"ticker": ticker})
+            if not doc or not doc.get("columns"):
+                return None
+            series = BarSeries.from_buffers(ticker, doc["columns"])
+            await self._save_local(series)
+        return {"series": series, "covered_from": meta.get("covered_from"), "last_checked": meta.get("last_checked")}
+
+    async def _refresh(self, ticker: str, doc: Optional[Dict[str, Any]], start: date, exchange: str) -> Dict[str, Any]:
+        now = datetime.now(timezone.utc)
+        today = now.date()
+        series: BarSeries = doc["series"] if doc else BarSeries.empty(ticker)
+        covered_from = date.fromisoformat(doc["covered_from"]) if doc and doc.get("covered_from") else None
+
+        if not len(series):
+            covered_from = min(start, today - timedelta(days=INITIAL_HISTORY_DAYS))
+            series = await self._download(ticker, covered_from, today)
+        else:
+            if start < covered_from:
+                head = await self._download(ticker, start, covered_from - timedelta(days=1))
+                series = head.slice(end=series.dates[0] - 1).merge(series)
+                covered_from = start
+            if not self._is_current(doc, exchange, now):
+                tail = await self._download(ticker, series.last_date, today)
+                if len(tail):
+                    series = series.merge(tail)
+
+        fields = {
+            "columns": series.to_buffers(),
+            "count": len(series),
+            "covered_from": covered_from.isoformat(),
+            "first_date": series.first_date.isoformat() if len(series) else None,
+            "last_date": series.last_date.isoformat() if len(series) else None,
+            "last_checked": now,
+        }
+        await fmp_repository.upsert(BARS_COLLECTION, {"ticker": ticker}, fields)
+        await self._save_local(series)
+        return {"series": series, "covered_from": fields["covered_from"], "last_checked": now}
+
+    async def get_bars(self, ticker: str, start: Optional[date] = None, end: Optional[date] = None,
+                       exchange: Optional[str] = None) -> BarSeries:
+        """Ascending bars for `ticker` with start <= date <= end. Must run on the runner loop."""
+        ticker = ticker.upper()
+        exchange = exchange or resolve_exchange(ticker)
+        start = start or period_start("MAX")
+        now = datetime.now(timezone.utc)
+
+        refreshed = False
+        async with self._locks[ticker]:
+            doc = self._memory.get(ticker)
+            if not self._covers(doc, start) or not self._is_current(doc, exchange, now):
+                # another worker may already have refreshed the shared document
+                doc = await self._load_stored(ticker) or doc
+                if not self._covers(doc, start) or not self._is_current(doc, exchange, now):
+                    refreshed = True
+                    try:
+                        doc = await self._refresh(ticker, doc, start, exchange)
+                    except Exception as e:
+                        if not doc or not len(doc["series"]):
+                            raise
+                        logger.warning(f"Daily bar refresh failed for {ticker}, serving stored bars: {e}")
+                self._remember(ticker, doc)
+
+        if not refreshed:
+            warm_ledger.hit(f"bars:{ticker}")
+        return doc["series"].slice(start, end)
+
+    async def warm(self, ticker: str, exchange: Optional[str] = None) -> bool:
+        """
+        Bring the stored series up to date ahead of demand (market warmer).
+        Returns True if FMP was called. Must run on the runner loop.
+        """
+        ticker = ticker.upper()
+        exchange = exchange or resolve_exchange(ticker)
+        now = datetime.now(timezone.utc)
+
+        async with self._locks[ticker]:
+            doc = self._memory.get(ticker)
+            if self._is_current(doc, exchange, now):
+                return False
+            doc = await self._load_stored(ticker) or doc
+            if not self._is_current(doc, exchange, now):
+                start = min(date.fromisoformat(doc["covered_from"]), period_start("MAX")) \
+                    if doc and doc.get("covered_from") else period_start("MAX")
+                doc = await self._refresh(ticker, doc, start, exchange)
+                self._remember(ticker, doc)
+                fresh_from = next_open(exchange, now) if not is_market_open(exchange, now) else now
+                warm_ledger.mark("daily_bars", f"bars:{ticker}", 0.0,
+                                 (fresh_from + INTRADAY_REFRESH).timestamp())
+                return True
+            self._remember(ticker, doc)
+            return False
+
+    async def get_period(self, ticker: str, period: str, exchange: Optional[str] = None) -> BarSeries:
+        return await self.get_bars(ticker, period_start(period), exchange=exchange)
+
+    async def aget_bars(self, ticker: str, start: Optional[str] = None, end: Optional[str] = None) -> BarSeries:
+        """Awaitable from any loop; `start`/`end` are YYYY-MM-DD strings."""
+        return await fmp_repository.runner.run_async(self.get_bars(
+            ticker,
+            date.fromisoformat(start[:10]) if start else None,
+            date.fromisoformat(end[:10]) if end else None,
+        ))
+
+    def get_bars_sync(self, ticker: str, start: Optional[date] = None, end: Optional[date] = None,
+                      exchange: Optional[str] = None) -> BarSeries:
+        return fmp_repository.run(self.get_bars(ticker, start, end, exchange))
+
+    def get_period_sync(self, ticker: str, period: str, exchange: Optional[str] = None) -> BarSeries:
+        return fmp_repository.run(self.get_period(ticker, period, exchange))
+
+
+daily_bar_store = DailyBarStore()
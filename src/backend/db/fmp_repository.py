@@ -0,0 +1,113 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection, AsyncIOMotorDatabase
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import OperationFailure
+
+from src.backend.utils.async_runner import get_shared_runner
+
+logger = logging.getLogger("uvicorn")
+
+FMP_DB_NAME = "insight_agent_fmp"
+
+# collection -> list of (keys, unique). Unique keys back the atomic upserts below.
+FMP_INDEXES: Dict[str, List[Tuple[List[Tuple[str, int]], bool]]] = {
+    "fmp_query_results": [([("query", ASCENDING)], True)],
+    "company_profiles": [([("symbol", ASCENDING)], True)],
+    "financial_statements": [([("symbol", ASCENDING), ("statement_type", ASCENDING), ("period", ASCENDING)], True)],
+    "historical_data": [([("ticker", ASCENDING), ("period", ASCENDING)], True)],
+    "daily_bars": [([("ticker", ASCENDING)], True)],
+    "stock_price_changes": [([("symbol", ASCENDING)], True)],
+    "quotes": [([("symbol", ASCENDING)], True)],
+    "symbol_metadata": [([("symbol", ASCENDING)], True)],
+    "yf_symbol_variants": [([("ticker", ASCENDING), ("exchange", ASCENDING)], True)],
+    "fmp_entitlements": [([("endpoint", ASCENDING), ("symbol", ASCENDING)], True)],
+    "country_macro": [([("country", ASCENDING), ("metric", ASCENDING), ("year", ASCENDING)], True)],
+}
+
+
+class FMPRepository:
+    """
+    Async repository for the `insight_agent_fmp` cache database.
+
+    A single Motor client (and therefore a single connection pool) is created on
+    the shared runner loop, so sync tool threads and async callers reuse the same
+    connections instead of opening a `MongoClient` per call.
+    """
+
+    def __init__(self, uri: Optional[str] = None, db_name: str = FMP_DB_NAME, max_pool_size: int = 50):
+        self.uri = uri
+        self.db_name = db_name
+        self.max_pool_size = max_pool_size
+        self.runner = get_shared_runner()
+        self.client: Optional[AsyncIOMotorClient] = None
+        self.db: Optional[AsyncIOMotorDatabase] = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+
+    async def _connect(self, uri: Optional[str] = None):
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self.db is not None:
+                return
+            self.uri = uri or self.uri or os.getenv("MONGO_URI")
+            self.client = AsyncIOMotorClient(self.uri, maxPoolSize=self.max_pool_size)
+            self.db = self.client[self.db_name]
+            await self._ensure_indexes()
+
+    async def _ensure_indexes(self):
+        for name, specs in FMP_INDEXES.items():
+            for keys, unique in specs:
+                try:
+                    await self.db[name].create_index(keys, unique=unique)
+                except OperationFailure as e:
+                    # Older data may hold duplicates from the pre-upsert inserts; keep a
+                    # plain index so lookups stay fast until the collection is cleaned up.
+                    logger.warning(f"Could not create unique index {keys} on {name}: {e}")
+                    await self.db[name].create_index(keys)
+
+    async def connect(self, uri: Optional[str] = None):
+        """Open the pool and ensure indexes. Called once from `init_db`."""
+        await self.runner.run_async(self._connect(uri))
+
+    async def collection(self, name: str) -> AsyncIOMotorCollection:
+        """Must run on the runner loop. Connects lazily for scripts that skip `init_db`."""
+        if self.db is None:
+            await self._connect()
+        return self.db[name]
+
+    async def find_one(self, name: str, query: Dict[str, Any],
+                       projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        coll = await self.collection(name)
+        return await coll.find_one(query, projection)
+
+    async def find(self, name: str, query: Dict[str, Any],
+                   projection: Optional[Dict[str, Any]] = None, limit: int = 0) -> List[Dict[str, Any]]:
+        coll = await self.collection(name)
+        return await coll.find(query, projection, limit=limit).to_list(length=None)
+
+    async def upsert(self, name: str, query: Dict[str, Any], fields: Dict[str, Any]) -> Dict[str, Any]:
+        """Atomically set `fields` on the document matching `query`, inserting it if missing."""
+        coll = await self.collection(name)
+        return await coll.find_one_and_update(
+            query,
+            {"$set": fields},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def run(self, coro):
+        """Run a repository coroutine to completion from a sync caller."""
+        return self.runner.run_sync(coro)
+
+    async def aclose(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+            self.db = None
+
+
+fmp_repository = FMPRepository()
@@ -1,5 +1,6 @@
 import asyncio
 import os
+import httpx
 import re
 import time
 import uuid
@@ -17,7 +18,12 @@ from typing import Optional
 from src.backend.models.model import *
 from src.backend.models.app_io_schemas import Onboarding
 from src.ai.agents.utils import generate_session_title
-import requests
+from src.backend.utils.fmp_client import fmp_client
+from src.backend.db.fmp_repository import fmp_repository
+from src.backend.db.daily_bars import daily_bar_store
+from src.backend.utils.market_cache import FRESHNESS_POLICIES, market_cache
+from src.backend.utils.market_calendar import resolve_exchange
+from src.backend.utils.symbol_index import symbol_index
 
 MONGO_URI = os.getenv("MONGO_URI")
 FMP_API_KEY= os.getenv("FM_API_KEY")
@@ -31,302 +37,238 @@ async def init_db():
     database = client["insight_agent"]
     jwt_handler = JWT.JWTHandler("f524fdd634e89fd7a3d886564d026666b3ea46db9c77a57d68309f02190020cb", "HS256", "30")
     await init_beanie(database=database, document_models=[MessageLog, JSONBackup, SessionLog, Users, MessageFeedback, ExternalData, SessionHistory, MessageOutput, MapData, GraphLog, Personalization, Onboarding,UploadResponse, ChartBotLogs])
+    await fmp_repository.connect(MONGO_URI)
 
-def _fetch_fmp_data(query: str) -> Union[List[Dict[str, Any]], str]:
+async def _afetch_fmp_data(query: str) -> Union[List[Dict[str, Any]], str]:
     try:
         # url = f"https://financialmodelingprep.com/api/v3/search?query={query}&apikey={FMP_API_KEY}"
-        url = f"https://financialmodelingprep.com/stable/search-symbol?query={query}&apikey={FMP_API_KEY}"
-        fmp_response = requests.get(url)
-        fmp_response.raise_for_status()
-        return fmp_response.json()
+        return await fmp_client.fetch_json("/stable/search-symbol", {"query": query})
     except Exception as e:
         return f"Error in getting company information from FMP for {query}: {str(e)}"
-    
-def search_company(query: str):
+
+def _fetch_fmp_data(query: str) -> Union[List[Dict[str, Any]], str]:
+    return fmp_repository.run(_afetch_fmp_data(query))
+
+async def _asearch_company(query: str):
     query_upper = query.upper()
-    client = MongoClient(MONGO_URI)
-    db = client["insight_agent_fmp"]
-    collection = db["fmp_query_results"]
+    # Only exact ticker/name hits are trusted; prefix and fuzzy guesses could be
+    # an unrelated company, so anything else goes to the FMP search.
+    matches = symbol_index.search(query)
+    if matches and matches[0]["match"] in ("exact_symbol", "exact_name"):
+        return {"query": query_upper, "results": matches, "source": "symbol_index"}
 
     one_month_ago = datetime.now() - timedelta(days=30)
-    cached = collection.find_one({"query": query_upper})
-
-    if cached:
-        if cached.get("timestamp") and cached["timestamp"] > one_month_ago:
-            return cached
-
-        result = _fetch_fmp_data(query)
-        if isinstance(result, str):
-            raise HTTPException(status_code=500, detail=result)
-
-        collection.update_one(
-            {"_id": cached["_id"]},
-            {"$set": {
-                "results": result,
-                "timestamp": datetime.now()
-            }}
-        )
-        cached = collection.find_one({"_id": cached["_id"]})
+    cached = await fmp_repository.find_one("fmp_query_results", {"query": query_upper})
+
+    if cached and cached.get("timestamp") and cached["timestamp"] > one_month_ago:
         return cached
 
-    result = _fetch_fmp_data(query)
+    result = await _afetch_fmp_data(query)
     if isinstance(result, str):
         raise HTTPException(status_code=500, detail=result)
 
-    new_entry = {
-        "query": query_upper,
-        "results": result,
-        "timestamp": datetime.now()
-    }
-    collection.insert_one(new_entry)
-    return new_entry
-
+    return await fmp_repository.upsert(
+        "fmp_query_results",
+        {"query": query_upper},
+        {"results": result, "timestamp": datetime.now()},
+    )
 
-def get_or_fetch_company_profile(symbol: str):
-    symbol = symbol.upper()
-    client = MongoClient(MONGO_URI)
-    db = client["insight_agent_fmp"]
-    collection = db["company_profiles"]
-
-    today = datetime.now().date()
-
-    # Check for cached data
-    existing = collection.find_one({"symbol": symbol})
-    if existing:
-        last_updated = existing.get("last_updated")
-        if last_updated and last_updated.date() == today:
-            return {
-                "data": existing["data"],
-                "source": "https://financialmodelingprep.com/"
-            }
-        else:
-            try:
-                # url = f"https://financialmodelingprep.com/api/v3/profile/{symbol}?apikey={FMP_API_KEY}"
-                url = f"https://financialmodelingprep.com/stable/profile?symbol={symbol}&apikey={FMP_API_KEY}"
-                response = requests.get(url)
-                response.raise_for_status()
-                data = response.json()
-
-                if not data or not isinstance(data, list):
-                    raise HTTPException(status_code=404, detail="Company not found")
-                data = data[0]
-
-                collection.update_one(
-                    {"_id": existing["_id"]},
-                    {"$set": {
-                        "data": data,
-                        "last_updated": datetime.now()
-                    }}
-                )
-                return {
-                    "data": data,
-                    "source": "https://financialmodelingprep.com/"
-                }
-
-            except Exception as e:
-                return {
-                    "data": existing["data"],
-                    "source": f"mongodb (fallback, update failed: {str(e)})"
-                }
-
-    # No existing record, fetch and store
-    try:
-        # url = f"https://financialmodelingprep.com/api/v3/profile/{symbol}?apikey={FMP_API_KEY}"
-        url = f"https://financialmodelingprep.com/stable/profile?symbol={symbol}&apikey={FMP_API_KEY}"
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
+def search_company(query: str):
+    return fmp_repository.run(_asearch_company(query))
 
-        if not data or not isinstance(data, list):
-            raise HTTPException(status_code=404, detail="Company not found")
 
-        data = data[0]
+async def _aload_company_profile(symbol: str) -> dict:
+    # url = f"https://financialmodelingprep.com/api/v3/profile/{symbol}?apikey={FMP_API_KEY}"
+    data = await fmp_client.fetch_json("/stable/profile", {"symbol": symbol})
+    if not data or not isinstance(data, list):
+        raise HTTPException(status_code=404, detail="Company not found")
+    return data[0]
 
-        collection.insert_one({
-            "symbol": symbol,
-            "data": data,
-            "last_updated": datetime.now()
-        })
-
-        return {
-            "data": data,
-            "source": "https://financialmodelingprep.com/"
-        }
+async def _aget_or_fetch_company_profile(symbol: str):
+    symbol = symbol.upper()
 
+    try:
+        result = await market_cache.get_or_load("profile", {"symbol": symbol}, lambda: _aload_company_profile(symbol))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching profile: {str(e)}")
 
+    return {
+        "data": result.value,
+        "source": "mongodb (fallback, update failed)" if result.source == "stale" else "https://financialmodelingprep.com/"
+    }
 
-def fetch_financial_data(symbol: str, statement_type: str, period: str = "annual", limit: int = 5) -> dict:
-    symbol = symbol.upper()
-    client = MongoClient(MONGO_URI)
-    db = client["insight_agent_fmp"]
-    financial_statements = db["financial_statements"]
-    record = financial_statements.find_one({
-        "symbol": symbol,
-        "statement_type": statement_type,
-        "period": period
-    })
+def get_or_fetch_company_profile(symbol: str):
+    return fmp_repository.run(_aget_or_fetch_company_profile(symbol))
 
-    is_outdated = True
-    if record and "last_updated" in record:
-        age = datetime.now() - record["last_updated"]
-        is_outdated = age > timedelta(days=30)
 
-    if not record or is_outdated:
-        fmp_endpoints = {
-            "balance_sheet": "balance-sheet-statement",
-            "cash_flow": "cash-flow-statement",
-            "income_statement": "income-statement"
-        }
+# statement_type -> FMP stable endpoint; all are annual, fiscal-year keyed rows
+FUNDAMENTAL_ENDPOINTS = {
+    "balance_sheet": "balance-sheet-statement",
+    "cash_flow": "cash-flow-statement",
+    "income_statement": "income-statement",
+    "key_metrics": "key-metrics",
+    "ratios": "ratios",
+}
 
-        if statement_type not in fmp_endpoints:
-            raise ValueError("Invalid statement_type")
+async def _afetch_financial_data(symbol: str, statement_type: str, period: str = "annual", limit: int = 5) -> dict:
+    symbol = symbol.upper()
+    fmp_endpoints = FUNDAMENTAL_ENDPOINTS
 
+    if statement_type not in fmp_endpoints:
+        raise ValueError("Invalid statement_type")
+
+    async def load():
         # url = f"https://financialmodelingprep.com/api/v3/{fmp_endpoints[statement_type]}/{symbol}?limit={limit}&apikey={FMP_API_KEY}"
-        url = f"https://financialmodelingprep.com/stable/{fmp_endpoints[statement_type]}?symbol={symbol}&limit={limit}&apikey={FMP_API_KEY}"
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-
-        if isinstance(data, list) and data:
-            now = datetime.now()
-            update_data = {
-                "symbol": symbol,
-                "statement_type": statement_type,
-                "period": period,
-                "data": data,
-                "last_updated": now
-            }
-            if record:
-                financial_statements.update_one(
-                    {"_id": record["_id"]},
-                    {"$set": update_data}
-                )
-            else:
-                financial_statements.insert_one(update_data)
-        else:
+        data = await fmp_client.fetch_json(f"/stable/{fmp_endpoints[statement_type]}", {"symbol": symbol, "limit": limit})
+        if not (isinstance(data, list) and data):
             raise Exception("No data found in FMP")
-        
-        record = financial_statements.find_one({
-            "symbol": symbol,
-            "statement_type": statement_type,
-            "period": period
-        })
+        return data
 
-    return record["data"]
+    key = {"symbol": symbol, "statement_type": statement_type, "period": period}
+    result = await market_cache.get_or_load("financial_statement", key, load)
+    return result.value
 
-def get_historical_data_fmp(ticker: str, period: str):
-    today = datetime.now()
-    from_date = datetime(today.year, 1, 1)
-    ytd_days=today-from_date
-    days_map = {"1M": 30, "3M": 90, "6M": 180, "1Y": 365, "5Y": 1825,"MAX": 7300,"YTD":ytd_days.days}
-    days = days_map.get(period, 30)
-    to_date = datetime.now()
-    from_date = to_date - timedelta(days=days)
+def fetch_financial_data(symbol: str, statement_type: str, period: str = "annual", limit: int = 5) -> dict:
+    return fmp_repository.run(_afetch_financial_data(symbol, statement_type, period, limit))
+
+async def _afetch_fundamentals(symbols: List[str], statement_types: List[str], limit: int = 5) -> Dict[str, Dict[str, Any]]:
+    pairs = [(symbol.upper(), st) for symbol in dict.fromkeys(symbols) for st in statement_types]
+    outcomes = await asyncio.gather(
+        *(_afetch_financial_data(symbol, st, limit=limit) for symbol, st in pairs), return_exceptions=True
+    )
+    results: Dict[str, Dict[str, Any]] = {symbol.upper(): {} for symbol in symbols}
+    for (symbol, st), outcome in zip(pairs, outcomes):
+        results[symbol][st] = outcome
+    return results
+
+def fetch_fundamentals(symbols: List[str], statement_types: List[str], limit: int = 5) -> Dict[str, Dict[str, Any]]:
+    """
+    Annual statements for several symbols at once, all through the 30-day
+    financial statement cache. Every (symbol, statement_type) pair is looked up
+    concurrently on the runner loop; misses go to FMP through the upstream scheduler.
+    Returns {SYMBOL: {statement_type: rows or the exception raised for it}}.
+    """
+    return fmp_repository.run(_afetch_fundamentals(symbols, statement_types, limit))
 
-    # url = f"https://financialmodelingprep.com/api/v3/historical-price-full/{ticker}?from={from_date.date()}&to={to_date.date()}&apikey={FMP_API_KEY}"
-    url = f"https://financialmodelingprep.com/stable/historical-price-eod/full?symbol={ticker}&from={from_date.date()}&to={to_date.date()}&apikey={FMP_API_KEY}"
-    response = requests.get(url)
-    response.raise_for_status()
-    return response.json()
 
-def get_or_update_historical(ticker: str, period: str) -> dict:
-    now = datetime.now()
+async def _aget_or_update_historical(ticker: str, period: str) -> dict:
     ticker = ticker.upper()
-    client = MongoClient(MONGO_URI)
-    db = client["insight_agent_fmp"]
-    historical_collection = db["historical_data"]
-
-    record = historical_collection.find_one({"ticker": ticker, "period": period})
-    if record:
-        # if (now - record["last_updated"]) < timedelta(hours=24):
-        #     return record["data"]
-        if now.date() == record["last_updated"].date():
-            return record["data"]
-        else:
-            data = get_historical_data_fmp(ticker, period)
-            updated_record = historical_collection.find_one_and_update(
-                {"_id": record["_id"]},
-                {"$set": {"data": data, "last_updated": now}},
-                return_document=ReturnDocument.AFTER
-            )
-            return updated_record["data"]
-    else:
-        data = get_historical_data_fmp(ticker, period)
-        try:
-            new_doc = {
-                "ticker": ticker,
-                "period": period,
-                "data": data,
-                "last_updated": now
-            }
-            historical_collection.insert_one(new_doc)
-        except Exception as insert_error:
-            record = historical_collection.find_one({"ticker": ticker, "period": period})
-            if record:
-                return record["data"]
-            else:
-                raise insert_error
-        return data
-
-def fetch_stock_price_change(symbol: str) -> dict:
-    """
-    Get stock price change for the given symbol.
-    Uses cached data if updated today; else updates from FMP.
-    """
-    symbol = symbol.upper()
+    series = await daily_bar_store.get_period(ticker, period)
+    # newest-first, same shape as the FMP historical-price-full payload
+    return {"symbol": ticker, "historical": series.to_records(newest_first=True)}
 
-    client = MongoClient(MONGO_URI)
-    db = client["insight_agent_fmp"]
-    collection = db["stock_price_changes"]
-    # 1. Check for cached data
-    record = collection.find_one({"symbol": symbol})
-    today = datetime.now().date()
+def get_or_update_historical(ticker: str, period: str) -> dict:
+    """Slice of the canonical daily bar series for `ticker` covering `period`."""
+    return fmp_repository.run(_aget_or_update_historical(ticker, period))
 
-    if record and "last_updated" in record and record["last_updated"].date() == today:
-        return {
-            "symbol": symbol,
-            "changes": [record["data"]],
-            "source": "https://financialmodelingprep.com/"
-        }
 
-    # 2. Fetch fresh data from FMP
+async def _aload_stock_price_change(symbol: str) -> dict:
     # url = f"https://financialmodelingprep.com/api/v3/stock-price-change/{symbol}?apikey={FMP_API_KEY}"
-    url = f"https://financialmodelingprep.com/stable/stock-price-change?symbol={symbol}&apikey={FMP_API_KEY}"
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        fmp_data = response.json()
+        fmp_data = await fmp_client.fetch_json("/stable/stock-price-change", {"symbol": symbol})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"FMP request error: {str(e)}")
-
     if not fmp_data:
         raise HTTPException(status_code=404, detail="No stock price change data found.")
+    return fmp_data[0]
 
-    new_data = fmp_data[0]
-    # 3. Update or insert record in DB
-    if record:
-        collection.update_one(
-            {"_id": record["_id"]},
-            {"$set": {
-                "data": new_data,
-                "last_updated": datetime.now()
-            }}
-        )
-    else:
-        collection.insert_one({
-            "symbol": symbol,
-            "data": new_data,
-            "last_updated": datetime.now()
-        })
-
+async def _afetch_stock_price_change(symbol: str) -> dict:
+    symbol = symbol.upper()
+    result = await market_cache.get_or_load("price_change", {"symbol": symbol}, lambda: _aload_stock_price_change(symbol))
     return {
         "symbol": symbol,
-        "changes": [new_data],
+        "changes": [result.value],
         "source": "https://financialmodelingprep.com/"
     }
 
+def fetch_stock_price_change(symbol: str) -> dict:
+    """
+    Get stock price change for the given symbol.
+    Served from the market data cache (fresh for 30 minutes while the market is
+    open, until the next open otherwise); else updates from FMP.
+    """
+    return fmp_repository.run(_afetch_stock_price_change(symbol))
+
+
+async def _aget_symbol_meta(symbol: str) -> Dict[str, Any]:
+    symbol = symbol.upper()
+
+    async def load():
+        matches = await fmp_client.fetch_json("/stable/search-symbol", {"query": symbol})
+        if not (isinstance(matches, list) and matches and isinstance(matches[0], dict)):
+            raise LookupError(f"No FMP symbol metadata for {symbol}")
+        match = next((m for m in matches if str(m.get("symbol", "")).upper() == symbol), matches[0])
+        return {
+            "currency": match.get("currency"),
+            "exchange": match.get("exchange") or match.get("exchangeShortName"),
+            "name": match.get("name"),
+        }
+
+    try:
+        result = await market_cache.get_or_load("symbol_meta", {"symbol": symbol}, load)
+    except Exception:
+        return {}
+    return result.value
+
+async def _with_currency(quote: Dict[str, Any]) -> Dict[str, Any]:
+    meta = await _aget_symbol_meta(quote["symbol"])
+    quote["currency"] = meta.get("currency") or quote.get("currency") or "USD"
+    return quote
+
+async def _afetch_quote(symbol: str, exchange: Optional[str] = None) -> Optional[dict]:
+    quotes = await _afetch_quotes([(symbol, exchange)])
+    return quotes.get(symbol.upper())
+
+def fetch_quote(symbol: str, exchange: Optional[str] = None) -> Optional[dict]:
+    """
+    Realtime FMP quote (with currency) through the market data cache.
+    Returns None when FMP has no quote for the symbol; HTTP errors propagate.
+    """
+    return fmp_repository.run(_afetch_quote(symbol, exchange))
+
+async def _aload_quotes(symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+    if len(symbols) == 1:
+        data = await fmp_client.fetch_json("/stable/quote", {"symbol": symbols[0]})
+    else:
+        try:
+            data = await fmp_client.fetch_json("/stable/batch-quote", {"symbols": ",".join(symbols)})
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code not in (402, 403):
+                raise
+            # batch endpoint not in the plan: fall back to concurrent single quotes
+            parts = await asyncio.gather(
+                *(fmp_client.fetch_json("/stable/quote", {"symbol": s}) for s in symbols), return_exceptions=True
+            )
+            data = [row for part in parts if isinstance(part, list) for row in part]
+    rows = [dict(row) for row in data or [] if isinstance(row, dict) and row.get("symbol")]
+    rows = await asyncio.gather(*(_with_currency(row) for row in rows))
+    return {row["symbol"].upper(): row for row in rows}
+
+async def _aload_quote_entries(missing: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """`market_cache` batch loader for the "quote" kind."""
+    policy = FRESHNESS_POLICIES["quote"]
+    quotes = await _aload_quotes([k["symbol"] for k in missing])
+    return {market_cache.make_key(policy, {"symbol": sym}): q for sym, q in quotes.items()}
+
+async def _afetch_quotes(symbols: List[tuple]) -> Dict[str, dict]:
+    policy = FRESHNESS_POLICIES["quote"]
+    keys = {sym.upper(): {"symbol": sym.upper()} for sym, _ in symbols if sym}
+    cache_keys = {sym: market_cache.make_key(policy, key) for sym, key in keys.items()}
+    exchanges = {cache_keys[sym.upper()]: resolve_exchange(sym, exchange) for sym, exchange in symbols if sym}
+
+    if not keys:
+        return {}
+    results = await market_cache.get_many("quote", list(keys.values()), _aload_quote_entries, exchanges)
+    return {sym: results[ck].value for sym, ck in cache_keys.items() if ck in results}
+
+def fetch_quotes(symbols: List[tuple]) -> Dict[str, dict]:
+    """
+    Realtime quotes for [(symbol, exchange), ...] in one upstream batch request for
+    whatever is not cached. Returns {SYMBOL: quote}; symbols FMP does not know are
+    omitted. HTTP errors propagate.
+    """
+    return fmp_repository.run(_afetch_quotes(symbols))
+
 async def init_web_search_db():
     client = AsyncIOMotorClient(MONGO_URI)
     database = client["insight_agent"]
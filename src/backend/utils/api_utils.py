@@ -183,8 +183,13 @@ def create_success_html(access_token,base_url):
 
 
 async def check_stop_conversation(session_id: str, message_id: str):
-    stop_msg = await redis_manager.safe_execute("get", f"stop:{session_id}")
-    if stop_msg == message_id:
+    from src.backend.utils.cancellation import cancellation_hub, pending_stop, stop_key
+
+    local = cancellation_hub.is_cancelled(session_id, message_id)
+    if local is not None:
+        return local
+    stop = pending_stop(await redis_manager.safe_execute("get", stop_key(session_id)))
+    if stop is not None and stop[0] == message_id:
         return True
     else:
         return False
\ No newline at end of file
@@ -1,6 +1,25 @@
 import asyncio
+import contextvars
+import os
 import threading
-from typing import Awaitable, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Any, Optional
+
+# Upper bound on blocking tool work (yfinance, per-ticker processing) across all requests.
+TOOL_EXECUTOR_WORKERS = int(os.getenv("TOOL_EXECUTOR_WORKERS", "16"))
+
+async def _in_context(ctx: contextvars.Context, coro: Awaitable[Any]) -> Any:
+    for var, value in ctx.items():
+        var.set(value)
+    return await coro
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor whose tasks run in a copy of the submitting thread's context."""
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
 
 class AsyncRunner:
     def __init__(self):
@@ -14,8 +33,59 @@ class AsyncRunner:
         self.loop.run_forever()
 
     def run_coroutine(self, coro: Awaitable[Any]):
-        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+        # Carry the caller's context variables (request lane/user for the upstream
+        # scheduler, the chart-bot bar context) onto the runner loop.
+        return asyncio.run_coroutine_threadsafe(_in_context(contextvars.copy_context(), coro), self.loop)
+
+    def run_sync(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        """Block the calling thread until `coro` finishes on the runner loop."""
+        if threading.current_thread() is self.thread:
+            coro.close()
+            raise RuntimeError("run_sync() called from the runner's own loop thread")
+        return self.run_coroutine(coro).result(timeout)
+
+    async def run_async(self, coro: Awaitable[Any]) -> Any:
+        """Await `coro` on the runner loop from any other event loop."""
+        if asyncio.get_running_loop() is self.loop:
+            return await coro
+        return await asyncio.wrap_future(self.run_coroutine(coro))
 
     def shutdown(self):
         self.loop.call_soon_threadsafe(self.loop.stop)
         self.thread.join()
+
+
+_shared_runner: Optional[AsyncRunner] = None
+_shared_runner_lock = threading.Lock()
+
+
+def get_shared_runner() -> AsyncRunner:
+    """
+    Process-wide loop that owns upstream market-data I/O (FMP client, cache and
+    repository connections), so sync tool threads and the API loop share one set
+    of pooled connections.
+    """
+    global _shared_runner
+    if _shared_runner is None:
+        with _shared_runner_lock:
+            if _shared_runner is None:
+                _shared_runner = AsyncRunner()
+    return _shared_runner
+
+
+_tool_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_tool_executor() -> ThreadPoolExecutor:
+    """
+    Bounded process-wide pool for fanning out blocking per-item tool work, used
+    instead of a fresh `ThreadPoolExecutor(max_workers=len(items))` per call.
+    Do not submit work that itself waits on this pool.
+    """
+    global _tool_executor
+    if _tool_executor is None:
+        with _shared_runner_lock:
+            if _tool_executor is None:
+                _tool_executor = ContextThreadPoolExecutor(max_workers=TOOL_EXECUTOR_WORKERS,
+                                                           thread_name_prefix="tool-worker")
+    return _tool_executor
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, Optional, Set, Tuple
+
+from src.backend.utils.api_utils import redis_manager
+
+logger = logging.getLogger("uvicorn")
+
+STOP_CHANNEL = "stop-generation"
+# The stop key outlives the pub/sub message so a stream that registers late
+# (or a worker whose listener was reconnecting) still sees the request.
+STOP_KEY_TTL = 10
+# Allowed clock difference between workers when comparing a stop's time with a
+# stream's start.
+CLOCK_SLACK = 1.0
+
+
+def stop_key(session_id: str) -> str:
+    return f"stop:{session_id}"
+
+
+def pending_stop(value: Optional[str]) -> Optional[Tuple[str, float]]:
+    """(message_id, requested_at) from a stop key's value, or None."""
+    if not value:
+        return None
+    try:
+        stop = json.loads(value)
+        return str(stop["message_id"]), float(stop["at"])
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+class CancelToken:
+    """Set once the user asks to stop generating `message_id` in `session_id`."""
+
+    def __init__(self, session_id: str, message_id: str):
+        self.session_id = session_id
+        self.message_id = message_id
+        self._event = asyncio.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        self._event.set()
+
+    async def wait(self):
+        await self._event.wait()
+
+
+class CancellationHub:
+    """
+    Delivers /stop-generation requests to the worker streaming that message.
+
+    A stop request sets `stop:{session_id}` (for late registrations) and is
+    published on the `stop-generation` channel; every worker runs one listener
+    that sets the matching local `CancelToken`, which the stream awaits next to
+    its processor task. Streams therefore do no Redis I/O per event: one GET
+    when they register and one GET (plus a DELETE if it is theirs) when they end.
+
+    A stop only applies to streams that started before it was requested, so a
+    stop that arrives after its stream finished never kills a re-run of the
+    same message.
+    """
+
+    def __init__(self):
+        self._tokens: Dict[str, Set[CancelToken]] = defaultdict(set)
+        self._pubsub = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def register(self, session_id: str, message_id: str, started_at: Optional[float] = None) -> CancelToken:
+        """Track a stream; `started_at` is when its request arrived (defaults to now)."""
+        started_at = time.time() if started_at is None else started_at
+        token = CancelToken(session_id, message_id)
+        self._tokens[session_id].add(token)
+        try:
+            pending = await redis_manager.safe_execute("get", stop_key(session_id))
+        except Exception as e:
+            logger.warning(f"Could not read stop key for {session_id}: {e}")
+            pending = None
+        stop = pending_stop(pending)
+        if stop is not None and stop[0] == message_id and stop[1] >= started_at - CLOCK_SLACK:
+            token.cancel()
+        return token
+
+    async def release(self, token: CancelToken):
+        """The stream ended; drop its token and any stop request still addressed to it."""
+        tokens = self._tokens.get(token.session_id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens[token.session_id]
+        try:
+            stop = pending_stop(await redis_manager.safe_execute("get", stop_key(token.session_id)))
+            if stop is not None and stop[0] == token.message_id:
+                await redis_manager.safe_execute("delete", stop_key(token.session_id))
+        except Exception as e:
+            logger.warning(f"Could not clear stop key for {token.session_id}: {e}")
+
+    def is_cancelled(self, session_id: str, message_id: str) -> Optional[bool]:
+        """Local answer for a registered stream, None if this worker has none."""
+        tokens = [t for t in self._tokens.get(session_id, ()) if t.message_id == message_id]
+        return any(t.cancelled for t in tokens) if tokens else None
+
+    def _deliver(self, session_id: str, message_id: str):
+        for token in self._tokens.get(session_id, ()):
+            if token.message_id == message_id:
+                token.cancel()
+
+    async def request_stop(self, session_id: str, message_id: str):
+        self._deliver(session_id, message_id)
+        stop = json.dumps({"message_id": message_id, "at": time.time()})
+        await redis_manager.safe_execute("set", stop_key(session_id), stop, ex=STOP_KEY_TTL)
+        await redis_manager.safe_execute(
+            "publish", STOP_CHANNEL, json.dumps({"session_id": session_id, "message_id": message_id})
+        )
+
+    async def _listen(self):
+        while True:
+            try:
+                if self._pubsub is None:
+                    if redis_manager.client is None:
+                        await asyncio.sleep(1.0)
+                        continue
+                    self._pubsub = redis_manager.client.pubsub()
+                    await self._pubsub.subscribe(STOP_CHANNEL)
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Stop-generation listener failed, resubscribing: {e}")
+                self._pubsub = None
+                await asyncio.sleep(1.0)
+                continue
+            if not message or message.get("type") != "message":
+                continue
+            try:
+                request = json.loads(message["data"])
+                self._deliver(request["session_id"], request["message_id"])
+            except (ValueError, KeyError, TypeError):
+                logger.warning(f"Ignoring malformed stop request: {message.get('data')!r}")
+
+    def start(self):
+        """Start the listener on the app event loop; call after `redis_manager.connect()`."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._listen())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._pubsub is not None:
+            try:
+                await (getattr(self._pubsub, "aclose", None) or self._pubsub.close)()
+            except Exception:
+                pass
+            self._pubsub = None
+
+
+cancellation_hub = CancellationHub()
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import os
+import random
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+from dotenv import load_dotenv
+
+from src.backend.utils.async_runner import get_shared_runner
+from src.backend.utils.fmp_entitlements import EntitlementMap, entitlement_symbol
+from src.backend.utils.upstream_scheduler import retry_after_seconds, upstream_scheduler
+
+load_dotenv()
+
+FMP_API_KEY = os.getenv("FM_API_KEY")
+FMP_BASE_URL = "https://financialmodelingprep.com"
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+DEFAULT_TIMEOUT = httpx.Timeout(connect=5.0, read=20.0, write=5.0, pool=5.0)
+
+# Quotes and symbol lookups sit on the interactive path and should fail fast;
+# full EOD history and statements are larger payloads and get a longer read window.
+ENDPOINT_TIMEOUTS: Dict[str, httpx.Timeout] = {
+    "/stable/quote": httpx.Timeout(connect=5.0, read=10.0, write=5.0, pool=5.0),
+    "/stable/batch-quote": httpx.Timeout(connect=5.0, read=10.0, write=5.0, pool=5.0),
+    "/stable/search-symbol": httpx.Timeout(connect=5.0, read=8.0, write=5.0, pool=5.0),
+    "/stable/search-name": httpx.Timeout(connect=5.0, read=8.0, write=5.0, pool=5.0),
+    "/stable/profile": httpx.Timeout(connect=5.0, read=10.0, write=5.0, pool=5.0),
+    "/stable/stock-price-change": httpx.Timeout(connect=5.0, read=10.0, write=5.0, pool=5.0),
+    "/stable/historical-price-eod/full": httpx.Timeout(connect=5.0, read=30.0, write=5.0, pool=5.0),
+    "/stable/stock-list": httpx.Timeout(connect=5.0, read=60.0, write=5.0, pool=5.0),
+}
+
+logger = logging.getLogger("uvicorn")
+
+
+class FMPNotEntitledError(httpx.HTTPStatusError):
+    """
+    FMP answered 402 Payment Required for this endpoint and symbol, either just
+    now or within the entitlement TTL. Callers route to another source instead
+    of retrying FMP.
+    """
+
+    def __init__(self, endpoint: str, symbol: str, response: httpx.Response, cached: bool = False):
+        self.endpoint = endpoint
+        self.symbol = symbol
+        self.cached = cached
+        super().__init__(
+            f"402 Payment Required: {endpoint} is not available for {symbol} on the current FMP plan",
+            request=response.request,
+            response=response,
+        )
+
+
+class FMPClient:
+    """
+    Process-wide async client for Financial Modeling Prep.
+
+    All requests run on the shared runner loop through a single pooled
+    `httpx.AsyncClient`, so keep-alive connections are reused across tools and
+    requests. Identical requests that are already in flight are coalesced onto
+    one upstream call, and every attempt takes a slot from the upstream
+    scheduler's "fmp" bucket. Non-2xx responses raise `httpx.HTTPStatusError` after
+    retries are exhausted; 402 responses raise `FMPNotEntitledError` and are
+    remembered in the entitlement map, so repeats fail without a round trip.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, base_url: str = FMP_BASE_URL,
+                 max_connections: int = 20, max_keepalive_connections: int = 10,
+                 tries: int = 3, backoff: float = 0.75):
+        self.api_key = api_key or FMP_API_KEY
+        self.base_url = base_url.rstrip("/")
+        self.limits = httpx.Limits(max_connections=max_connections,
+                                   max_keepalive_connections=max_keepalive_connections,
+                                   keepalive_expiry=30.0)
+        self.tries = tries
+        self.backoff = backoff
+        self.runner = get_shared_runner()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._inflight: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], asyncio.Task] = {}
+        self.entitlements = EntitlementMap()
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(base_url=self.base_url, limits=self.limits, timeout=DEFAULT_TIMEOUT)
+        return self._client
+
+    @staticmethod
+    def _normalize_path(path: str) -> str:
+        if path.startswith(FMP_BASE_URL):
+            path = path[len(FMP_BASE_URL):]
+        path = "/" + path.lstrip("/")
+        return path.rstrip("/") or "/"
+
+    async def _request(self, path: str, params: Dict[str, Any]) -> httpx.Response:
+        client = self._get_client()
+        timeout = ENDPOINT_TIMEOUTS.get(path, DEFAULT_TIMEOUT)
+        query = {**params, "apikey": self.api_key}
+        last_exc: Optional[Exception] = None
+        for attempt in range(self.tries):
+            await upstream_scheduler.acquire("fmp")
+            try:
+                resp = await client.get(path, params=query, timeout=timeout)
+                if resp.status_code in RETRY_STATUS and attempt < self.tries - 1:
+                    raise httpx.HTTPStatusError("retryable", request=resp.request, response=resp)
+                resp.raise_for_status()
+                return resp
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code == 402:
+                    symbol = entitlement_symbol(params)
+                    self.entitlements.record(path, symbol)
+                    raise FMPNotEntitledError(path, symbol, e.response) from e
+                if e.response.status_code not in RETRY_STATUS or attempt == self.tries - 1:
+                    raise
+                last_exc = e
+                if e.response.status_code == 429:
+                    # the scheduler holds back every FMP caller, this retry included
+                    upstream_scheduler.throttled("fmp", retry_after_seconds(e.response.headers))
+                    continue
+            except httpx.TransportError as e:
+                if attempt == self.tries - 1:
+                    raise
+                last_exc = e
+            delay = self.backoff * (2 ** attempt) + random.uniform(0, 0.25)
+            logger.warning(f"FMP {path} attempt {attempt + 1} failed ({last_exc!r}); retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+        raise last_exc
+
+    async def fetch(self, path: str, params: Optional[Dict[str, Any]] = None) -> httpx.Response:
+        """Issue (or join) a GET request. Must run on the runner loop."""
+        path = self._normalize_path(path)
+        clean = {k: v for k, v in (params or {}).items() if v is not None and k != "apikey"}
+        symbol = entitlement_symbol(clean)
+        if self.entitlements.blocked_until(path, symbol) is not None:
+            request = httpx.Request("GET", self.base_url + path, params=clean)
+            raise FMPNotEntitledError(path, symbol, httpx.Response(402, request=request), cached=True)
+        key = (path, tuple(sorted((k, str(v)) for k, v in clean.items())))
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._request(path, clean))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _t, _k=key: self._inflight.pop(_k, None))
+        # shield so one cancelled caller does not abort the request for the others
+        return await asyncio.shield(task)
+
+    async def fetch_json(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """Like `fetch` but decodes the body. Each caller gets its own parsed copy."""
+        resp = await self.fetch(path, params)
+        return resp.json()
+
+    def get_json(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """Blocking helper for sync tools and worker threads."""
+        return self.runner.run_sync(self.fetch_json(path, params))
+
+    async def aget_json(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        """Awaitable helper for coroutines running on any event loop."""
+        return await self.runner.run_async(self.fetch_json(path, params))
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+fmp_client = FMPClient()
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from src.backend.db.fmp_repository import fmp_repository
+
+logger = logging.getLogger("uvicorn")
+
+ENTITLEMENTS_COLLECTION = "fmp_entitlements"
+# How long a 402 keeps an (endpoint, symbol) pair routed away from FMP. Plans change
+# rarely, so a week saves the most round trips while still picking up upgrades.
+ENTITLEMENT_TTL = timedelta(seconds=float(os.getenv("FMP_ENTITLEMENT_TTL", str(7 * 24 * 3600))))
+# A 402 on a multi-symbol call (batch quotes) may come from one listing outside the
+# plan, so it only blocks that exact symbol set, and only briefly.
+BATCH_ENTITLEMENT_TTL = timedelta(seconds=float(os.getenv("FMP_BATCH_ENTITLEMENT_TTL", "1800")))
+# Endpoints called without any symbol (lists, screeners) are keyed on this; a 402
+# there is plan-level and blocks the endpoint for every symbol.
+ANY_SYMBOL = "*"
+
+
+def entitlement_symbol(params: Dict[str, Any]) -> str:
+    symbol = params.get("symbol")
+    if symbol:
+        return str(symbol).upper()
+    symbols = params.get("symbols")
+    if symbols:
+        return ",".join(sorted({s.strip().upper() for s in str(symbols).split(",") if s.strip()}))
+    return ANY_SYMBOL
+
+
+def _is_batch(symbol: str) -> bool:
+    return "," in symbol
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+class EntitlementMap:
+    """
+    (endpoint, symbol) pairs FMP refused with 402 Payment Required, with an expiry.
+
+    `FMPClient` records every 402 here and checks the map before each request,
+    so a symbol outside the plan (typically a non-US listing) fails immediately
+    instead of paying an upstream round trip first. Multi-symbol calls are keyed
+    on their symbol set with BATCH_ENTITLEMENT_TTL; only symbol-less calls record
+    `ANY_SYMBOL`, which covers every symbol. Entries live in memory and
+    in the `fmp_entitlements` collection, loaded once per process on first use.
+    Must be used on the runner loop.
+    """
+
+    def __init__(self, ttl: timedelta = ENTITLEMENT_TTL, batch_ttl: timedelta = BATCH_ENTITLEMENT_TTL):
+        self.ttl = ttl
+        self.batch_ttl = batch_ttl
+        self._blocked: Dict[Tuple[str, str], datetime] = {}
+        self._load_task: Optional[asyncio.Task] = None
+
+    def _ensure_loading(self):
+        # Loaded in the background so a slow or unreachable Mongo never delays an
+        # FMP request; until it lands only this process's own 402s are known.
+        if self._load_task is None:
+            self._load_task = asyncio.get_running_loop().create_task(self._load())
+
+    async def _load(self):
+        try:
+            docs = await fmp_repository.find(
+                ENTITLEMENTS_COLLECTION,
+                {"expires_at": {"$gt": datetime.now(timezone.utc)}},
+                {"_id": 0, "endpoint": 1, "symbol": 1, "expires_at": 1},
+            )
+        except Exception as e:
+            logger.warning(f"Could not load FMP entitlement map: {e}")
+            return
+        for doc in docs:
+            self._blocked.setdefault((doc["endpoint"], doc["symbol"]), _as_utc(doc["expires_at"]))
+
+    def blocked_until(self, endpoint: str, symbol: str) -> Optional[datetime]:
+        """Expiry of the entry covering (endpoint, symbol), or None if FMP should be asked."""
+        self._ensure_loading()
+        now = datetime.now(timezone.utc)
+        for key in ((endpoint, symbol), (endpoint, ANY_SYMBOL)):
+            expires = self._blocked.get(key)
+            if expires is None:
+                continue
+            if expires > now:
+                return expires
+            del self._blocked[key]
+        return None
+
+    def record(self, endpoint: str, symbol: str, status: int = 402):
+        now = datetime.now(timezone.utc)
+        expires = now + (self.batch_ttl if _is_batch(symbol) else self.ttl)
+        self._blocked[(endpoint, symbol)] = expires
+        logger.info(f"FMP {endpoint} not entitled for {symbol} until {expires.isoformat()}")
+        asyncio.get_running_loop().create_task(self._persist(endpoint, symbol, {
+            "status": status, "recorded_at": now, "expires_at": expires,
+        }))
+
+    @staticmethod
+    async def _persist(endpoint: str, symbol: str, fields: Dict[str, Any]):
+        try:
+            await fmp_repository.upsert(ENTITLEMENTS_COLLECTION, {"endpoint": endpoint, "symbol": symbol}, fields)
+        except Exception as e:
+            logger.warning(f"Could not persist FMP entitlement for {endpoint} {symbol}: {e}")
+
+    def __len__(self):
+        return len(self._blocked)
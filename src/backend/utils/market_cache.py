@@ -0,0 +1,480 @@
+import asyncio
+import copy
+import json
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from redis.asyncio import Redis
+
+from src.backend.db.fmp_repository import fmp_repository
+from src.backend.utils.api_utils import redis_manager
+from src.backend.utils.market_calendar import is_market_open, next_open, resolve_exchange
+
+logger = logging.getLogger("uvicorn")
+
+
+@dataclass(frozen=True)
+class FreshnessPolicy:
+    """
+    How long a cached value of one data kind stays fresh.
+
+    `ttl` applies from the time the value was written. When `market_aware` is set,
+    a value written while the symbol's market is closed stays fresh at least until
+    the next session open, since it cannot change before then.
+    """
+    kind: str
+    ttl: timedelta
+    key_fields: Tuple[str, ...] = ("symbol",)
+    collection: Optional[str] = None
+    market_aware: bool = False
+    serve_stale_on_error: bool = True
+
+    def expires_at(self, written_at: datetime, exchange: str = "US") -> datetime:
+        expiry = written_at + self.ttl
+        if self.market_aware and not is_market_open(exchange, written_at):
+            expiry = max(expiry, next_open(exchange, written_at))
+        return expiry
+
+
+FRESHNESS_POLICIES: Dict[str, FreshnessPolicy] = {}
+
+
+def register_policy(policy: FreshnessPolicy) -> FreshnessPolicy:
+    FRESHNESS_POLICIES[policy.kind] = policy
+    return policy
+
+
+register_policy(FreshnessPolicy("quote", timedelta(minutes=1), collection="quotes", market_aware=True,
+                                serve_stale_on_error=False))
+register_policy(FreshnessPolicy("price_change", timedelta(minutes=30), collection="stock_price_changes", market_aware=True))
+register_policy(FreshnessPolicy("profile", timedelta(days=1), collection="company_profiles"))
+register_policy(FreshnessPolicy("symbol_meta", timedelta(days=30), collection="symbol_metadata"))
+register_policy(FreshnessPolicy("financial_statement", timedelta(days=30),
+                                key_fields=("symbol", "statement_type", "period"),
+                                collection="financial_statements"))
+
+
+class CacheResult(NamedTuple):
+    value: Any
+    source: str  # "l1", "l2", "l3", "origin" or "stale"
+
+
+class LRUTTLCache:
+    """Small in-process LRU whose entries carry their own expiry timestamp."""
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, expires: float):
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def expiry(self, key: str) -> float:
+        """Expiry timestamp of a live entry, 0 if there is none. Does not touch LRU order."""
+        with self._lock:
+            item = self._data.get(key)
+            return item[0] if item and item[0] > time.time() else 0.0
+
+    def pop(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class _RedisTier:
+    """Redis client bound to the runner loop. Backs off for `cooldown` seconds after a failure."""
+
+    def __init__(self, config: Dict[str, Any], cooldown: float = 30.0):
+        self.config = {**config, "socket_timeout": 0.5, "socket_connect_timeout": 0.5}
+        self.cooldown = cooldown
+        self.client: Optional[Redis] = None
+        self._down_until = 0.0
+
+    def _available(self) -> bool:
+        if not self.config.get("host"):
+            return False
+        if time.time() < self._down_until:
+            return False
+        if self.client is None:
+            self.client = Redis(**self.config)
+        return True
+
+    def _fail(self, e: Exception):
+        logger.warning(f"Market cache Redis tier unavailable: {e}")
+        self._down_until = time.time() + self.cooldown
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self._available():
+            return None
+        try:
+            raw = await self.client.get(key)
+        except Exception as e:
+            self._fail(e)
+            return None
+        return json.loads(raw) if raw else None
+
+    async def set(self, key: str, envelope: Dict[str, Any], ttl: int):
+        if not self._available():
+            return
+        try:
+            await self.client.set(key, json.dumps(envelope, default=str), ex=max(1, ttl))
+        except Exception as e:
+            self._fail(e)
+
+    async def delete(self, key: str):
+        if not self._available():
+            return
+        try:
+            await self.client.delete(key)
+        except Exception as e:
+            self._fail(e)
+
+
+class WarmLedger:
+    """
+    Keys refreshed ahead of demand by the market warmer, for counting the
+    interactive misses that refresh prevented.
+
+    A warmed key counts once, on its first interactive hit at or after the time
+    the value it replaced would have expired (at once if there was none) while
+    the warmed value is still fresh: without the warmer that read would have
+    gone upstream. Hits before then would have been served anyway.
+    """
+
+    def __init__(self, maxsize: int = 8192):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Tuple[str, float, float]]" = OrderedDict()
+        self.counters: Dict[str, Counter] = defaultdict(Counter)
+        self._lock = threading.Lock()
+
+    def mark(self, kind: str, key: str, stale_at: float, fresh_until: float):
+        with self._lock:
+            self._entries[key] = (kind, stale_at, fresh_until)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            self.counters[kind]["warmed"] += 1
+
+    def hit(self, key: str):
+        if not self._entries:
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            kind, stale_at, fresh_until = entry
+            now = time.time()
+            if now < stale_at:
+                return
+            del self._entries[key]
+            if now < fresh_until:
+                self.counters[kind]["prevented_misses"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            kinds = {kind: dict(c) for kind, c in self.counters.items()}
+            pending = len(self._entries)
+        return {
+            "prevented_misses": sum(c.get("prevented_misses", 0) for c in kinds.values()),
+            "pending": pending,
+            "kinds": kinds,
+        }
+
+
+warm_ledger = WarmLedger()
+
+
+def _as_utc(value: datetime) -> datetime:
+    # Motor returns naive datetimes; `expires_at` is stored as UTC, legacy
+    # `last_updated` values were written with naive local `datetime.now()`.
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+class MarketDataCache:
+    """
+    Tiered cache for market data: L1 in-process LRU+TTL, L2 Redis, L3 Mongo.
+
+    Lookups run on the shared runner loop (see `fmp_repository.runner`). A miss on
+    every tier calls the loader once per key, even with concurrent callers, then
+    writes the value through all tiers. If the loader fails and the policy allows
+    it, the last persisted value is returned with source "stale".
+    """
+
+    def __init__(self, l1_maxsize: int = 4096):
+        self.l1 = LRUTTLCache(l1_maxsize)
+        self.l2 = _RedisTier(redis_manager.redis_config)
+        self.counters: Dict[str, Counter] = defaultdict(Counter)
+        self._loading: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def make_key(policy: FreshnessPolicy, key: Dict[str, Any]) -> str:
+        return f"mc:{policy.kind}:" + "|".join(str(key[f]) for f in policy.key_fields)
+
+    async def _read_l3(self, policy: FreshnessPolicy, key: Dict[str, Any], exchange: str) -> Optional[Tuple[Any, float]]:
+        if not policy.collection:
+            return None
+        doc = await fmp_repository.find_one(policy.collection, {f: key[f] for f in policy.key_fields})
+        if not doc or "data" not in doc:
+            return None
+        if doc.get("expires_at"):
+            expires = _as_utc(doc["expires_at"])
+        elif doc.get("last_updated"):
+            expires = policy.expires_at(doc["last_updated"].astimezone(timezone.utc), exchange)
+        else:
+            return doc["data"], 0.0
+        return doc["data"], expires.timestamp()
+
+    async def _write(self, policy: FreshnessPolicy, key: Dict[str, Any], cache_key: str, value: Any,
+                     exchange: str, persist: bool = True) -> float:
+        now = datetime.now(timezone.utc)
+        expires = policy.expires_at(now, exchange)
+        exp_ts = expires.timestamp()
+        self.l1.set(cache_key, value, exp_ts)
+        await self.l2.set(cache_key, {"v": value, "exp": exp_ts}, int(exp_ts - now.timestamp()))
+        if persist and policy.collection:
+            await fmp_repository.upsert(
+                policy.collection,
+                {f: key[f] for f in policy.key_fields},
+                {"data": value, "last_updated": datetime.now(), "expires_at": expires},
+            )
+        return exp_ts
+
+    async def _load(self, policy: FreshnessPolicy, key: Dict[str, Any], cache_key: str,
+                    loader: Callable[[], Awaitable[Any]], exchange: str,
+                    stale: Optional[Any]) -> CacheResult:
+        counters = self.counters[policy.kind]
+        try:
+            value = await loader()
+        except Exception:
+            counters["error"] += 1
+            if stale is not None and policy.serve_stale_on_error:
+                counters["stale"] += 1
+                return CacheResult(stale, "stale")
+            raise
+        await self._write(policy, key, cache_key, value, exchange)
+        return CacheResult(value, "origin")
+
+    async def get_or_load(self, kind: str, key: Dict[str, Any], loader: Callable[[], Awaitable[Any]],
+                          exchange: Optional[str] = None) -> CacheResult:
+        """Must run on the runner loop. The returned value is the caller's own copy."""
+        result = await self._get_or_load(kind, key, loader, exchange)
+        return result._replace(value=copy.deepcopy(result.value))
+
+    async def _lookup(self, policy: FreshnessPolicy, key: Dict[str, Any], cache_key: str,
+                      exchange: str) -> Tuple[Optional[CacheResult], Optional[Any]]:
+        """Fresh value from the first tier that has one, else (None, last persisted value)."""
+        counters = self.counters[policy.kind]
+        now = time.time()
+
+        value = self.l1.get(cache_key)
+        if value is not None:
+            counters["l1_hit"] += 1
+            warm_ledger.hit(cache_key)
+            return CacheResult(value, "l1"), None
+
+        envelope = await self.l2.get(cache_key)
+        if envelope and envelope.get("exp", 0) > now:
+            counters["l2_hit"] += 1
+            warm_ledger.hit(cache_key)
+            self.l1.set(cache_key, envelope["v"], envelope["exp"])
+            return CacheResult(envelope["v"], "l2"), None
+
+        stale = None
+        persisted = await self._read_l3(policy, key, exchange)
+        if persisted is not None:
+            value, exp_ts = persisted
+            if exp_ts > now:
+                counters["l3_hit"] += 1
+                warm_ledger.hit(cache_key)
+                self.l1.set(cache_key, value, exp_ts)
+                await self.l2.set(cache_key, {"v": value, "exp": exp_ts}, int(exp_ts - now))
+                return CacheResult(value, "l3"), None
+            stale = value
+
+        counters["miss"] += 1
+        return None, stale
+
+    def _start_load(self, cache_key: str, coro: Awaitable[CacheResult]) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(coro)
+        self._loading[cache_key] = task
+        task.add_done_callback(lambda _t, _k=cache_key: self._loading.pop(_k, None))
+        return task
+
+    async def _get_or_load(self, kind: str, key: Dict[str, Any], loader: Callable[[], Awaitable[Any]],
+                           exchange: Optional[str]) -> CacheResult:
+        policy = FRESHNESS_POLICIES[kind]
+        cache_key = self.make_key(policy, key)
+        exchange = exchange or resolve_exchange(key.get("symbol"))
+
+        hit, stale = await self._lookup(policy, key, cache_key, exchange)
+        if hit is not None:
+            return hit
+
+        task = self._loading.get(cache_key)
+        if task is None:
+            task = self._start_load(cache_key, self._load(policy, key, cache_key, loader, exchange, stale))
+        return await asyncio.shield(task)
+
+    async def get_many(self, kind: str, keys: List[Dict[str, Any]],
+                       batch_loader: Callable[[List[Dict[str, Any]]], Awaitable[Dict[str, Any]]],
+                       exchanges: Optional[Dict[str, str]] = None) -> Dict[str, CacheResult]:
+        """
+        Batched `get_or_load`. Must run on the runner loop.
+
+        Keys missing from every tier are loaded with a single `batch_loader(missing)`
+        call, which returns {cache_key: value}; keys absent from that mapping are
+        left out of the result. Keys already being loaded by another caller are
+        joined instead of re-requested. Returns {cache_key: CacheResult} with copies.
+        """
+        policy = FRESHNESS_POLICIES[kind]
+        exchanges = exchanges or {}
+        results: Dict[str, CacheResult] = {}
+        pending: Dict[str, asyncio.Task] = {}
+        missing: List[Tuple[str, Dict[str, Any], str, Optional[Any]]] = []
+        seen = set()
+
+        for key in keys:
+            cache_key = self.make_key(policy, key)
+            if cache_key in seen:
+                continue
+            seen.add(cache_key)
+            exchange = exchanges.get(cache_key) or resolve_exchange(key.get("symbol"))
+            hit, stale = await self._lookup(policy, key, cache_key, exchange)
+            if hit is not None:
+                results[cache_key] = hit
+            elif cache_key in self._loading:
+                pending[cache_key] = self._loading[cache_key]
+            else:
+                missing.append((cache_key, key, exchange, stale))
+
+        if missing:
+            batch = asyncio.get_running_loop().create_task(batch_loader([m[1] for m in missing]))
+            for cache_key, key, exchange, stale in missing:
+                pending[cache_key] = self._start_load(
+                    cache_key, self._load(policy, key, cache_key, self._batch_item(batch, cache_key), exchange, stale)
+                )
+
+        outcomes = await asyncio.gather(*(asyncio.shield(t) for t in pending.values()), return_exceptions=True)
+        for cache_key, outcome in zip(pending, outcomes):
+            if isinstance(outcome, LookupError):
+                continue
+            if isinstance(outcome, BaseException):
+                raise outcome
+            results[cache_key] = outcome
+        return {k: r._replace(value=copy.deepcopy(r.value)) for k, r in results.items()}
+
+    @staticmethod
+    def _batch_item(batch: asyncio.Task, cache_key: str) -> Callable[[], Awaitable[Any]]:
+        async def load():
+            values = await asyncio.shield(batch)
+            if cache_key not in values:
+                raise LookupError(cache_key)
+            return values[cache_key]
+        return load
+
+    async def _expiry(self, policy: FreshnessPolicy, key: Dict[str, Any], cache_key: str, exchange: str) -> float:
+        """Expiry timestamp of the freshest stored value, 0 if none. Leaves hit counters alone."""
+        expires = self.l1.expiry(cache_key)
+        if expires:
+            return expires
+        envelope = await self.l2.get(cache_key)
+        if envelope and envelope.get("exp", 0) > time.time():
+            return envelope["exp"]
+        persisted = await self._read_l3(policy, key, exchange)
+        return persisted[1] if persisted is not None else 0.0
+
+    async def refresh(self, kind: str, keys: List[Dict[str, Any]],
+                      batch_loader: Callable[[List[Dict[str, Any]]], Awaitable[Dict[str, Any]]],
+                      exchanges: Optional[Dict[str, str]] = None, horizon: float = 0.0) -> Dict[str, int]:
+        """
+        Reload, ahead of demand, the keys whose value is missing or expires within
+        `horizon` seconds. Must run on the runner loop.
+
+        `batch_loader` has the `get_many` contract and is called once for all due
+        keys; interactive callers asking for one of them meanwhile join the load.
+        Keys already being loaded are left alone. Written keys are recorded in
+        `warm_ledger`. Returns counts of "warmed", "fresh" and "failed" keys.
+        """
+        policy = FRESHNESS_POLICIES[kind]
+        exchanges = exchanges or {}
+        deadline = time.time() + horizon
+        report = Counter()
+        due: List[Tuple[str, Dict[str, Any], str, float]] = []
+        for key in keys:
+            cache_key = self.make_key(policy, key)
+            if cache_key in self._loading:
+                continue
+            exchange = exchanges.get(cache_key) or resolve_exchange(key.get("symbol"))
+            expires = await self._expiry(policy, key, cache_key, exchange)
+            if expires > deadline:
+                report["fresh"] += 1
+                continue
+            due.append((cache_key, key, exchange, expires))
+        if not due:
+            return dict(report)
+
+        batch = asyncio.get_running_loop().create_task(batch_loader([d[1] for d in due]))
+        tasks = [
+            self._start_load(cache_key, self._load(policy, key, cache_key, self._batch_item(batch, cache_key), exchange, None))
+            for cache_key, key, exchange, _ in due
+        ]
+        outcomes = await asyncio.gather(*(asyncio.shield(t) for t in tasks), return_exceptions=True)
+        for (cache_key, _, _, expires), outcome in zip(due, outcomes):
+            if isinstance(outcome, BaseException):
+                report["failed"] += 1
+                continue
+            report["warmed"] += 1
+            warm_ledger.mark(kind, cache_key, expires, self.l1.expiry(cache_key))
+        return dict(report)
+
+    async def put(self, kind: str, key: Dict[str, Any], value: Any, exchange: Optional[str] = None,
+                  persist: bool = True):
+        """
+        Write a value fetched elsewhere through the cache. Runner loop only.
+        `persist=False` skips the Mongo tier, for frequent writers such as the
+        quote hub whose values are superseded long before L3 would be read.
+        """
+        policy = FRESHNESS_POLICIES[kind]
+        await self._write(policy, key, self.make_key(policy, key), value,
+                          exchange or resolve_exchange(key.get("symbol")), persist)
+
+    async def invalidate(self, kind: str, key: Dict[str, Any]):
+        policy = FRESHNESS_POLICIES[kind]
+        cache_key = self.make_key(policy, key)
+        self.l1.pop(cache_key)
+        await self.l2.delete(cache_key)
+
+    def stats(self) -> Dict[str, Any]:
+        kinds = {}
+        for kind, c in self.counters.items():
+            hits = c["l1_hit"] + c["l2_hit"] + c["l3_hit"]
+            total = hits + c["miss"]
+            kinds[kind] = {**c, "hit_ratio": round(hits / total, 4) if total else None}
+        return {"l1_size": len(self.l1), "kinds": kinds}
+
+
+market_cache = MarketDataCache()
@@ -0,0 +1,105 @@
+from datetime import datetime, time, timedelta, timezone
+from typing import Dict, NamedTuple, Optional
+from zoneinfo import ZoneInfo
+
+
+class TradingSession(NamedTuple):
+    tz: str
+    open: time
+    close: time
+    weekdays: frozenset = frozenset(range(5))
+    always_open: bool = False
+
+
+# Regular sessions only; exchange holidays are treated as trading days, which
+# just means a cached value may be refreshed one extra time on a holiday.
+TRADING_SESSIONS: Dict[str, TradingSession] = {
+    "US": TradingSession("America/New_York", time(9, 30), time(16, 0)),
+    "NSE": TradingSession("Asia/Kolkata", time(9, 15), time(15, 30)),
+    "BSE": TradingSession("Asia/Kolkata", time(9, 15), time(15, 30)),
+    "DFM": TradingSession("Asia/Dubai", time(10, 0), time(15, 0)),
+    "ADX": TradingSession("Asia/Dubai", time(10, 0), time(15, 0)),
+    "LSE": TradingSession("Europe/London", time(8, 0), time(16, 30)),
+    "CRYPTO": TradingSession("UTC", time(0, 0), time(23, 59, 59), frozenset(range(7)), always_open=True),
+}
+
+SUFFIX_TO_EXCHANGE = {
+    ".NS": "NSE",
+    ".BO": "BSE",
+    ".AE": "DFM",
+    ".AD": "ADX",
+    ".L": "LSE",
+}
+
+EXCHANGE_ALIASES = {
+    "NASDAQ": "US", "NYSE": "US", "AMEX": "US", "NYSEARCA": "US", "BATS": "US", "OTC": "US",
+    "NSE": "NSE", "NSEI": "NSE", "BSE": "BSE",
+    "DFM": "DFM", "ADX": "ADX", "LSE": "LSE",
+    "CRYPTO": "CRYPTO", "CCC": "CRYPTO",
+}
+
+
+def resolve_exchange(symbol: Optional[str] = None, exchange: Optional[str] = None) -> str:
+    """Map a ticker and/or exchange code to a key of `TRADING_SESSIONS` (default: US)."""
+    if exchange:
+        key = EXCHANGE_ALIASES.get(exchange.upper())
+        if key:
+            return key
+    if symbol:
+        upper = symbol.upper()
+        for suffix, key in SUFFIX_TO_EXCHANGE.items():
+            if upper.endswith(suffix):
+                return key
+        if upper.endswith("-USD") or (upper.endswith("USD") and len(upper) in (6, 7) and "." not in upper):
+            return "CRYPTO"
+    return "US"
+
+
+def _as_local(now: Optional[datetime], session: TradingSession) -> datetime:
+    now = now or datetime.now(timezone.utc)
+    if now.tzinfo is None:
+        now = now.astimezone()
+    return now.astimezone(ZoneInfo(session.tz))
+
+
+def is_always_open(exchange: str = "US") -> bool:
+    """True for sessions that never close (crypto): there is no settled daily close."""
+    return TRADING_SESSIONS.get(exchange, TRADING_SESSIONS["US"]).always_open
+
+
+def is_market_open(exchange: str = "US", now: Optional[datetime] = None) -> bool:
+    session = TRADING_SESSIONS.get(exchange, TRADING_SESSIONS["US"])
+    if session.always_open:
+        return True
+    local = _as_local(now, session)
+    return local.weekday() in session.weekdays and session.open <= local.time() < session.close
+
+
+def next_open(exchange: str = "US", now: Optional[datetime] = None) -> datetime:
+    """Next session open strictly after `now`, as an aware UTC datetime."""
+    session = TRADING_SESSIONS.get(exchange, TRADING_SESSIONS["US"])
+    local = _as_local(now, session)
+    if session.always_open:
+        return local.astimezone(timezone.utc)
+    day = local.date()
+    for _ in range(8):
+        candidate = datetime.combine(day, session.open, tzinfo=ZoneInfo(session.tz))
+        if candidate > local and candidate.weekday() in session.weekdays:
+            return candidate.astimezone(timezone.utc)
+        day += timedelta(days=1)
+    return (local + timedelta(days=1)).astimezone(timezone.utc)
+
+
+def last_close(exchange: str = "US", now: Optional[datetime] = None) -> datetime:
+    """Most recent session close at or before `now`, as an aware UTC datetime."""
+    session = TRADING_SESSIONS.get(exchange, TRADING_SESSIONS["US"])
+    local = _as_local(now, session)
+    if session.always_open:
+        return local.astimezone(timezone.utc)
+    day = local.date()
+    for _ in range(8):
+        candidate = datetime.combine(day, session.close, tzinfo=ZoneInfo(session.tz))
+        if candidate <= local and candidate.weekday() in session.weekdays:
+            return candidate.astimezone(timezone.utc)
+        day -= timedelta(days=1)
+    return (local - timedelta(days=1)).astimezone(timezone.utc)
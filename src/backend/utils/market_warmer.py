@@ -0,0 +1,326 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.backend.db.daily_bars import daily_bar_store
+from src.backend.db.fmp_repository import fmp_repository
+from src.backend.db.mongodb import _aload_company_profile, _aload_quote_entries, _aload_stock_price_change
+from src.backend.models.model import MessageLog
+from src.backend.utils.api_utils import redis_manager
+from src.backend.utils.market_cache import FRESHNESS_POLICIES, market_cache, warm_ledger
+from src.backend.utils.market_calendar import is_market_open, next_open, resolve_exchange
+from src.backend.utils.upstream_scheduler import Lane, bind, upstream_scheduler
+
+logger = logging.getLogger("uvicorn")
+
+WARMER_ENABLED = os.getenv("WARMER_ENABLED", "1") not in ("0", "false", "False")
+# Upstream (FMP) calls one warm cycle may spend; the least popular symbols are skipped first.
+WARMER_BUDGET = int(os.getenv("WARMER_BUDGET", "200"))
+WARMER_HOT_SET_SIZE = int(os.getenv("WARMER_HOT_SET_SIZE", "50"))
+WARMER_LOOKBACK = timedelta(days=float(os.getenv("WARMER_LOOKBACK_DAYS", "3")))
+# Seconds between warm cycles while a market is open.
+WARMER_INTERVAL = float(os.getenv("WARMER_INTERVAL", "300"))
+# Seconds before a session open at which the pre-open cycle runs.
+WARMER_PREOPEN_LEAD = float(os.getenv("WARMER_PREOPEN_LEAD", "900"))
+# The hot set is mined from Mongo at most this often (seconds).
+WARMER_HOT_SET_TTL = float(os.getenv("WARMER_HOT_SET_TTL", "1800"))
+
+WARMER_USER = "market-warmer"
+# Only the worker holding this lock warms; the others stand by to take over.
+LEADER_KEY = "warmer:leader"
+
+# Quotes and price changes written while the market is closed expire at the open,
+# so warming them before the open buys nothing; they are picked up by the first
+# in-session cycle instead.
+PREOPEN_KINDS = ("daily_bars", "profile")
+SESSION_KINDS = ("quote", "daily_bars", "price_change", "profile")
+
+_SINGLE_LOADERS = {
+    "profile": _aload_company_profile,
+    "price_change": _aload_stock_price_change,
+}
+
+
+def _single_batch(kind: str):
+    """`market_cache.refresh` batch loader for a kind whose upstream call takes one symbol."""
+    policy = FRESHNESS_POLICIES[kind]
+    loader = _SINGLE_LOADERS[kind]
+
+    async def load(keys: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {market_cache.make_key(policy, key): await loader(key["symbol"]) for key in keys}
+    return load
+
+
+class MarketWarmer:
+    """
+    Background job that keeps the most asked-about symbols warm in the market cache.
+
+    The hot set is the most frequent symbols in recent `MessageLog.stock_chart`
+    entries and in recent `fmp_query_results` lookups. Per exchange, a pre-open
+    cycle refreshes daily bars and profiles shortly before the session opens, and
+    while it is open a cycle every `interval` seconds also refreshes quotes and
+    price changes, reloading whatever would expire before the next cycle.
+
+    Upstream calls go through the scheduler's background lane, so interactive
+    requests always go first, and each cycle stops once it has spent `budget`
+    FMP calls. `warm_ledger` counts the interactive reads each refresh turned
+    from a miss into a hit; see `stats()`.
+
+    Every worker runs the loop, but only the one holding the `warmer:leader`
+    lock in Redis mines the hot set and runs cycles, so the budget is spent
+    once per cycle, not once per worker. The lock outlives a full sleep plus a
+    cycle and is renewed each time the leader wakes. Without Redis every
+    worker warms on its own.
+    """
+
+    def __init__(self, budget: int = WARMER_BUDGET, hot_set_size: int = WARMER_HOT_SET_SIZE,
+                 interval: float = WARMER_INTERVAL, preopen_lead: float = WARMER_PREOPEN_LEAD):
+        self.budget = budget
+        self.hot_set_size = hot_set_size
+        self.interval = interval
+        self.preopen_lead = preopen_lead
+        self.runner = fmp_repository.runner
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.leader = False
+        self.hot_set: List[Tuple[str, str]] = []
+        self._hot_set_at = 0.0
+        self._last_session_cycle: Dict[str, float] = {}
+        self._preopen_done: Dict[str, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.cycles = 0
+        self.totals = Counter()
+        self.last_cycle: Optional[Dict[str, Any]] = None
+
+    # hot set
+
+    async def _chart_symbols(self, since: datetime) -> List[Dict[str, Any]]:
+        pipeline = [
+            {"$match": {"created_at": {"$gte": since}, "stock_chart.0": {"$exists": True}}},
+            {"$project": {"stock_chart.realtime.symbol": 1, "stock_chart.realtime.exchange": 1}},
+            {"$unwind": "$stock_chart"},
+            {"$group": {
+                "_id": {"$toUpper": "$stock_chart.realtime.symbol"},
+                "hits": {"$sum": 1},
+                "exchange": {"$last": "$stock_chart.realtime.exchange"},
+            }},
+            {"$match": {"_id": {"$nin": [None, ""]}}},
+            {"$sort": {"hits": -1}},
+            {"$limit": self.hot_set_size},
+        ]
+        return await MessageLog.aggregate(pipeline).to_list()
+
+    async def _query_symbols(self, since: datetime) -> List[Dict[str, Any]]:
+        docs = await self.runner.run_async(fmp_repository.find(
+            "fmp_query_results",
+            # timestamps here are naive local time (`datetime.now()`)
+            {"timestamp": {"$gte": since.astimezone().replace(tzinfo=None)}},
+            {"_id": 0, "results": {"$slice": 1}},
+        ))
+        hits: Counter = Counter()
+        exchanges: Dict[str, str] = {}
+        for doc in docs:
+            for match in doc.get("results") or []:
+                symbol = str(match.get("symbol") or "").upper()
+                if symbol:
+                    hits[symbol] += 1
+                    exchanges[symbol] = match.get("exchangeShortName") or match.get("exchange") or ""
+        return [{"_id": s, "hits": n, "exchange": exchanges[s]} for s, n in hits.items()]
+
+    async def refresh_hot_set(self) -> List[Tuple[str, str]]:
+        """Most requested (symbol, exchange) pairs over the lookback window, most popular first."""
+        since = datetime.now(timezone.utc) - WARMER_LOOKBACK
+        hits: Counter = Counter()
+        exchanges: Dict[str, str] = {}
+        for source in (self._chart_symbols, self._query_symbols):
+            try:
+                rows = await source(since)
+            except Exception as e:
+                logger.warning(f"Market warmer could not mine {source.__name__.strip('_')}: {e}")
+                continue
+            for row in rows:
+                hits[row["_id"]] += row["hits"]
+                exchanges.setdefault(row["_id"], row.get("exchange") or "")
+        self.hot_set = [(s, resolve_exchange(s, exchanges[s])) for s, _ in hits.most_common(self.hot_set_size)]
+        self._hot_set_at = time.time()
+        return self.hot_set
+
+    # warming
+
+    async def _warm(self, symbols: List[Tuple[str, str]], kinds: Tuple[str, ...], horizon: float) -> Dict[str, Any]:
+        """One cycle for `symbols` on the runner loop, within the upstream budget."""
+        bind(WARMER_USER, Lane.BACKGROUND)
+        spent_before = upstream_scheduler.granted("fmp", Lane.BACKGROUND)
+
+        def spent() -> int:
+            return upstream_scheduler.granted("fmp", Lane.BACKGROUND) - spent_before
+
+        report: Dict[str, Counter] = {kind: Counter() for kind in kinds}
+        if "quote" in kinds:
+            quote_policy = FRESHNESS_POLICIES["quote"]
+            keys = [{"symbol": s} for s, _ in symbols]
+            exchanges = {market_cache.make_key(quote_policy, {"symbol": s}): ex for s, ex in symbols}
+            report["quote"].update(await market_cache.refresh("quote", keys, _aload_quote_entries, exchanges, horizon))
+
+        skipped = 0
+        for i, (symbol, exchange) in enumerate(symbols):
+            if spent() >= self.budget:
+                skipped = len(symbols) - i
+                break
+            for kind in kinds:
+                if kind == "quote":
+                    continue
+                if kind == "daily_bars":
+                    try:
+                        warmed = await daily_bar_store.warm(symbol, exchange)
+                        report[kind]["warmed" if warmed else "fresh"] += 1
+                    except Exception as e:
+                        logger.debug(f"Market warmer could not refresh bars for {symbol}: {e}")
+                        report[kind]["failed"] += 1
+                    continue
+                key = {"symbol": symbol}
+                cache_key = market_cache.make_key(FRESHNESS_POLICIES[kind], key)
+                report[kind].update(await market_cache.refresh(
+                    kind, [key], _single_batch(kind), {cache_key: exchange}, horizon))
+
+        return {"kinds": {kind: dict(c) for kind, c in report.items()}, "upstream_calls": spent(), "skipped": skipped}
+
+    async def run_cycle(self, exchange: str, phase: str) -> Dict[str, Any]:
+        """Warm the hot-set symbols listed on `exchange`; `phase` is "preopen" or "session"."""
+        if not self.hot_set or time.time() - self._hot_set_at > WARMER_HOT_SET_TTL:
+            await self.refresh_hot_set()
+        symbols = [(s, ex) for s, ex in self.hot_set if ex == exchange]
+        kinds, horizon = (PREOPEN_KINDS, self.preopen_lead) if phase == "preopen" else (SESSION_KINDS, self.interval)
+        started = time.time()
+        result = await self.runner.run_async(self._warm(symbols, kinds, horizon)) if symbols else \
+            {"kinds": {}, "upstream_calls": 0, "skipped": 0}
+        result.update({
+            "exchange": exchange,
+            "phase": phase,
+            "symbols": len(symbols),
+            "at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round((time.time() - started) * 1000, 1),
+        })
+        self.cycles += 1
+        self.totals["upstream_calls"] += result["upstream_calls"]
+        self.totals["skipped"] += result["skipped"]
+        for counts in result["kinds"].values():
+            self.totals.update({k: v for k, v in counts.items() if k in ("warmed", "failed")})
+        self.last_cycle = result
+        return result
+
+    # leadership
+
+    @property
+    def _leader_ttl(self) -> int:
+        return int(max(self.interval, self.preopen_lead) * 2)
+
+    async def _redis_call(self, command: str, *args, **kwargs) -> Any:
+        if redis_manager.client is None:
+            return None
+        try:
+            return await getattr(redis_manager.client, command)(*args, **kwargs)
+        except Exception as e:
+            logger.warning(f"Market warmer Redis {command} failed: {e}")
+            return None
+
+    async def _elect(self) -> bool:
+        if redis_manager.client is None:
+            return True
+        if await self._redis_call("set", LEADER_KEY, self.worker_id, nx=True, ex=self._leader_ttl):
+            return True
+        if await self._redis_call("get", LEADER_KEY) == self.worker_id:
+            await self._redis_call("expire", LEADER_KEY, self._leader_ttl)
+            return True
+        return False
+
+    # scheduling
+
+    def _due(self, now: datetime) -> List[Tuple[str, str]]:
+        due = []
+        for exchange in sorted({ex for _, ex in self.hot_set}):
+            if is_market_open(exchange, now):
+                if now.timestamp() - self._last_session_cycle.get(exchange, 0.0) >= self.interval - 1:
+                    due.append((exchange, "session"))
+                continue
+            opens = next_open(exchange, now)
+            if now >= opens - timedelta(seconds=self.preopen_lead) and self._preopen_done.get(exchange) != opens:
+                due.append((exchange, "preopen"))
+        return due
+
+    def _sleep_for(self, now: datetime) -> float:
+        wake = now + timedelta(seconds=self.interval)
+        for exchange in {ex for _, ex in self.hot_set}:
+            if is_market_open(exchange, now):
+                continue
+            opens = next_open(exchange, now)
+            preopen = opens - timedelta(seconds=self.preopen_lead)
+            # +1s so the session cycle wakes inside the session, not on its edge
+            wake = min(wake, preopen if preopen > now else opens + timedelta(seconds=1))
+        return max(1.0, (wake - now).total_seconds())
+
+    async def _loop(self):
+        while True:
+            try:
+                self.leader = await self._elect()
+                if not self.leader:
+                    await asyncio.sleep(self.interval)
+                    continue
+                if not self.hot_set or time.time() - self._hot_set_at > WARMER_HOT_SET_TTL:
+                    await self.refresh_hot_set()
+                now = datetime.now(timezone.utc)
+                for exchange, phase in self._due(now):
+                    result = await self.run_cycle(exchange, phase)
+                    if phase == "session":
+                        self._last_session_cycle[exchange] = now.timestamp()
+                    else:
+                        self._preopen_done[exchange] = next_open(exchange, now)
+                    logger.info(f"Market warmer {phase} cycle for {exchange}: {result['symbols']} symbols, "
+                                f"{result['upstream_calls']} upstream calls, {result['skipped']} skipped")
+                await asyncio.sleep(self._sleep_for(datetime.now(timezone.utc)))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Market warmer cycle failed: {e}")
+                await asyncio.sleep(self.interval)
+
+    def start(self) -> Optional[asyncio.Task]:
+        """Start the background loop on the current (app) event loop. No-op if disabled."""
+        if WARMER_ENABLED and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.leader and await self._redis_call("get", LEADER_KEY) == self.worker_id:
+            await self._redis_call("delete", LEADER_KEY)
+        self.leader = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": WARMER_ENABLED,
+            "running": self._task is not None and not self._task.done(),
+            "worker": self.worker_id,
+            "leader": self.leader,
+            "budget": self.budget,
+            "interval": self.interval,
+            "hot_set": [s for s, _ in self.hot_set],
+            "cycles": self.cycles,
+            "totals": dict(self.totals),
+            "last_cycle": self.last_cycle,
+            "interactive": warm_ledger.stats(),
+        }
+
+
+market_warmer = MarketWarmer()
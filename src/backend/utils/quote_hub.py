@@ -0,0 +1,362 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from src.backend.db.fmp_repository import fmp_repository
+from src.backend.db.mongodb import _aload_quotes
+from src.backend.utils.api_utils import redis_manager
+from src.backend.utils.market_cache import market_cache
+from src.backend.utils.market_calendar import is_market_open, resolve_exchange
+from src.backend.utils.upstream_scheduler import Lane, bind
+
+logger = logging.getLogger("uvicorn")
+
+# Upstream poll cadence per symbol (seconds) while its market is open / closed.
+QUOTE_HUB_INTERVAL = float(os.getenv("QUOTE_HUB_INTERVAL", "5"))
+QUOTE_HUB_CLOSED_INTERVAL = float(os.getenv("QUOTE_HUB_CLOSED_INTERVAL", "300"))
+# Symbols per upstream batch-quote request.
+QUOTE_HUB_BATCH = int(os.getenv("QUOTE_HUB_BATCH", "50"))
+# Distinct symbols polled across all workers; subscriptions that would add more are refused.
+QUOTE_HUB_MAX_SYMBOLS = int(os.getenv("QUOTE_HUB_MAX_SYMBOLS", "500"))
+# Workers re-announce the symbols they serve this often; the poller forgets a
+# symbol nobody announced for INTEREST_TTL.
+HEARTBEAT = 5.0
+INTEREST_TTL = 3 * HEARTBEAT
+LEADER_TTL = 15
+
+LEADER_KEY = "quotes:leader"
+INTEREST_KEY = "quotes:interest"
+CHANNEL_PREFIX = "quotes:"
+LAST_PREFIX = "quotes:last:"
+
+
+def channel(symbol: str) -> str:
+    return f"{CHANNEL_PREFIX}{symbol}"
+
+
+class QuoteHubFull(Exception):
+    """Subscribing would push the polled symbol set past QUOTE_HUB_MAX_SYMBOLS."""
+
+
+class QuoteSubscription:
+    """
+    One client's view of the hub: the latest undelivered frame per symbol.
+
+    A client that reads slower than quotes arrive never builds a backlog; a newer
+    frame for a symbol replaces the undelivered one, which is counted as dropped.
+    """
+
+    def __init__(self, symbols: Iterable[str]):
+        self.symbols: Set[str] = {s.upper() for s in symbols}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._ready = asyncio.Event()
+        self.delivered = 0
+        self.dropped = 0
+
+    def offer(self, symbol: str, frame: Dict[str, Any]):
+        if symbol in self._pending:
+            self.dropped += 1
+        self._pending[symbol] = frame
+        self._ready.set()
+
+    async def get(self, timeout: float) -> List[Dict[str, Any]]:
+        """Frames waiting for this client, or [] after `timeout` seconds without any."""
+        if not self._pending:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        frames = list(self._pending.values())
+        self._pending.clear()
+        self._ready.clear()
+        self.delivered += len(frames)
+        return frames
+
+
+class QuoteHub:
+    """
+    Realtime quote fan-out with one upstream poll per symbol across all workers.
+
+    Clients subscribe to symbols on any worker. Each worker announces the
+    symbols it serves in a Redis sorted set and subscribes to their
+    `quotes:{SYMBOL}` pub/sub channels. The worker holding the `quotes:leader`
+    lock polls the announced symbols upstream in batch-quote requests, every
+    QUOTE_HUB_INTERVAL seconds while the symbol's market is open and every
+    QUOTE_HUB_CLOSED_INTERVAL otherwise. It publishes only the quotes that
+    changed and writes them through the market cache's memory and Redis tiers
+    (not Mongo), so /stock_data and the tools read the same values without
+    their own upstream call.
+
+    At most QUOTE_HUB_MAX_SYMBOLS distinct symbols are polled; a subscription
+    that would add more raises QuoteHubFull.
+
+    Without Redis the hub runs single-worker: it polls its own symbols and
+    delivers locally. Runs on the app event loop; upstream calls go through
+    the runner loop.
+    """
+
+    def __init__(self):
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._subscriptions: Set[QuoteSubscription] = set()
+        self._local: Counter = Counter()  # symbol -> local subscriber count
+        self._latest: Dict[str, Dict[str, Any]] = {}  # last frame per locally served symbol
+        self._published: Dict[str, Dict[str, Any]] = {}  # leader: last frame sent per symbol
+        self._next_poll: Dict[str, float] = {}
+        self._pubsub = None
+        self._channels: Set[str] = set()
+        self._wake = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self.leader = False
+        self.counters = Counter()
+
+    # redis helpers
+
+    @property
+    def _redis(self):
+        return redis_manager.client
+
+    async def _redis_call(self, command: str, *args, **kwargs) -> Any:
+        if self._redis is None:
+            return None
+        try:
+            return await getattr(self._redis, command)(*args, **kwargs)
+        except Exception as e:
+            self.counters["redis_errors"] += 1
+            logger.warning(f"Quote hub Redis {command} failed: {e}")
+            return None
+
+    # subscriptions
+
+    async def has_room(self, symbols: Iterable[str]) -> bool:
+        """Whether subscribing to `symbols` stays within QUOTE_HUB_MAX_SYMBOLS."""
+        symbols = [s for s in {s.upper() for s in symbols} if self._local[s] == 0]
+        if not symbols:
+            return True
+        if self._redis is None:
+            return len(self._local) + len(symbols) <= QUOTE_HUB_MAX_SYMBOLS
+        await self._redis_call("zremrangebyscore", INTEREST_KEY, "-inf", time.time() - INTEREST_TTL)
+        known = await self._redis_call("zmscore", INTEREST_KEY, symbols) or [None] * len(symbols)
+        added = sum(1 for score in known if score is None)
+        return added == 0 or (await self._redis_call("zcard", INTEREST_KEY) or 0) + added <= QUOTE_HUB_MAX_SYMBOLS
+
+    async def subscribe(self, symbols: Iterable[str]) -> QuoteSubscription:
+        """Raises QuoteHubFull if the new symbols would exceed QUOTE_HUB_MAX_SYMBOLS."""
+        sub = QuoteSubscription(symbols)
+        new = [s for s in sub.symbols if self._local[s] == 0]
+        if new and not await self.has_room(new):
+            self.counters["refused_subscriptions"] += 1
+            raise QuoteHubFull(f"Quote stream is at its {QUOTE_HUB_MAX_SYMBOLS} symbol limit.")
+        self._subscriptions.add(sub)
+        for symbol in sub.symbols:
+            self._local[symbol] += 1
+        if new:
+            await self._sync_channels()
+            self._wake.set()
+        for symbol, frame in (await self.snapshot(sub.symbols)).items():
+            sub.offer(symbol, frame)
+        return sub
+
+    async def unsubscribe(self, sub: QuoteSubscription):
+        if sub not in self._subscriptions:
+            return
+        self._subscriptions.discard(sub)
+        self.counters["dropped_frames"] += sub.dropped
+        for symbol in sub.symbols:
+            self._local[symbol] -= 1
+            if self._local[symbol] <= 0:
+                del self._local[symbol]
+                self._latest.pop(symbol, None)
+        await self._sync_channels()
+
+    async def snapshot(self, symbols: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Last known quote per symbol, from this worker or from Redis."""
+        symbols = list(symbols)
+        frames = {s: self._latest[s] for s in symbols if s in self._latest}
+        missing = [s for s in symbols if s not in frames]
+        if missing:
+            raw = await self._redis_call("mget", [LAST_PREFIX + s for s in missing]) or []
+            for symbol, value in zip(missing, raw):
+                if value:
+                    frames[symbol] = json.loads(value)
+        return frames
+
+    def _dispatch(self, symbol: str, frame: Dict[str, Any]):
+        if symbol not in self._local:
+            return
+        self._latest[symbol] = frame
+        for sub in self._subscriptions:
+            if symbol in sub.symbols:
+                sub.offer(symbol, frame)
+
+    # pub/sub
+
+    async def _sync_channels(self):
+        if self._pubsub is None:
+            return
+        wanted = {channel(s) for s in self._local}
+        try:
+            if wanted - self._channels:
+                await self._pubsub.subscribe(*(wanted - self._channels))
+            if self._channels - wanted:
+                await self._pubsub.unsubscribe(*(self._channels - wanted))
+            self._channels = wanted
+        except Exception as e:
+            self.counters["redis_errors"] += 1
+            logger.warning(f"Quote hub could not update channel subscriptions: {e}")
+
+    async def _listen(self):
+        while True:
+            if self._pubsub is None or not self._channels:
+                await asyncio.sleep(0.5)
+                continue
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except Exception as e:
+                self.counters["redis_errors"] += 1
+                logger.warning(f"Quote hub pub/sub read failed: {e}")
+                await asyncio.sleep(1.0)
+                continue
+            if not message or message.get("type") != "message":
+                continue
+            symbol = str(message["channel"])[len(CHANNEL_PREFIX):]
+            self._dispatch(symbol, json.loads(message["data"]))
+
+    # polling (leader only)
+
+    async def _announce(self):
+        if self._local:
+            now = time.time()
+            await self._redis_call("zadd", INTEREST_KEY, {s: now for s in self._local})
+
+    async def _elect(self) -> bool:
+        if self._redis is None:
+            return True
+        if await self._redis_call("set", LEADER_KEY, self.worker_id, nx=True, ex=LEADER_TTL):
+            return True
+        if await self._redis_call("get", LEADER_KEY) == self.worker_id:
+            await self._redis_call("expire", LEADER_KEY, LEADER_TTL)
+            return True
+        return False
+
+    async def _interest(self) -> List[str]:
+        if self._redis is None:
+            return list(self._local)
+        cutoff = time.time() - INTEREST_TTL
+        await self._redis_call("zremrangebyscore", INTEREST_KEY, "-inf", cutoff)
+        # the cap is checked before announcing, but concurrent subscribes can race past it
+        return list(await self._redis_call("zrevrange", INTEREST_KEY, 0, QUOTE_HUB_MAX_SYMBOLS - 1) or [])
+
+    @staticmethod
+    async def _fetch(symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Batch quotes on the runner loop, written through the market cache's L1/L2."""
+        bind("quote-hub", Lane.INTERACTIVE)
+        quotes = await _aload_quotes(symbols)
+        for symbol, quote in quotes.items():
+            await market_cache.put("quote", {"symbol": symbol}, quote, persist=False)
+        return quotes
+
+    async def _poll(self, symbols: List[str]):
+        now = time.time()
+        for symbol in list(self._next_poll):
+            if symbol not in symbols:
+                del self._next_poll[symbol]
+                self._published.pop(symbol, None)
+        due = [s for s in symbols if self._next_poll.get(s, 0.0) <= now]
+        for i in range(0, len(due), QUOTE_HUB_BATCH):
+            batch = due[i:i + QUOTE_HUB_BATCH]
+            for symbol in batch:
+                open_now = is_market_open(resolve_exchange(symbol))
+                self._next_poll[symbol] = now + (QUOTE_HUB_INTERVAL if open_now else QUOTE_HUB_CLOSED_INTERVAL)
+            try:
+                quotes = await fmp_repository.runner.run_async(self._fetch(batch))
+            except Exception as e:
+                self.counters["upstream_errors"] += 1
+                logger.warning(f"Quote hub poll failed for {len(batch)} symbols: {e}")
+                continue
+            self.counters["upstream_batches"] += 1
+            self.counters["symbols_polled"] += len(batch)
+            for symbol, quote in quotes.items():
+                await self._publish(symbol, quote)
+
+    async def _publish(self, symbol: str, quote: Dict[str, Any]):
+        previous = self._published.get(symbol)
+        if previous is not None and all(previous.get(k) == quote.get(k) for k in ("price", "volume", "timestamp")):
+            return
+        self._published[symbol] = quote
+        self.counters["frames_published"] += 1
+        if self._redis is None:
+            self._dispatch(symbol, quote)
+            return
+        payload = json.dumps(quote, default=str)
+        await self._redis_call("set", LAST_PREFIX + symbol, payload, ex=int(QUOTE_HUB_CLOSED_INTERVAL * 2))
+        await self._redis_call("publish", channel(symbol), payload)
+
+    def _sleep_for(self) -> float:
+        if not self.leader or not self._next_poll:
+            return HEARTBEAT
+        return min(max(min(self._next_poll.values()) - time.time(), 0.5), HEARTBEAT)
+
+    async def _run(self):
+        while True:
+            try:
+                await self._announce()
+                self.leader = await self._elect()
+                if self.leader:
+                    await self._poll(await self._interest())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Quote hub cycle failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), self._sleep_for())
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    # lifecycle
+
+    def start(self):
+        """Start the hub on the app event loop; call after `redis_manager.connect()`."""
+        if self._tasks:
+            return
+        if self._redis is not None:
+            self._pubsub = self._redis.pubsub()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._run()), loop.create_task(self._listen())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self.leader:
+            if await self._redis_call("get", LEADER_KEY) == self.worker_id:
+                await self._redis_call("delete", LEADER_KEY)
+        if self._pubsub is not None:
+            try:
+                await (getattr(self._pubsub, "aclose", None) or self._pubsub.close)()
+            except Exception:
+                pass
+            self._pubsub = None
+            self._channels = set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "worker": self.worker_id,
+            "leader": self.leader,
+            "redis": self._redis is not None,
+            "subscribers": len(self._subscriptions),
+            "symbols": dict(self._local),
+            "polling": len(self._next_poll),
+            "dropped_frames": self.counters["dropped_frames"] + sum(s.dropped for s in self._subscriptions),
+            **{k: v for k, v in self.counters.items() if k != "dropped_frames"},
+        }
+
+
+quote_hub = QuoteHub()
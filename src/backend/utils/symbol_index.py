@@ -0,0 +1,265 @@
+import asyncio
+import bisect
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src.backend.utils.fmp_client import fmp_client
+from src.backend.utils.market_calendar import SUFFIX_TO_EXCHANGE
+
+logger = logging.getLogger("uvicorn")
+
+FMP_STOCK_LIST_PATH = "/stable/stock-list"
+# Optional JSON snapshot: loaded on first use and rewritten after each refresh, so
+# resolution works offline (tests, restarts) without waiting for FMP.
+SYMBOL_INDEX_FILE = os.getenv("SYMBOL_INDEX_FILE")
+REFRESH_INTERVAL = 24 * 3600
+MIN_FUZZY_SCORE = 0.6
+
+_LEGAL_SUFFIXES = {
+    "inc", "incorporated", "corp", "corporation", "co", "company", "ltd", "limited", "plc",
+    "llc", "sa", "ag", "nv", "se", "pjsc", "psc", "pvt", "the",
+}
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_name(text: str) -> str:
+    """Lower-case, '&' -> 'and', punctuation and legal suffixes (Inc, Ltd, PJSC, ...) removed."""
+    words = _NON_WORD.sub(" ", (text or "").lower().replace("&", " and ")).split()
+    kept = [w for w in words if w not in _LEGAL_SUFFIXES]
+    return " ".join(kept or words)
+
+
+def _trigrams(text: str) -> Iterable[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _entry(row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    symbol = str(row.get("symbol") or "").strip().upper()
+    if not symbol:
+        return None
+    exchange = row.get("exchangeShortName") or row.get("exchange")
+    if not exchange:
+        exchange = next((ex for suffix, ex in SUFFIX_TO_EXCHANGE.items() if symbol.endswith(suffix)), None)
+    return {
+        "symbol": symbol,
+        "name": row.get("name") or row.get("companyName") or "",
+        "exchange": exchange,
+        "currency": row.get("currency"),
+        "type": row.get("type"),
+    }
+
+
+class _Snapshot:
+    """Immutable lookup structures for one symbol universe; replaced wholesale on refresh."""
+
+    def __init__(self, rows: Iterable[Dict[str, Any]], loaded_at: float):
+        self.loaded_at = loaded_at
+        self.entries: List[Dict[str, Any]] = []
+        self.by_symbol: Dict[str, int] = {}
+        self.by_name: Dict[str, List[int]] = defaultdict(list)
+        self.names: List[str] = []
+        grams: Dict[str, List[int]] = defaultdict(list)
+
+        for row in rows:
+            entry = _entry(row) if isinstance(row, dict) else None
+            if entry is None or entry["symbol"] in self.by_symbol:
+                continue
+            idx = len(self.entries)
+            self.entries.append(entry)
+            self.by_symbol[entry["symbol"]] = idx
+            name = normalize_name(entry["name"])
+            self.names.append(name)
+            if name:
+                self.by_name[name].append(idx)
+                for g in _trigrams(name):
+                    grams[g].append(idx)
+
+        # (key, idx) sorted for bisect prefix scans over both symbols and names
+        self.prefix_keys: List[Tuple[str, int]] = sorted(
+            [(s.lower(), i) for s, i in self.by_symbol.items()]
+            + [(n, i) for i, n in enumerate(self.names) if n]
+        )
+        self.grams = dict(grams)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class SymbolIndex:
+    """
+    In-memory symbol universe with exact, prefix and typo-tolerant lookups.
+
+    Lookups never touch the network: they read the current snapshot, loaded from
+    `SYMBOL_INDEX_FILE` on first use and refreshed from FMP's stock list in the
+    background on the shared runner loop once it is older than
+    `REFRESH_INTERVAL`. While no snapshot is available `search` returns an empty
+    list and callers fall back to the live FMP search.
+    """
+
+    def __init__(self, path: Optional[str] = SYMBOL_INDEX_FILE, refresh_interval: float = REFRESH_INTERVAL):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self._snapshot: Optional[_Snapshot] = None
+        self._lock = threading.Lock()
+        self._file_checked = False
+        self._refreshing = False
+
+    # loading
+
+    def load_rows(self, rows: Iterable[Dict[str, Any]], loaded_at: Optional[float] = None) -> int:
+        snapshot = _Snapshot(rows, loaded_at or time.time())
+        self._snapshot = snapshot
+        return len(snapshot)
+
+    def load_file(self, path: Optional[str] = None) -> int:
+        path = path or self.path
+        with open(path, "r", encoding="utf-8") as fh:
+            payload = json.load(fh)
+        rows = payload.get("symbols", []) if isinstance(payload, dict) else payload
+        loaded_at = payload.get("loaded_at") if isinstance(payload, dict) else None
+        return self.load_rows(rows, loaded_at or os.path.getmtime(path))
+
+    def save_file(self, path: Optional[str] = None):
+        snapshot = self._snapshot
+        path = path or self.path
+        if snapshot is None or not path:
+            return
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"loaded_at": snapshot.loaded_at, "symbols": snapshot.entries}, fh)
+        os.replace(tmp, path)
+
+    async def refresh(self) -> int:
+        """Download the FMP stock list and swap in a new snapshot. Must run on the runner loop."""
+        try:
+            rows = await fmp_client.fetch_json(FMP_STOCK_LIST_PATH)
+            if not isinstance(rows, list) or not rows:
+                raise ValueError(f"Unexpected stock list payload: {type(rows).__name__}")
+            # Building the trigram/prefix tables for the full list takes seconds of
+            # CPU; do it off the shared loop and only swap the reference here.
+            snapshot = await asyncio.to_thread(_Snapshot, rows, time.time())
+            self._snapshot = snapshot
+            count = len(snapshot)
+            if self.path:
+                try:
+                    await asyncio.to_thread(self.save_file)
+                except OSError as e:
+                    logger.warning(f"Could not write symbol index snapshot {self.path}: {e}")
+            logger.info(f"Symbol index refreshed with {count} symbols")
+            return count
+        finally:
+            self._refreshing = False
+
+    def _ensure_fresh(self):
+        if not self._file_checked:
+            with self._lock:
+                if not self._file_checked:
+                    self._file_checked = True
+                    if self.path and os.path.exists(self.path):
+                        try:
+                            self.load_file()
+                        except (OSError, ValueError) as e:
+                            logger.warning(f"Could not load symbol index snapshot {self.path}: {e}")
+        snapshot = self._snapshot
+        if snapshot is not None and time.time() - snapshot.loaded_at < self.refresh_interval:
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        future = fmp_client.runner.run_coroutine(self.refresh())
+        future.add_done_callback(self._log_refresh_error)
+
+    @staticmethod
+    def _log_refresh_error(future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning(f"Symbol index refresh failed: {future.exception()}")
+
+    # lookups
+
+    def __len__(self):
+        return len(self._snapshot) if self._snapshot else 0
+
+    def get(self, symbol: str) -> Optional[Dict[str, Any]]:
+        self._ensure_fresh()
+        snapshot = self._snapshot
+        if snapshot is None or not symbol:
+            return None
+        idx = snapshot.by_symbol.get(symbol.strip().upper())
+        return dict(snapshot.entries[idx]) if idx is not None else None
+
+    def search(self, query: str, limit: int = 10, exchange: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Ranked matches for a ticker or company name: exact symbol, exact name,
+        prefix, then fuzzy (trigram candidates scored by similarity, only when
+        nothing matched exactly). Entries on `exchange` are ranked first within
+        each tier. Each result carries "match" and "score" keys.
+        """
+        self._ensure_fresh()
+        snapshot = self._snapshot
+        if snapshot is None or not query or not query.strip():
+            return []
+
+        found: Dict[int, Tuple[int, float, str]] = {}
+
+        def add(idx: int, tier: int, score: float, kind: str):
+            if idx not in found or found[idx][:2] > (tier, -score):
+                found[idx] = (tier, -score, kind)
+
+        raw = query.strip()
+        idx = snapshot.by_symbol.get(raw.upper())
+        if idx is not None:
+            add(idx, 0, 1.0, "exact_symbol")
+        name = normalize_name(raw)
+        for idx in snapshot.by_name.get(name, ()):
+            add(idx, 1, 1.0, "exact_name")
+
+        for key in {raw.lower(), name}:
+            if not key:
+                continue
+            pos = bisect.bisect_left(snapshot.prefix_keys, (key, -1))
+            while pos < len(snapshot.prefix_keys) and len(found) < limit * 4:
+                candidate, idx = snapshot.prefix_keys[pos]
+                if not candidate.startswith(key):
+                    break
+                add(idx, 2, len(key) / len(candidate), "prefix")
+                pos += 1
+
+        exact = any(tier < 2 for tier, _, _ in found.values())
+        if len(found) < limit and name and not exact:
+            self._fuzzy(snapshot, name, limit, add)
+
+        ranked = sorted(
+            found.items(),
+            key=lambda item: (item[1][0], exchange is not None and snapshot.entries[item[0]]["exchange"] != exchange,
+                              item[1][1], len(snapshot.entries[item[0]]["name"])),
+        )
+        return [{**snapshot.entries[idx], "match": kind, "score": round(-neg, 3)}
+                for idx, (_, neg, kind) in ranked[:limit]]
+
+    @staticmethod
+    def _fuzzy(snapshot: _Snapshot, name: str, limit: int, add):
+        counts: Counter = Counter()
+        for g in _trigrams(name):
+            for idx in snapshot.grams.get(g, ()):
+                counts[idx] += 1
+        for idx, _ in counts.most_common(limit * 10):
+            score = SequenceMatcher(None, name, snapshot.names[idx]).ratio()
+            if score >= MIN_FUZZY_SCORE:
+                add(idx, 3, score, "fuzzy")
+
+    def resolve(self, query: str, exchange: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Best single match for `query`, or None."""
+        matches = self.search(query, limit=1, exchange=exchange)
+        return matches[0] if matches else None
+
+
+symbol_index = SymbolIndex()
@@ -0,0 +1,237 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar, Token
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from src.backend.utils.async_runner import get_shared_runner
+
+logger = logging.getLogger("uvicorn")
+
+
+class Lane(IntEnum):
+    """Priority lanes; a lower value is always served first."""
+    INTERACTIVE = 0
+    EXPORT = 1
+    BACKGROUND = 2
+
+
+@dataclass(frozen=True)
+class ProviderLimit:
+    rate: float  # sustained requests per second
+    burst: int   # bucket size
+
+
+def _limit(provider: str, rate: float, burst: int) -> ProviderLimit:
+    prefix = f"UPSTREAM_{provider.upper()}"
+    return ProviderLimit(float(os.getenv(f"{prefix}_RATE", rate)), int(os.getenv(f"{prefix}_BURST", burst)))
+
+
+# Defaults sit below the plans we run on; override per deployment with
+# UPSTREAM_<PROVIDER>_RATE / UPSTREAM_<PROVIDER>_BURST.
+PROVIDER_LIMITS: Dict[str, ProviderLimit] = {
+    "fmp": _limit("fmp", 10.0, 20),
+    "tavily": _limit("tavily", 2.0, 5),
+    "geocoding": _limit("geocoding", 10.0, 10),
+    "llm": _limit("llm", 5.0, 10),
+}
+
+ANONYMOUS = "anonymous"
+_request: ContextVar[Tuple[Lane, str]] = ContextVar("upstream_request", default=(Lane.INTERACTIVE, ANONYMOUS))
+
+
+def bind(user_id: Optional[str], lane: Lane = Lane.INTERACTIVE) -> Token:
+    """Tag upstream calls made from the current context with a lane and user."""
+    return _request.set((lane, user_id or ANONYMOUS))
+
+
+def unbind(token: Token):
+    _request.reset(token)
+
+
+def current() -> Tuple[Lane, str]:
+    return _request.get()
+
+
+class _TokenBucket:
+    def __init__(self, limit: ProviderLimit):
+        self.rate = limit.rate
+        self.burst = limit.burst
+        self.tokens = float(limit.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        """Seconds until a token can be taken (0 if one is available now)."""
+        now = time.monotonic()
+        self._refill(now)
+        if now < self.paused_until:
+            return self.paused_until - now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def pause(self, seconds: float):
+        now = time.monotonic()
+        self.paused_until = max(self.paused_until, now + seconds)
+        self.tokens = 0.0
+        self.updated = now
+
+
+class _ProviderQueue:
+    """Waiters for one provider: one round-robin ring of per-user FIFOs per lane."""
+
+    def __init__(self, limit: ProviderLimit):
+        self.bucket = _TokenBucket(limit)
+        self.lanes: List["OrderedDict[str, Deque[Tuple[asyncio.Future, float]]]"] = [OrderedDict() for _ in Lane]
+        self.depth = [0] * len(Lane)
+        self.dispatcher: Optional[asyncio.Task] = None
+        # metrics
+        self.granted = [0] * len(Lane)
+        self.waits: Deque[float] = deque(maxlen=1024)
+        self.max_wait = 0.0
+        self.throttled = 0
+
+    def waiting(self) -> int:
+        return sum(self.depth)
+
+    def push(self, lane: Lane, user: str, future: asyncio.Future):
+        self.lanes[lane].setdefault(user, deque()).append((future, time.monotonic()))
+        self.depth[lane] += 1
+
+    def pop(self) -> Optional[Tuple[Lane, asyncio.Future, float]]:
+        for lane, users in zip(Lane, self.lanes):
+            while users:
+                user, queue = next(iter(users.items()))
+                future, enqueued = queue.popleft()
+                self.depth[lane] -= 1
+                # rotate: this user goes to the back of the ring if it still waits
+                users.pop(user)
+                if queue:
+                    users[user] = queue
+                if not future.done():
+                    return lane, future, enqueued
+        return None
+
+    def record(self, lane: Lane, waited: float):
+        self.granted[lane] += 1
+        self.waits.append(waited)
+        self.max_wait = max(self.max_wait, waited)
+
+
+class UpstreamScheduler:
+    """
+    Per-provider token buckets in front of FMP, Tavily, Google Geocoding and the LLMs.
+
+    `acquire` returns when the caller may send one request. Callers that find the
+    bucket empty queue up by lane (interactive before export before background)
+    and, within a lane, round-robin across users, so one user's fan-out cannot
+    starve another's query. A 429 from a provider pauses its whole bucket for the
+    advertised Retry-After instead of letting every caller retry on its own.
+
+    Queues and buckets live on the shared runner loop; sync tool threads use
+    `acquire_sync` and coroutines on other loops `aacquire`. Lane and user come
+    from `bind()` in the calling context unless passed explicitly.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, ProviderLimit]] = None):
+        self.limits = dict(limits or PROVIDER_LIMITS)
+        self.runner = get_shared_runner()
+        self._queues: Dict[str, _ProviderQueue] = {}
+
+    def _queue(self, provider: str) -> _ProviderQueue:
+        q = self._queues.get(provider)
+        if q is None:
+            limit = self.limits.get(provider) or ProviderLimit(5.0, 5)
+            q = self._queues[provider] = _ProviderQueue(limit)
+        return q
+
+    async def acquire(self, provider: str, lane: Optional[Lane] = None, user: Optional[str] = None):
+        """Wait for a request slot on `provider`. Must run on the runner loop."""
+        bound_lane, bound_user = current()
+        lane = bound_lane if lane is None else lane
+        user = user or bound_user
+        q = self._queue(provider)
+        if not q.waiting() and q.bucket.delay() == 0.0:
+            q.bucket.take()
+            q.record(lane, 0.0)
+            return
+        future = asyncio.get_running_loop().create_future()
+        q.push(lane, user, future)
+        if q.dispatcher is None or q.dispatcher.done():
+            q.dispatcher = asyncio.get_running_loop().create_task(self._dispatch(q))
+        await future
+
+    async def _dispatch(self, q: _ProviderQueue):
+        while q.waiting():
+            delay = q.bucket.delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            item = q.pop()
+            if item is None:
+                break
+            lane, future, enqueued = item
+            q.bucket.take()
+            q.record(lane, time.monotonic() - enqueued)
+            future.set_result(None)
+
+    def acquire_sync(self, provider: str, lane: Optional[Lane] = None, user: Optional[str] = None):
+        """Blocking `acquire` for tool threads."""
+        self.runner.run_sync(self.acquire(provider, lane, user))
+
+    async def aacquire(self, provider: str, lane: Optional[Lane] = None, user: Optional[str] = None):
+        """`acquire` from a coroutine on any event loop."""
+        await self.runner.run_async(self.acquire(provider, lane, user))
+
+    def throttled(self, provider: str, retry_after: Optional[float] = None):
+        """Provider answered 429: hold every caller back for `retry_after` seconds. Runner loop only."""
+        q = self._queue(provider)
+        q.throttled += 1
+        seconds = retry_after if retry_after and retry_after > 0 else 1.0
+        q.bucket.pause(seconds)
+        logger.warning(f"Upstream {provider} throttled; pausing its queue for {seconds:.1f}s")
+
+    def granted(self, provider: str, lane: Lane) -> int:
+        """Requests let through so far for `provider` on `lane`."""
+        q = self._queues.get(provider)
+        return q.granted[lane] if q else 0
+
+    def stats(self) -> Dict[str, Any]:
+        out = {}
+        for provider, q in self._queues.items():
+            waits = sorted(q.waits)
+            out[provider] = {
+                "rate": q.bucket.rate,
+                "burst": q.bucket.burst,
+                "queue_depth": {lane.name.lower(): q.depth[lane] for lane in Lane},
+                "granted": {lane.name.lower(): q.granted[lane] for lane in Lane},
+                "throttled": q.throttled,
+                "wait_ms": {
+                    "p50": round(waits[len(waits) // 2] * 1000, 1) if waits else 0.0,
+                    "p95": round(waits[int(len(waits) * 0.95)] * 1000, 1) if waits else 0.0,
+                    "max": round(q.max_wait * 1000, 1),
+                },
+            }
+        return out
+
+
+def retry_after_seconds(headers: Any) -> Optional[float]:
+    """Retry-After header in seconds (the HTTP-date form is not used by our providers)."""
+    value = headers.get("retry-after") if headers is not None else None
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+upstream_scheduler = UpstreamScheduler()
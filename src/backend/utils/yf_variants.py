@@ -0,0 +1,135 @@
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.backend.db.fmp_repository import fmp_repository
+from src.backend.utils.market_cache import LRUTTLCache
+
+logger = logging.getLogger("uvicorn")
+
+VARIANTS_COLLECTION = "yf_symbol_variants"
+# Size of the dedicated probe pool. It is separate from the tool executor because
+# the probing callers already run on that executor.
+YF_PROBE_WORKERS = int(os.getenv("YF_PROBE_WORKERS", "8"))
+# A variant that answered with nothing is skipped for this long.
+NEGATIVE_TTL = float(os.getenv("YF_NEGATIVE_TTL", str(6 * 3600)))
+
+
+class YFVariantResolver:
+    """
+    Picks the yfinance symbol variant (RELIANCE.NS, RELIANCE.BO, RELIANCE, ...) for a ticker.
+
+    Candidates are probed concurrently on a bounded pool and the first valid answer
+    wins; probes that have not started yet are cancelled (yfinance calls already in
+    flight cannot be interrupted and finish in the background). The winning variant
+    is remembered per (ticker, exchange) in memory and in the `yf_symbol_variants`
+    collection, so later requests call it directly. Variants that returned nothing
+    go into a TTL'd negative cache and are left out of later probes.
+    """
+
+    def __init__(self, max_workers: int = YF_PROBE_WORKERS, negative_ttl: float = NEGATIVE_TTL):
+        self.max_workers = max_workers
+        self.negative_ttl = negative_ttl
+        self._known: Dict[Tuple[str, str], Optional[str]] = {}
+        self._dead = LRUTTLCache(maxsize=8192)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix="yf-probe")
+        return self._executor
+
+    @staticmethod
+    def _key(ticker: str, exchange: Optional[str]) -> Tuple[str, str]:
+        return ticker.upper(), (exchange or "").upper()
+
+    # persistent positive mapping
+
+    def known_variant(self, ticker: str, exchange: Optional[str]) -> Optional[str]:
+        key = self._key(ticker, exchange)
+        if key not in self._known:
+            try:
+                doc = fmp_repository.run(fmp_repository.find_one(
+                    VARIANTS_COLLECTION, {"ticker": key[0], "exchange": key[1]}))
+            except Exception as e:
+                logger.warning(f"Could not read yfinance variant for {key}: {e}")
+                return None
+            self._known[key] = doc.get("symbol") if doc else None
+        return self._known[key]
+
+    def remember(self, ticker: str, exchange: Optional[str], symbol: str):
+        key = self._key(ticker, exchange)
+        if self._known.get(key) == symbol:
+            return
+        self._known[key] = symbol
+        try:
+            fmp_repository.run(fmp_repository.upsert(
+                VARIANTS_COLLECTION,
+                {"ticker": key[0], "exchange": key[1]},
+                {"symbol": symbol, "updated_at": datetime.now(timezone.utc)},
+            ))
+        except Exception as e:
+            logger.warning(f"Could not store yfinance variant for {key}: {e}")
+
+    # negative cache
+
+    def is_dead(self, symbol: str) -> bool:
+        return self._dead.get(symbol.upper()) is not None
+
+    def mark_dead(self, symbol: str):
+        self._dead.set(symbol.upper(), True, time.time() + self.negative_ttl)
+
+    # probing
+
+    def probe(self, ticker: str, exchange: Optional[str], candidates: List[str],
+              fetch: Callable[[str], Any], is_valid: Callable[[Any], bool]) -> Tuple[Optional[str], Any]:
+        """
+        (variant, result) for the first candidate whose `fetch` result passes
+        `is_valid`, or (None, None). The remembered variant is tried alone first.
+        """
+        known = self.known_variant(ticker, exchange)
+        if known:
+            result = self._attempt(known, fetch, is_valid)
+            if result is not None:
+                return known, result
+        pending = [c for c in candidates if c != known and not self.is_dead(c)]
+        if not pending:
+            return None, None
+
+        futures = {self.executor.submit(self._attempt, c, fetch, is_valid): c for c in pending}
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                result = future.result()
+                if result is not None:
+                    variant = futures[future]
+                    self.remember(ticker, exchange, variant)
+                    return variant, result
+        finally:
+            for future in futures:
+                future.cancel()
+        return None, None
+
+    def _attempt(self, symbol: str, fetch: Callable[[str], Any], is_valid: Callable[[Any], bool]) -> Any:
+        """Result of `fetch(symbol)` if valid; None otherwise. Only an empty answer marks the variant dead."""
+        try:
+            result = fetch(symbol)
+        except Exception as e:
+            logger.debug(f"yfinance probe failed for {symbol}: {e}")
+            return None
+        if is_valid(result):
+            return result
+        self.mark_dead(symbol)
+        return None
+
+
+yf_variants = YFVariantResolver()
@@ -19,6 +19,24 @@ import StockChart2 from './StockChart2';
 import { ArrowRight } from 'lucide-react';
 import { axiosInstance } from '@/services/axiosInstance';
 import useWindowDimension from '@/hooks/useWindowDimension';
+
+const BASE_URL = process.env.NEXT_PUBLIC_BASE_URL || '';
+
+// Quote fields the backend stream refreshes; everything else stays as first loaded.
+const STREAMED_QUOTE_FIELDS = [
+  'price',
+  'change',
+  'changesPercentage',
+  'dayLow',
+  'dayHigh',
+  'open',
+  'previousClose',
+  'volume',
+  'marketCap',
+  'timestamp',
+] as const;
+const QUOTE_STREAM_RETRY_MS = 15000;
+
 export interface RealTimeData {
   symbol: string | null;
   currency: string | null;
@@ -206,6 +224,94 @@ const FinanceChart: React.FC<FinanceChartProps> = ({
     setIsDelisted(chart_data?.[0]?.historical?.is_active === false);
   }, [chart_data]);
 
+  const streamedSymbols = Array.isArray(chart_data)
+    ? Array.from(
+        new Set(
+          chart_data
+            .map((item) => item?.realtime?.symbol?.toUpperCase())
+            .filter((symbol): symbol is string => !!symbol)
+        )
+      ).join(',')
+    : '';
+
+  // Keep the realtime header current from the backend quote stream.
+  useEffect(() => {
+    if (!streamedSymbols || isDelisted || typeof EventSource === 'undefined') {
+      return;
+    }
+
+    let source: EventSource | null = null;
+    let retryTimer: ReturnType<typeof setTimeout> | null = null;
+    let closed = false;
+
+    const handleQuote = (event: Event) => {
+      let quote: Partial<RealTimeData>;
+      try {
+        quote = JSON.parse((event as MessageEvent).data);
+      } catch {
+        return;
+      }
+      const symbol = quote?.symbol?.toUpperCase();
+      if (!symbol) return;
+
+      const updates: Partial<RealTimeData> = {};
+      STREAMED_QUOTE_FIELDS.forEach((field) => {
+        if (quote[field] !== undefined && quote[field] !== null) {
+          (updates as any)[field] = quote[field];
+        }
+      });
+      setData((prevData) =>
+        prevData.map((item) =>
+          item.realtime?.symbol?.toUpperCase() === symbol
+            ? { ...item, realtime: { ...item.realtime, ...updates } }
+            : item
+        )
+      );
+    };
+
+    // Stream tokens expire within a minute, so every (re)connect asks for a new one
+    // instead of letting EventSource retry with the old URL.
+    const connect = async () => {
+      try {
+        const response = await axiosInstance.post('/quotes/stream-token');
+        if (closed) return;
+        source = new EventSource(
+          `${BASE_URL}/quotes/stream?symbols=${encodeURIComponent(
+            streamedSymbols
+          )}&token=${encodeURIComponent(response.data.token)}`
+        );
+        source.addEventListener('quote', handleQuote);
+        source.onerror = () => {
+          source?.close();
+          source = null;
+          scheduleReconnect();
+        };
+      } catch {
+        scheduleReconnect();
+      }
+    };
+
+    const scheduleReconnect = () => {
+      if (closed || retryTimer) return;
+      retryTimer = setTimeout(() => {
+        retryTimer = null;
+        connect();
+      }, QUOTE_STREAM_RETRY_MS);
+    };
+
+    connect();
+
+    return () => {
+      closed = true;
+      if (retryTimer) clearTimeout(retryTimer);
+      source?.close();
+    };
+  }, [streamedSymbols, isDelisted]);
+
+  const dataSymbols = Array.isArray(data)
+    ? data.map((item) => item?.realtime?.symbol ?? '').join(',')
+    : '';
+
   useEffect(() => {
     if (!Array.isArray(data) || data.length === 0 || !data[0]?.realtime?.symbol) {
       return;
@@ -224,7 +330,9 @@ const FinanceChart: React.FC<FinanceChartProps> = ({
         activePeriod: '1M', // Default to historical for all symbols
       }));
     });
-  }, [data]);
+    // Streamed quote updates change `data` but not its symbols; keep the selected tabs.
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [dataSymbols]);
 
   const handlePeriodChange = (period: string, symbol: string) => {
     setSelectedPeriod(period);